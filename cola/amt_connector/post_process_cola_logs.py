@@ -12,12 +12,8 @@ import requests
 import configparser
 import sys
 
+from stimulus_grids import Image, render_grids, stimulus_urls
 
-#from PIL import Image
-#from PIL import ImageFont, ImageDraw
-
-# the font style for dispplaying category names
-#FONT = ImageFont.truetype("/Library/Fonts/Arial.ttf", 15)
 
 CONFIG = configparser.ConfigParser()
 CONFIG.read('config.ini')
@@ -35,65 +31,8 @@ CONFIG.read('config.ini')
 #                 players[user_id] = f'{user_name}'
 #     return players.keys(), players.values()
 
-# def each_room_data(sess_directory, data_directory, filename):
-#     """function to process data of each cola room"""
-
-#     # size of image grid to save all the image in one task
-#     # in one block
-#     size_im_x = 500
-#     size_im_y = 500
-
-#     # read file and get players info #
-#     file_path = os.path.join(sess_directory, filename)
-#     with open(file_path) as fn:
-#         input_log = json.load(fn)
-
-#         # process data in each cola room
-#         counter = 0  # to separate image data inside one room
-#         row_space = 25 # space between each row of images in a grid
-#         for chat in input_log:
-#             if chat['type'] == 'command':
-#                 if chat["command"] == 'show_image':
-#                     counter += 1
-#                     # check the type of data - string or list of images
-#                     image_data_type = type(chat['data'][0][1])
-#                     data_path = os.path.join(data_directory, filename.split('.')[0]+ '_' + str(counter))
-
-#                     # if string, then text comprehension data
-#                     # else list would be images
-#                     if image_data_type == str:
-
-#                         # writing the text comprehension in a text file #
-#                         text_comp_file = open(data_path, 'w+')
-#                         for line in chat['data'][0]:
-#                             text_comp_file.write('%s\r\n' % line)
-#                     else:
-#                         # save images of each category as a grid
-#                         new_grid = Image.new('RGB', (size_im_x, size_im_y))
-#                         for len_x in range(len(chat['data'][0])):
-#                             # name of each category, this is not the real name atm
-#                             cat_name = chat['data'][0][len_x][0]
-
-#                             for len_y in range(len(chat['data'][0][len_x][1:])):
-#                                 # len_y+1 because 0 is category name
-#                                 each_im_url = chat['data'][0][len_x][len_y+1]
-
-#                                 # open image from the URL
-#                                 response = requests.get(each_im_url)
-#                                 print(each_im_url)
-#                                 im = Image.open(BytesIO(response.content))
-#                                 im.thumbnail((100, 100))
-#                                 new_grid.paste(im, (len_y*100, len_x*100+row_space))
-
-#                             # write text over the image
-#                             draw_grid = ImageDraw.Draw(new_grid)
-#                             draw_grid.text((0, len_x*100), cat_name, (255, 255, 255), font=FONT)
-
-#                         im_path = os.path.join(data_path + '.png')
-#                         new_grid.save(im_path)
-
 def each_room_dialogue(room):
-    """function to process dialogues in each cola room"""
+    """function to process dialogues in each cola room, returns its logs"""
     token = CONFIG['logs']['admin_token']
     uri = CONFIG['logs']['url']
     SESSION = CONFIG['session']['name']
@@ -154,6 +93,7 @@ def each_room_dialogue(room):
                 room_fn.write('%s\r\n' % chat_str)
             else:
                 print(log_entry)
+    return logs.json()
 
 # def process_logs_per_session(sess_dir, processed_sess_dir, proc_type):
 #     """process all logs in one mturk session"""
@@ -194,15 +134,21 @@ def process_logs():
         sys.exit(3)
 
     # go over each cola room log #
+    stimuli = {}
     for room in rooms.json():
         # only game room processing
         print("Processing room " + room["name"])
         if room["label"] == 'cola':
-            # process data or dialogues
-            #if proc_type == 'dialogues':
-            each_room_dialogue(room)
-            #else:
-            #    each_room_data(out_path, room)
+            logs = each_room_dialogue(room)
+            stimuli[room["name"]] = stimulus_urls(logs)
+
+    # the stimuli of all rooms are rendered together, so that
+    # images shown in several rooms are only fetched once
+    if Image is None:
+        print("Pillow is not installed, no stimulus grids are rendered")
+        return
+    written = render_grids(stimuli, os.path.join(out_path, "grids"))
+    print(f"{written} stimulus grids written")
 
 if __name__ == '__main__':
     # process data for each mturk session
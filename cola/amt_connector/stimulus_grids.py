@@ -0,0 +1,206 @@
+"""
+Render the stimuli shown in each CoLA room as one image grid.
+Images are downloaded once into a content-addressed cache, so
+stimuli shared by several rooms or sessions are fetched and
+decoded a single time. Decoding and thumbnailing run in a
+process pool, the grids are composed from NumPy arrays.
+
+    python stimulus_grids.py logs/<session> -o processed_logs/<session>/grids
+"""
+import argparse
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+CACHE_DIR = "image_cache"
+# file of the cache which maps the urls to the digests of their content
+URL_INDEX = "urls.json"
+THUMB = 100         # pixels per side of a thumbnail
+MARGIN = 4          # pixels between two thumbnails
+COLUMNS = 5         # thumbnails per row of a grid
+DOWNLOADS = 16      # parallel downloads
+BACKGROUND = 255
+
+
+# --- cache -------------------------------------------------------------------------
+class ImageCache:
+    """ Images on disk, stored by the sha256 of their content """
+
+    def __init__(self, path=CACHE_DIR):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        try:
+            with open(os.path.join(path, URL_INDEX)) as file:
+                self.digests = json.load(file)
+        except (OSError, ValueError):
+            self.digests = {}
+
+    def file(self, digest):
+        return os.path.join(self.path, digest[:2], digest)
+
+    def thumbnail_file(self, digest):
+        return f"{self.file(digest)}.{THUMB}.npy"
+
+    def fetch(self, urls, workers=DOWNLOADS):
+        """ Download the urls that are not cached yet
+
+        :return: dict url -> digest, urls that failed are left out
+        """
+        missing = sorted({url for url in urls if url not in self.digests})
+        if missing:
+            with requests.Session() as session, ThreadPoolExecutor(workers) as pool:
+                for url, digest in zip(missing, pool.map(
+                        lambda url: self._download(session, url), missing)):
+                    if digest is not None:
+                        self.digests[url] = digest
+            self._save_index()
+        return {url: self.digests[url] for url in urls if url in self.digests}
+
+    def _download(self, session, url):
+        try:
+            response = session.get(url, timeout=30)
+            response.raise_for_status()
+        except requests.RequestException as error:
+            print(f"Could not get image {url}: {error}")
+            return None
+        content = response.content
+        digest = hashlib.sha256(content).hexdigest()
+        path = self.file(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as file:
+                file.write(content)
+            os.replace(tmp_path, path)
+        return digest
+
+    def _save_index(self):
+        path = os.path.join(self.path, URL_INDEX)
+        with open(f"{path}.tmp", "w") as file:
+            json.dump(self.digests, file)
+        os.replace(f"{path}.tmp", path)
+
+
+# --- thumbnails --------------------------------------------------------------------
+def shrink(image, size=THUMB):
+    """ Fit an RGB image into size x size pixels by averaging the pixel areas """
+    height, width, _ = image.shape
+    scale = max(height, width) / size
+    if scale <= 1:
+        return image
+    new_height = max(1, round(height / scale))
+    new_width = max(1, round(width / scale))
+    # first source row and column of each target pixel
+    rows = np.arange(new_height) * height // new_height
+    cols = np.arange(new_width) * width // new_width
+    sums = np.add.reduceat(np.add.reduceat(image.astype(np.uint32), rows, axis=0), cols, axis=1)
+    counts = np.outer(np.diff(rows, append=height), np.diff(cols, append=width))
+    return (sums / counts[:, :, None] + 0.5).astype(np.uint8)
+
+
+def _thumbnail(job):
+    """ Decode a cached image and store its thumbnail next to it """
+    path, thumbnail_path = job
+    if os.path.exists(thumbnail_path):
+        return thumbnail_path
+    try:
+        with Image.open(path) as image:
+            pixels = np.asarray(image.convert("RGB"))
+    except OSError as error:
+        print(f"Could not decode image {path}: {error}")
+        return None
+    tmp_path = f"{thumbnail_path}.{os.getpid()}.tmp.npy"
+    np.save(tmp_path, shrink(pixels))
+    os.replace(tmp_path, thumbnail_path)
+    return thumbnail_path
+
+
+def make_thumbnails(cache, digests, processes=None):
+    """ Thumbnails of the images, each image is decoded once
+
+    :param digests: Digests of cached images
+    :return: dict digest -> thumbnail
+    """
+    if Image is None:
+        raise RuntimeError("Pillow is needed to decode the stimuli: pip install Pillow")
+    digests = sorted(set(digests))
+    jobs = [(cache.file(digest), cache.thumbnail_file(digest)) for digest in digests]
+    with ProcessPoolExecutor(processes) as pool:
+        paths = list(pool.map(_thumbnail, jobs, chunksize=8))
+    return {digest: np.load(path) for digest, path in zip(digests, paths) if path is not None}
+
+
+# --- grids -------------------------------------------------------------------------
+def compose(thumbnails, columns=COLUMNS):
+    """ One RGB image of the thumbnails, row by row in the given order """
+    rows = -(-len(thumbnails) // columns)
+    cell = THUMB + MARGIN
+    grid = np.full((MARGIN + rows * cell, MARGIN + columns * cell, 3), BACKGROUND, dtype=np.uint8)
+    for number, thumbnail in enumerate(thumbnails):
+        height, width, _ = thumbnail.shape
+        y = MARGIN + (number // columns) * cell + (THUMB - height) // 2
+        x = MARGIN + (number % columns) * cell + (THUMB - width) // 2
+        grid[y:y + height, x:x + width] = thumbnail
+    return grid
+
+
+def stimulus_urls(logs):
+    """ Urls of the images shown in a room, in the order they were shown """
+    urls = []
+    for log_entry in logs:
+        if log_entry.get('event') != 'set_attribute':
+            continue
+        if log_entry.get('attribute') != 'src':
+            continue
+        url = log_entry.get('value')
+        if url and url not in urls:
+            urls.append(url)
+    return urls
+
+
+def render_grids(rooms, out_dir, cache_dir=CACHE_DIR, processes=None):
+    """ Write one grid per room
+
+    :param rooms: dict room name -> urls of its stimuli
+    :return: number of grids written
+    """
+    cache = ImageCache(cache_dir)
+    digests = cache.fetch([url for urls in rooms.values() for url in urls])
+    thumbnails = make_thumbnails(cache, digests.values(), processes)
+
+    os.makedirs(out_dir, exist_ok=True)
+    written = 0
+    for room_name, urls in rooms.items():
+        images = [thumbnails[digests[url]] for url in urls
+                  if digests.get(url) in thumbnails]
+        if not images:
+            continue
+        Image.fromarray(compose(images)).save(os.path.join(out_dir, room_name + ".png"))
+        written += 1
+    return written
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Render the stimuli of each room as a grid.')
+    parser.add_argument('log_dir', help='directory with the json logs of a session')
+    parser.add_argument('-o', '--out_dir', required=True, help='directory for the grids')
+    parser.add_argument('--cache', default=CACHE_DIR, help='directory of the image cache')
+    parser.add_argument('--processes', type=int, help='number of worker processes')
+    args = parser.parse_args()
+
+    rooms = {}
+    for filename in sorted(os.listdir(args.log_dir)):
+        if filename.endswith('.json'):
+            with open(os.path.join(args.log_dir, filename)) as file:
+                rooms[filename[:-len('.json')]] = stimulus_urls(json.load(file))
+    written = render_grids(rooms, args.out_dir, args.cache, args.processes)
+    print(f"{written} grids written to {args.out_dir}")
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+
+# University of Potsdam
+"""Stimulus grid test cases."""
+
+import os
+import sys
+import unittest
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from stimulus_grids import (
+    BACKGROUND, MARGIN, THUMB, compose, shrink, stimulus_urls
+)
+
+
+def solid(height, width, colour):
+    return np.full((height, width, 3), colour, dtype=np.uint8)
+
+
+class TestShrink(unittest.TestCase):
+    def test_small_image_is_kept(self):
+        image = solid(THUMB, THUMB // 2, 7)
+
+        self.assertIs(shrink(image), image)
+
+    def test_aspect_ratio_is_kept(self):
+        for height, width, expected in [(400, 200, (100, 50)), (150, 450, (33, 100)), (333, 333, (100, 100))]:
+            with self.subTest(height=height, width=width):
+                thumbnail = shrink(solid(height, width, 0))
+
+                self.assertEqual(thumbnail.shape, expected + (3,))
+
+    def test_thin_image_keeps_one_pixel(self):
+        self.assertEqual(shrink(solid(1000, 7, 0)).shape, (THUMB, 1, 3))
+
+    def test_pixel_areas_are_averaged(self):
+        # a checkerboard of single pixels becomes a flat grey
+        image = np.zeros((2 * THUMB, 2 * THUMB, 3), dtype=np.uint8)
+        image[::2, ::2] = 255
+        image[1::2, 1::2] = 255
+        thumbnail = shrink(image)
+
+        self.assertEqual(thumbnail.shape, (THUMB, THUMB, 3))
+        self.assertTrue((thumbnail == 128).all())
+
+    def test_regions_keep_their_colour(self):
+        image = solid(3 * THUMB, 3 * THUMB, 0)
+        image[:, 3 * THUMB // 2:] = [10, 200, 30]
+        thumbnail = shrink(image)
+
+        self.assertTrue((thumbnail[:, :THUMB // 2] == 0).all())
+        self.assertTrue((thumbnail[:, THUMB // 2:] == [10, 200, 30]).all())
+
+
+class TestCompose(unittest.TestCase):
+    def test_grid_size(self):
+        grid = compose([solid(THUMB, THUMB, 0)] * 7, columns=3)
+
+        cell = THUMB + MARGIN
+        self.assertEqual(grid.shape, (MARGIN + 3 * cell, MARGIN + 3 * cell, 3))
+        self.assertEqual(grid.dtype, np.uint8)
+
+    def test_thumbnails_are_placed_row_by_row(self):
+        thumbnails = [solid(THUMB, THUMB, number) for number in range(5)]
+        grid = compose(thumbnails, columns=2)
+
+        cell = THUMB + MARGIN
+        for number in range(5):
+            with self.subTest(number=number):
+                y = MARGIN + (number // 2) * cell
+                x = MARGIN + (number % 2) * cell
+                self.assertTrue((grid[y:y + THUMB, x:x + THUMB] == number).all())
+        # the margins and the empty last cell keep the background
+        self.assertTrue((grid[:MARGIN] == BACKGROUND).all())
+        self.assertTrue((grid[:, THUMB + MARGIN:cell + MARGIN] == BACKGROUND).all())
+        self.assertTrue((grid[MARGIN + 2 * cell:, MARGIN + cell:] == BACKGROUND).all())
+
+    def test_narrow_thumbnail_is_centred(self):
+        grid = compose([solid(THUMB, THUMB // 2, 0)], columns=1)
+
+        offset = MARGIN + THUMB // 4
+        self.assertTrue((grid[MARGIN:MARGIN + THUMB, offset:offset + THUMB // 2] == 0).all())
+        self.assertTrue((grid[MARGIN:MARGIN + THUMB, MARGIN:offset] == BACKGROUND).all())
+        self.assertTrue((grid[MARGIN:MARGIN + THUMB, offset + THUMB // 2:] == BACKGROUND).all())
+
+
+class TestStimulusUrls(unittest.TestCase):
+    def test_only_image_sources_are_taken(self):
+        logs = [
+            {'event': 'set_attribute', 'attribute': 'src', 'value': 'a.png'},
+            {'event': 'set_attribute', 'attribute': 'style', 'value': 'b.png'},
+            {'event': 'set_attribute', 'value': 'c.png'},
+            {'event': 'text_message', 'attribute': 'src', 'value': 'd.png'},
+            {'event': 'set_attribute', 'attribute': 'src', 'value': ''},
+            {'event': 'set_attribute', 'attribute': 'src', 'value': 'e.png'},
+        ]
+
+        self.assertEqual(stimulus_urls(logs), ['a.png', 'e.png'])
+
+    def test_urls_are_deduplicated_in_order(self):
+        logs = [
+            {'event': 'set_attribute', 'attribute': 'src', 'value': url}
+            for url in ['b.png', 'a.png', 'b.png', 'c.png', 'a.png']
+        ]
+
+        self.assertEqual(stimulus_urls(logs), ['b.png', 'a.png', 'c.png'])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -11,63 +11,334 @@ This is CoLA Bot code that uses slurk interface.
  """
 
 # import packages
-import configparser
-import os
+import argparse
+import asyncio
 import json
+import logging
+import os
 import random
-import sys
+import signal
 import string
-import argparse
-from threading import Timer
-import requests
-
-from time import sleep
+from datetime import datetime, timezone
 
-from socketIO_client import SocketIO, BaseNamespace
+import aiohttp
+import socketio
 
+from cola_data_processing.rotation import scheduler
 from game_db import ColaGameDb
+from plan_pool import PlanPool
+from waiting import WaitingList
+
+
+LOG = logging.getLogger(__name__)
 
 # Global variables
 
-TASK_ID = None
+# minutes a user waits for a partner before being paid for the wait
+TIME_WAITING = 5
+# minutes after which games still running during a shutdown are ended
+TIME_DRAIN = 10
+# minutes a finished game is kept in memory to answer late messages
+TIME_EVICT = 1
+# seconds after a rejoin until the display of the user is restored,
+# every further rejoin within this time restarts it
+TIME_RESYNC = 3
+# summaries of finished games are appended to this file, one JSON per line
+ARCHIVE_FILE = "cola_games.jsonl"
+# which games and categories were played recently, kept across restarts
+ROTATION_FILE = "cola_rotation.json"
+
 
 # --- class implementation --------------------------------------------------------
-# ChatNamespace
+# ColaBot
 # ---------------------------------------------------------------------------------
-class ChatNamespace(BaseNamespace):
-    """ Moderates dialogues between players and handles the commands in the game"""
-
-    # Called when connected
-    def __init__(self, io, path):
-        super().__init__(io, path)
-        self.WAITING_TIMER = Timer(1, print, args=["Timer"])
-        self.id = None
-        self.COLA_GAME_DB = []
-        self.emit('ready')
-
-    def on_text_message(self, data):
-        if data['user']['name'] != 'Cola Bot':
-            for each_room_db in self.COLA_GAME_DB:
-                if data['room'] == each_room_db.room:
-                    if data['msg'] == "ready":
-                        self._command_ready(data)
-                    elif data["msg"].startswith("answer"):
-                        data["command"] = data["msg"]
-                        self._command_answer(data)
-                    elif data["msg"] == "agree":
-                        self._command_agree(data)
-                    elif data["msg"] == "noreply" or data["msg"] == "no reply":
-                        self._command_noreply(data)
-                    each_room_db.count_msg += 1
-
-    def on_new_task_room(self, data):
+class ColaBot:
+    """ Moderates dialogues between players and handles the commands in the game
+
+    All handlers run on one asyncio event loop. Timers are scheduled on
+    the same loop, so the game state is never touched from other threads.
+    """
+    sio = socketio.AsyncClient(logger=True)
+    task_id = None
+    waiting_room = None
+
+    def __init__(self, token, user, host, port):
+        self.token = token
+        self.user = user
+
+        self.uri = host
+        if port is not None:
+            self.uri += f":{port}"
+        self.uri += "/slurk/api"
+
+        # created on the event loop in run()
+        self.session = None
+        self.plans = None
+        # users in the waiting room and when their wait ends
+        self.waiting = WaitingList(60*TIME_WAITING, self.no_partner)
+        # (room, user id) -> pending restore of the display after a rejoin
+        self.resync_timers = {}
+        # room -> ColaGameDb of the game played in that room
+        self.COLA_GAME_DB = {}
+        # rooms whose game has not been closed yet
+        self.open_rooms = set()
+        self.draining = False
+        self.drain_timer = None
+        # time the connection was lost, and the id of the
+        # last replayed log entry per room
+        self.disconnected_at = None
+        self.last_log_id = {}
+
+        LOG.info(f"Running cola bot on {self.uri} with token {self.token}")
+        # register all event handlers
+        self.register_callbacks()
+
+    async def run(self):
+        self.session = aiohttp.ClientSession(
+            headers={"Authorization": f"Bearer {self.token}"}
+        )
+        # prepare the content of rooms while waiting for them
+        self.plans = PlanPool(ColaGameDb.make_plan, give_back=ColaGameDb.give_back_plan)
+        self.plans.start()
+        try:
+            # establish a connection to the server
+            delay = 1
+            while True:
+                try:
+                    await self.sio.connect(
+                        self.uri,
+                        headers={"Authorization": f"Bearer {self.token}", "user": self.user},
+                        namespaces="/",
+                        transports=["websocket"],
+                    )
+                    break
+                except socketio.exceptions.ConnectionError as error:
+                    LOG.error(f"Could not connect to server: {error}")
+                    await asyncio.sleep(random.uniform(delay / 2, delay))
+                    delay = min(2 * delay, 60)
+            # wait until the connection with the server ends
+            await self.sio.wait()
+        finally:
+            self.plans.stop()
+            await self.session.close()
+            scheduler.save()
+
+    def register_callbacks(self):
+        @self.sio.event
+        async def connect():
+            if self.disconnected_at is not None:
+                self.sio.start_background_task(self.resume)
+
+        @self.sio.event
+        async def disconnect():
+            self.disconnected_at = datetime.now(timezone.utc)
+
+        @self.sio.event
+        async def joined_room(data):
+            self.user = data["user"]
+            await self.greet(data["room"])
+
+        @self.sio.event
+        async def new_task_room(data):
+            await self.on_new_task_room(data)
+
+        @self.sio.event
+        async def text_message(data):
+            await self.on_text_message(data)
+
+        @self.sio.event
+        async def command(data):
+            await self.on_command(data)
+
+        @self.sio.event
+        async def status(data):
+            await self.on_status(data)
+
+    # --- helpers ---------------------------------------------------------------------
+    def later(self, delay, callback, *args, **kwargs):
+        """ Schedule the coroutine function `callback` in `delay` seconds.
+
+        Returns a handle that can be cancelled like a threading.Timer.
+        """
+        loop = asyncio.get_running_loop()
+        return loop.call_later(
+            delay, lambda: asyncio.ensure_future(callback(*args, **kwargs))
+        )
+
+    async def send(self, room, message, receiver_id=None, html=False):
+        """ Send a text message to a room, or to one user in it """
+        data = {"message": message, "room": room, "html": html}
+        if receiver_id is not None:
+            data["receiver_id"] = receiver_id
+        await self.sio.emit("text", data)
+
+    async def set_attribute(self, room, element, attribute, value, receiver_id=None):
+        data = {"attribute": attribute, "value": value}
+        if receiver_id is not None:
+            data["receiver_id"] = receiver_id
+        async with self.session.patch(
+            f"{self.uri}/rooms/{room}/attribute/id/{element}", json=data
+        ) as response:
+            if not response.ok:
+                LOG.error(f"Could not set {attribute} of {element}: {response.status}")
+
+    async def set_text(self, room, element, text, receiver_id=None):
+        data = {"text": text}
+        if receiver_id is not None:
+            data["receiver_id"] = receiver_id
+        async with self.session.patch(
+            f"{self.uri}/rooms/{room}/text/{element}", json=data
+        ) as response:
+            if not response.ok:
+                LOG.error(f"Could not set text of {element}: {response.status}")
+
+    async def log_token(self, room, status_txt, receiver_id=None):
+        """ Log a new AMT token for the players of a room, or for
+        one user in it, and return it
+        """
+        amt_token = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
+        data = {"event": "confirmation_log",
+                "room_id": room,
+                "data": {"status_txt": status_txt, "amt_token": amt_token}}
+        if receiver_id is not None:
+            data["receiver_id"] = receiver_id
+        async with self.session.post(f"{self.uri}/logs", json=data) as response:
+            if not response.ok:
+                LOG.error(f"Could not post AMT token to logs: {response.status}")
+        return amt_token
+
+    # --- reconnection ----------------------------------------------------------------
+    async def resume(self):
+        """ Catch up on what happened while the connection was lost.
+
+        The bot rejoins any of its rooms it is no longer part of
+        and replays the events it missed from the room logs.
+        """
+        since, self.disconnected_at = self.disconnected_at, None
+        rooms = list(self.open_rooms)
+        if self.waiting_room is not None:
+            rooms.append(self.waiting_room)
+        LOG.info(f"Reconnected, resuming {len(rooms)} rooms.")
+
+        async with self.session.get(f"{self.uri}/users/{self.user}") as response:
+            if not response.ok:
+                LOG.error(f"Could not get bot user: {response.status}")
+                return
+            joined = set((await response.json()).get("rooms", []))
+
+        for room in rooms:
+            if room not in joined:
+                async with self.session.post(
+                    f"{self.uri}/users/{self.user}/rooms/{room}"
+                ) as response:
+                    if not response.ok:
+                        LOG.error(f"Could not rejoin room {room}: {response.status}")
+                        continue
+            await self.replay_logs(room, since)
+
+    async def replay_logs(self, room, since):
+        """ Pass events logged while disconnected to their handlers.
+
+        :param room: Identifier of a room the bot is in.
+        :param since: Entries created before this time were already
+            received while connected.
+        """
+        async with self.session.get(
+            f"{self.uri}/rooms/{room}/users/{self.user}/logs"
+        ) as response:
+            if not response.ok:
+                LOG.error(f"Could not get logs of room {room}: {response.status}")
+                return
+            entries = await response.json()
+
+        game = self.COLA_GAME_DB.get(room)
+        names = {} if game is None else {
+            user_id: player["name"] for user_id, player in game.players_by_id.items()
+        }
+        for entry in sorted(entries, key=lambda entry: entry["id"]):
+            created = datetime.fromisoformat(entry["date_created"].replace("Z", "+00:00"))
+            if created.tzinfo is None:
+                created = created.replace(tzinfo=timezone.utc)
+            # entries may already have been replayed after an earlier reconnect
+            if created < since or entry["id"] <= self.last_log_id.get(room, 0):
+                continue
+            self.last_log_id[room] = entry["id"]
+            if str(entry["user_id"]) == str(self.user):
+                continue
+
+            user = {"id": entry["user_id"], "name": names.get(entry["user_id"], "")}
+            data = entry.get("data") or {}
+            event = {"room": room, "user": user}
+            if entry["event"] == "text_message":
+                await self.on_text_message({**event, "message": data.get("message", "")})
+            elif entry["event"] == "command":
+                await self.on_command({**event, "command": data.get("command", "")})
+            elif entry["event"] in {"join", "leave"}:
+                await self.on_status({**event, "type": entry["event"]})
+            LOG.debug(f"Replayed missed {entry['event']} event in room {room}.")
+        # the game may have ended with one of the replayed events
+        if room not in self.open_rooms and room != self.waiting_room:
+            self.last_log_id.pop(room, None)
+
+    # --- shutdown --------------------------------------------------------------------
+    async def drain(self, timeout=TIME_DRAIN):
+        """ Take no new rooms and disconnect once running games have ended """
+        if self.draining:
+            return
+        LOG.info(f"Draining, open rooms: {self.open_rooms}")
+        self.draining = True
+        if timeout is not None:
+            self.drain_timer = self.later(60*timeout, self._end_games)
+        await self._check_drained()
+
+    async def _end_games(self):
+        """ End the games still running when a draining bot runs out of time """
+        for room in list(self.open_rooms):
+            await self.send(room, 'Sorry, this game has to end now.')
+            amt_token = await self.log_token(room, 'drain')
+            await self.send(room, 'Here\'s your token: {}'.format(f'{amt_token}'))
+            await self.close_game(room, status='drain')
+
+    async def _check_drained(self):
+        """ Disconnect a draining bot once all of its games have ended """
+        if self.draining and not self.open_rooms:
+            LOG.info("All games have ended, disconnecting.")
+            self.waiting.stop()
+            if self.drain_timer:
+                self.drain_timer.cancel()
+            await self.sio.disconnect()
+
+    # --- event handlers --------------------------------------------------------------
+    async def on_text_message(self, data):
+        if str(data['user']['id']) != str(self.user):
+            each_room_db = self.COLA_GAME_DB.get(data['room'])
+            if each_room_db is not None:
+                if data['message'] == "ready":
+                    await self._command_ready(data)
+                elif data["message"].startswith("answer"):
+                    data["command"] = data["message"]
+                    await self._command_answer(data)
+                elif data["message"] == "agree":
+                    await self._command_agree(data)
+                elif data["message"] == "noreply" or data["message"] == "no reply":
+                    await self._command_noreply(data)
+                each_room_db.count_msg += 1
+
+    async def on_new_task_room(self, data):
         """
         This gets called as soon as new task (cola) room is created.
         :param
         data: A dict. Information about the new room.
         """
-        #global COLA_GAME_DB
-        print("new task room: ", data)
+        LOG.debug(f"New task room: {data}")
+        # the users have found their partner
+        for user in data['users']:
+            self.waiting.matched(user['id'])
+        if self.task_id is not None and data['task'] != self.task_id:
+            return
+        if self.draining:
+            LOG.info("Draining, the room is left to other bots.")
+            return
         # As a new room opens, an instance of cola game class is created
         cola_db = ColaGameDb(data['room'])
 
@@ -75,158 +346,109 @@ class ChatNamespace(BaseNamespace):
         for user in data['users']:
             cola_db.add_users(user)
 
-        # Generate the data for each game instance
-        print("generate data every time cola is called")
-        cola_db.generate_cola_data()
+        # The data for each game instance was prepared in advance
+        cola_db.apply_plan(await self.plans.get())
 
-        self.WAITING_TIMER.cancel()
-
-        cola_db.ready_timer = Timer(60*1, self.emit, args=['text',
-                                                           {
-                                                               'msg': "Are you ready? Please type **/ready** to begin the game.",
-                                                               'room': cola_db.room,
-                                                               'html': True
-                                                           }
-                                                          ])
-        cola_db.ready_timer.start()
+        cola_db.ready_timer = self.later(
+            60*1, self.send, cola_db.room,
+            "Are you ready? Please type **/ready** to begin the game.", html=True
+        )
 
         # Keeping information ofall the rooms i.e. each instance of COLA_GAME_DB class
-        self.COLA_GAME_DB.append(cola_db)
-        self.emit("join_room", {'user': self.id, 'room': data['room']}) # join cola
-        sys.stdout.flush()
-
-# --- public functions -----------------------------------------------------------------
-    def on_joined_room(self, data):
+        self.COLA_GAME_DB[cola_db.room] = cola_db
+        self.open_rooms.add(data['room'])
+        async with self.session.post(
+            f"{self.uri}/users/{self.user}/rooms/{data['room']}"
+        ) as response:
+            if not response.ok:
+                LOG.error(f"Could not let cola bot join room: {response.status}")
+
+    async def greet(self, room):
         """ This is called once, when the bot joins a room.
 
         :param
-            data: A dict. All information about the new room.
+            room: The room the bot joined.
         """
-        self.id = data['user']
-        #global COLA_GAME_DB
-
-        # Search for the correct database (accoording to the actual room)
-        for cola_db in self.COLA_GAME_DB:
-            if data['room'] == cola_db.room:
-                cola_db.add_users(data['user'])
-
-                print("on_joined_room", data)
-                sys.stdout.flush()
-                # Send a welcome message to both users (via the room-id).
-                if data['room'] != "waiting_room":
-
-                    # Welcome message for the cola room #
-                    sleep(.5)
-                    self.emit('text', {'msg': ' **Welcome to the CoLa Game!**'
-                                              ' Discussion and providing reason(s)'
-                                              ' for your answer is crucial for this game.',
-                                       'room': data['room'],
-                                       'html': True})
-                    sleep(.5)
-                    self.emit('text', {'msg': ' Remember the following commands to play the game:'
-                                              ' \n\n(1) Propose answer to your partner: Type "/answer'
-                                              ' ...your description here...".'
-                                              ' \n\n(2) Agree on the answer proposed by your partner:'
-                                              ' Type "/agree".\n\n',
-                                       'room': data['room'],
-                                       'html': True})
-                    sleep(.5)
-                    self.emit('text', {'msg': ' Please type **/ready** to begin the game.',
-                                       'room': data['room'],
-                                       'html': True})
-                    sleep(.5)
-                    self.emit('set_text',{'room': data['room'],
-                                          'id': "status-box",
-                                          'text': 'Please type /ready to begin the game.'})
-
-    def on_command(self, data):
-        print("on_command", data)
-        sys.stdout.flush()
+        cola_db = self.COLA_GAME_DB.get(room)
+        # Send a welcome message to both users (via the room-id).
+        if cola_db is not None:
+
+            # Welcome message for the cola room #
+            await asyncio.sleep(.5)
+            await self.send(room, ' **Welcome to the CoLa Game!**'
+                                  ' Discussion and providing reason(s)'
+                                  ' for your answer is crucial for this game.',
+                            html=True)
+            await asyncio.sleep(.5)
+            await self.send(room, ' Remember the following commands to play the game:'
+                                  ' \n\n(1) Propose answer to your partner: Type "/answer'
+                                  ' ...your description here...".'
+                                  ' \n\n(2) Agree on the answer proposed by your partner:'
+                                  ' Type "/agree".\n\n',
+                            html=True)
+            await asyncio.sleep(.5)
+            await self.send(room, ' Please type **/ready** to begin the game.', html=True)
+            await asyncio.sleep(.5)
+            await self.set_text(room, "status-box", 'Please type /ready to begin the game.')
+
+    async def on_command(self, data):
+        LOG.debug(f"Command: {data}")
         if data["command"].startswith("ready"):
-            self._command_ready(data)
+            await self._command_ready(data)
         elif data["command"].startswith("answer"):
-            self._command_answer(data)
+            await self._command_answer(data)
         elif data["command"].startswith("agree"):
-            self._command_agree(data)
+            await self._command_agree(data)
         elif data["command"].startswith("noreply"):
-            self._command_noreply(data)
-        #elif data["command"].startswith("change"):
-        #    self._command_change(data)
+            await self._command_noreply(data)
         else:
-            for each_room_db in self.COLA_GAME_DB:
-                if data['room'] == each_room_db.room:
-                    all_players = each_room_db.players
-                    self_id = [all_players[i]['id'] for i in range(0, len(all_players))
-                               if data['user']['id'] == all_players[i]['id']]
-                    self.emit('text',
-                              {
-                                  'msg': '{} is not a valid command. '.format(data["command"]),
-                                  'receiver_id': self_id,
-                                  'room': data['room']
-                              })
-    
-    def _command_ready(self, data):
+            each_room_db = self.COLA_GAME_DB.get(data['room'])
+            if each_room_db is not None and each_room_db.get_player(data['user']['id']):
+                await self.send(data['room'],
+                                '{} is not a valid command. '.format(data["command"]),
+                                receiver_id=data['user']['id'])
+
+    async def _command_ready(self, data):
         """ Test slash command skills of the players """
-        print("_command_ready", data)
-        sys.stdout.flush()
-        for each_room_db in self.COLA_GAME_DB:
-            if data['room'] == each_room_db.room:
-                self_id = [player['id'] for player in each_room_db.players
-                           if player['id'] == data['user']['id']]
-                other_user = [player['id'] for player in each_room_db.players
-                                  if player['id'] != data['user']['id']]
-                if not each_room_db.ready_id:
-                    each_room_db.ready_id.add(self_id[0])
-                    self.emit('text', {
-                        'msg': 'Now, waiting for your partner to type /ready. ',
-                        'receiver_id': self_id[0],
-                        'room': each_room_db.room
-                        })
-                    each_room_db.ready_timer.cancel()
-                    each_room_db.ready_timer = Timer(60*.5,
-                                                     self.emit,
-                                                     args=['text', {
-                                                                        'msg': "Your partner is ready. Please, also type /ready!",
-                                                                        'room': each_room_db.room,
-                                                                        'receiver_id': other_user
-                                                                    }
-                                                     ]
-                                                    )
-                    each_room_db.ready_timer.start()
-
-                elif self_id[0] not in each_room_db.ready_id and len(each_room_db.ready_id) == 1:
-                    # game starts #
-                    self.emit('text', {
-                        'msg': 'Woo-Hoo! Game begins now. ',
-                        'room': each_room_db.room})
-                    each_room_db.ready_id.add(self_id[0])
-                    each_room_db.ready_flag = True
-                    each_room_db.first_answer = False
-                    self.on_show_and_query(each_room_db)
-
-                    each_room_db.ready_timer.cancel()
-                    
-                    # conversation timer starts
-                    each_room_db.conversation_timer = Timer(60*5,
-                                                            self.emit,
-                                                            args=['text',
-                                                                  {
-                                                                      'msg': 'You both seem to be having a discussion for a '
-                                                                             'long time. Could you reach an agreement and '
-                                                                             'provide an answer?',
-                                                                      'room': each_room_db.room
-                                                                  }
-                                                              ]
-                                                    )
-                    each_room_db.conversation_timer.start()
-
-                elif self_id[0] in each_room_db.ready_id:
-                    self.emit('text', {
-                        'msg': 'You have already typed /ready. ',
-                        'receiver_id': self_id[0],
-                        'room': each_room_db.room})
-
-    def on_show_and_query(self, game_room_db):
+        each_room_db = self.COLA_GAME_DB.get(data['room'])
+        if each_room_db is not None and each_room_db.get_player(data['user']['id']):
+            self_id = data['user']['id']
+            other_user = each_room_db.get_partner(self_id)
+            if not each_room_db.ready_id:
+                each_room_db.ready_id.add(self_id)
+                await self.send(each_room_db.room,
+                                'Now, waiting for your partner to type /ready. ',
+                                receiver_id=self_id)
+                each_room_db.ready_timer.cancel()
+                each_room_db.ready_timer = self.later(
+                    60*.5, self.send, each_room_db.room,
+                    "Your partner is ready. Please, also type /ready!",
+                    receiver_id=other_user
+                )
+
+            elif self_id not in each_room_db.ready_id and len(each_room_db.ready_id) == 1:
+                # game starts #
+                await self.send(each_room_db.room, 'Woo-Hoo! Game begins now. ')
+                each_room_db.ready_id.add(self_id)
+                each_room_db.ready_flag = True
+                each_room_db.first_answer = False
+                await self.on_show_and_query(each_room_db)
+
+                each_room_db.ready_timer.cancel()
+
+                # conversation timer starts
+                each_room_db.conversation_timer = self.later(
+                    60*5, self.send, each_room_db.room,
+                    'You both seem to be having a discussion for a '
+                    'long time. Could you reach an agreement and '
+                    'provide an answer?'
+                )
+
+            elif self_id in each_room_db.ready_id:
+                await self.send(each_room_db.room, 'You have already typed /ready. ',
+                                receiver_id=self_id)
+
+    async def on_show_and_query(self, game_room_db):
         """
         Start the game by showing the images and asking questions
         :param data: current room database dict
@@ -238,406 +460,338 @@ class ChatNamespace(BaseNamespace):
         curr_data = game_room_db.room_data.pop(0)
         game_room_db.current_state = curr_data
 
-        print(curr_data)
-        sys.stdout.flush()
-        self.emit('set_attribute',
-                  {
-                      'room': game_room_db.room,
-                      'id': "current-image",
-                      'attribute': "src",
-                      'value': curr_data['data']
-                  })
-        self.emit('set_text',
-                  {
-                      'room': game_room_db.room,
-                      'id': "status-box",
-                      'text': curr_data['question']
-                  })
-
-    def _command_answer(self, data):
+        LOG.debug(curr_data)
+        await self.set_attribute(game_room_db.room, "current-image", "src", curr_data['data'])
+        await self.set_text(game_room_db.room, "status-box", curr_data['question'])
+
+    async def _command_answer(self, data):
         """
         Providing your own (individual player's) answer / reason
         :param data: dict of user data
         :return:
         """
 
-        for each_room_db in self.COLA_GAME_DB:
-            if data['room'] == each_room_db.room:
-                all_players = each_room_db.players
-                self_id = [all_players[i]['id'] for i in range(0, len(all_players))
-                           if data['user']['id'] == all_players[i]['id']]
-                if not each_room_db.first_answer and each_room_db.count_msg < 5:
-                    self.emit('text',
-                              {
-                                  'msg': 'There is no discussion so far. You should discuss first, then suggest and update'
-                                         ' your answers.',
-                                  'receiver_id': self_id[0],
-                                  'room': each_room_db.room
-                              })
-                elif not each_room_db.ready_flag:
-                    self.emit('text',
-                              {
-                                  'msg': 'Both players have not typed /ready yet. ',
-                                  'receiver_id': self_id[0],
-                                  'room': each_room_db.room
-                              })
-                elif not each_room_db.game_over_status:
-                    sent_id = [all_players[i]['id'] for i in range(0, len(all_players))
-                               if data['user']['id'] != all_players[i]['id']]
-                    self_name = [all_players[i]['name'] for i in range(0, len(all_players))
-                                 if data['user']['id'] == all_players[i]['id']]
-                    self_id = [all_players[i]['id'] for i in range(0, len(all_players))
-                               if data['user']['id'] == all_players[i]['id']]
-
-                    proposal = " ".join(data['command'].split("answer ")[1:]).strip()
-                    if proposal:
-                        each_room_db.answer_status = True
-
-                        self.emit('text', {'msg': 'The current proposal from '
-                                                  '{} is **"{}"** '.format(self_name[0]
-                                                                                , proposal),
-                                           'room': each_room_db.room,
-                                           'html': True})
-                        each_room_db.curr_player_ans_id = self_id[0]
-
-                        self.emit('text', {'msg': 'Do you agree with your partner\'s answer?'
-                                                  ' If not, please continue the discussion.',
-                                           'receiver_id': sent_id[0],
-                                           'room': each_room_db.room})
-
-                    else:
-                        self.emit('text', {
-                            'msg': 'This command cannot be processed.\n\n Answer comes with a'
-                                   ' description, for example, /answer This is a... because '
-                                   '...your description here...',
-                            'receiver_id': self_id[0],
-                            'room': each_room_db.room,
-                            'html': True})
+        each_room_db = self.COLA_GAME_DB.get(data['room'])
+        if each_room_db is not None and each_room_db.get_player(data['user']['id']):
+            self_id = data['user']['id']
+            if not each_room_db.first_answer and each_room_db.count_msg < 5:
+                await self.send(each_room_db.room,
+                                'There is no discussion so far. You should discuss first, then suggest and update'
+                                ' your answers.',
+                                receiver_id=self_id)
+            elif not each_room_db.ready_flag:
+                await self.send(each_room_db.room,
+                                'Both players have not typed /ready yet. ',
+                                receiver_id=self_id)
+            elif not each_room_db.game_over_status:
+                sent_id = each_room_db.get_partner(self_id)
+                self_name = each_room_db.get_player(self_id)['name']
+
+                proposal = " ".join(data['command'].split("answer ")[1:]).strip()
+                if proposal:
+                    each_room_db.answer_status = True
+
+                    await self.send(each_room_db.room,
+                                    'The current proposal from '
+                                    '{} is **"{}"** '.format(self_name, proposal),
+                                    html=True)
+                    each_room_db.curr_player_ans_id = self_id
+
+                    await self.send(each_room_db.room,
+                                    'Do you agree with your partner\'s answer?'
+                                    ' If not, please continue the discussion.',
+                                    receiver_id=sent_id)
+
                 else:
-                    self.emit('text', {
-                        'msg': 'Cannot process this command. The game is already finished.'
-                               ' ',
-                        'room': each_room_db.room})
+                    await self.send(each_room_db.room,
+                                    'This command cannot be processed.\n\n Answer comes with a'
+                                    ' description, for example, /answer This is a... because '
+                                    '...your description here...',
+                                    receiver_id=self_id,
+                                    html=True)
+            else:
+                await self.send(each_room_db.room,
+                                'Cannot process this command. The game is already finished.'
+                                ' ')
 
-    def _command_agree(self, data):
+    async def _command_agree(self, data):
         """
         Function where one player can agree to another player's answer
         new query automatically begins or the game ends.
         :param data:
         :return:
         """
-        #global COLA_GAME_DB
-
-        for each_room_db in self.COLA_GAME_DB:
-            if data['room'] == each_room_db.room:
-                # ID of the user #
-                all_players = each_room_db.players
-                self_id = [all_players[i]['id'] for i in range(0, len(all_players))
-                           if data['user']['id'] == all_players[i]['id']]
-
-                if not each_room_db.ready_flag:
-                    self.emit('text', {
-                        'msg': 'Both players have not typed /ready yet. ',
-                        'receiver_id': self_id[0],
-                        'room': each_room_db.room})
-                
-                elif each_room_db.room_data:
-                    if each_room_db.answer_status:
-                        if self_id[0] == each_room_db.curr_player_ans_id:
-                            self.emit('text', {
-                                'msg': 'You cannot agree to your own answer. ',
-                                'receiver_id': self_id[0],
-                                'room': each_room_db.room})
-                            return
-
-                        # if the game list is non-empty, the game continues.
-                        self.emit('text', {
-                            'msg': 'Bravo! You have now moved to the next round. ',
-                            'room': each_room_db.room})
-
-                        # timer cancels
-                        each_room_db.conversation_timer.cancel()
-
-                        self.on_show_and_query(each_room_db)
-
-                        each_room_db.answer_status = False
-                        each_room_db.count_msg = 0
-                    else:
-                        self.emit('text',
-                                  {'msg': 'This command cannot be processed. You have not'
-                                          ' started discussion with your partner. You have to '
-                                          'propose answers to each other and reach an agreement.',
-                                    'receiver_id': self_id[0],
-                                    'room': each_room_db.room})
+        each_room_db = self.COLA_GAME_DB.get(data['room'])
+        if each_room_db is not None and each_room_db.get_player(data['user']['id']):
+            # ID of the user #
+            self_id = data['user']['id']
+
+            if not each_room_db.ready_flag:
+                await self.send(each_room_db.room,
+                                'Both players have not typed /ready yet. ',
+                                receiver_id=self_id)
+
+            elif each_room_db.room_data:
+                if each_room_db.answer_status:
+                    if self_id == each_room_db.curr_player_ans_id:
+                        await self.send(each_room_db.room,
+                                        'You cannot agree to your own answer. ',
+                                        receiver_id=self_id)
+                        return
+
+                    # if the game list is non-empty, the game continues.
+                    await self.send(each_room_db.room,
+                                    'Bravo! You have now moved to the next round. ')
+
+                    # timer cancels
+                    each_room_db.conversation_timer.cancel()
+
+                    await self.on_show_and_query(each_room_db)
+
+                    each_room_db.answer_status = False
+                    each_room_db.count_msg = 0
                 else:
-                    # as soon as the list is empty, game end #
-                    if each_room_db.game_over_status is False and\
-                            each_room_db.answer_status is False:
-                        self.emit('text',
-                                  {'msg': 'This command cannot be processed. You have not '
-                                             'started discussion with your partner. You have to '
-                                             'propose answers to each other and reach an agreement.'
-                                             ' ',
-                                    'receiver_id': self_id[0],
-                                    'room': each_room_db.room})
-                    elif each_room_db.game_over_status is False and\
-                            each_room_db.answer_status is True:
-                        if self_id[0] == each_room_db.curr_player_ans_id:
-                            self.emit('text', {
-                                'msg': 'You cannot agree to your own answer. ',
-                                'receiver_id': self_id[0],
-                                'room': each_room_db.room})
-                            return
-                        self.game_over(each_room_db.room)
-                        each_room_db.game_over_status = True
-                    elif each_room_db.game_over_status is True:
-                        self.emit('text', {
-                            'msg': 'Cannot process this command. The game is already finished.'
-                                   ' ',
-                            'room': each_room_db.room})
-                    else:
-                        print("Something is wrong!!!")
-                    # self.game_over(data)
-
-    # message to end the game #
-    def game_over(self, room):
-        """ Called when game gets over and token is genrated for """
-        #global COLA_GAME_DB
-
-        self.emit('text', {'msg': 'Please enter the following token into' \
-                                  ' the field on the HIT webpage, and close this' \
-                                  ' browser window. ', 'room': room})
-        amt_token = self.confirmation_code(room)
-        self.emit('text', {'msg': 'Here\'s your token: {}'.format(f'{amt_token}'),
-                           'room': room})
-        self.close_game(room)
+                    await self.send(each_room_db.room,
+                                    'This command cannot be processed. You have not'
+                                    ' started discussion with your partner. You have to '
+                                    'propose answers to each other and reach an agreement.',
+                                    receiver_id=self_id)
+            else:
+                # as soon as the list is empty, game end #
+                if each_room_db.game_over_status is False and\
+                        each_room_db.answer_status is False:
+                    await self.send(each_room_db.room,
+                                    'This command cannot be processed. You have not '
+                                    'started discussion with your partner. You have to '
+                                    'propose answers to each other and reach an agreement.'
+                                    ' ',
+                                    receiver_id=self_id)
+                elif each_room_db.game_over_status is False and\
+                        each_room_db.answer_status is True:
+                    if self_id == each_room_db.curr_player_ans_id:
+                        await self.send(each_room_db.room,
+                                        'You cannot agree to your own answer. ',
+                                        receiver_id=self_id)
+                        return
+                    # set before awaiting, so that a second /agree is rejected
+                    each_room_db.game_over_status = True
+                    await self.game_over(each_room_db.room)
+                elif each_room_db.game_over_status is True:
+                    await self.send(each_room_db.room,
+                                    'Cannot process this command. The game is already finished.'
+                                    ' ')
+                else:
+                    LOG.error("Something is wrong!!!")
 
     # message to end the game #
-    def no_partner(self, room):
+    async def game_over(self, room):
         """ Called when game gets over and token is genrated for """
-        #global COLA_GAME_DB
-
-        self.emit('text', {'msg': 'Unfortunately we could not find a partner for you!', 'room': room})
-        self.emit('text', {'msg': 'Please enter the following token into' \
-                                  ' the field on the HIT webpage, and close this' \
-                                  ' browser window. ', 'room': room})
-        amt_token = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
-        status_txt = 'no_partner'
-        self.emit('log', {'room': room, 'type': "confirmation_log", 'amt_token':amt_token, 'status_txt':status_txt})
-        self.emit('text', {'msg': 'Here\'s your token: {}'.format(f'{amt_token}'),
-                           'room': room})
-        self.close_game(room)
-
-    def confirmation_code(self, room):
-        """ Generate AMT token that will be sent to each player """
-        amt_token = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
-        status_txt = 'success'
-
-        #token_log = random.choices(string.ascii_uppercase + string.digits, k=6)
-        self.emit('log', {'room': room, 'type': "confirmation_log", 'amt_token':amt_token, 'status_txt':status_txt})
-
-        return amt_token
-
-    def _command_noreply(self, data):
+        await self.send(room, 'Please enter the following token into'
+                              ' the field on the HIT webpage, and close this'
+                              ' browser window. ')
+        amt_token = await self.log_token(room, 'success')
+        await self.send(room, 'Here\'s your token: {}'.format(f'{amt_token}'))
+        await self.close_game(room, status='success')
+
+    # message to end the wait #
+    async def no_partner(self, user_id):
+        """ Called when a user has waited too long and token is genrated for """
+        room = self.waiting_room
+        await self.send(room, 'Unfortunately we could not find a partner for you!',
+                        receiver_id=user_id)
+        await self.send(room, 'Please enter the following token into'
+                              ' the field on the HIT webpage, and close this'
+                              ' browser window. ',
+                        receiver_id=user_id)
+        amt_token = await self.log_token(room, 'no_partner', receiver_id=user_id)
+        await self.send(room, 'Here\'s your token: {}'.format(f'{amt_token}'),
+                        receiver_id=user_id)
+        await self.send(room, 'The game is over! Thank you for your participation!',
+                        receiver_id=user_id)
+        await self.set_attribute(room, "type-area", "style", 'visibility:hidden',
+                                 receiver_id=user_id)
+
+    async def _command_noreply(self, data):
         """ If the partner does not reply """
-        #global COLA_GAME_DB
-
-        for each_room_db in self.COLA_GAME_DB:
-            if data['room'] == each_room_db.room:
-                room = each_room_db.room
-                # ID of the user #
-                all_players = each_room_db.players
-                self_id = [player['id'] for player in all_players
-                           if data['user']['id'] == player['id']]
-                other_id = [player['id'] for player in all_players
-                            if player['id'] != data['user']['id']]
-
-                # generate AMT token that will be sent to each player
-                amt_token = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
-                status_txt = 'no_reply'
-                self.emit('log', {'room': room, 'type': "confirmation_log", 'amt_token':amt_token, 'status_txt':status_txt})
-                self.emit('text', {'msg': 'Here\'s your token: {}'.format(f'{amt_token}'),
-                                   'room': room,
-                                   'receiver_id': self_id[0]})
-
-                self.emit('text', {'msg': 'Your partner closed the game, because you were not responding for a while.',
-                                   'room': room,
-                                   'receiver_id': other_id[0]})
-                
-                self.close_game(room)
-
-    def close_game(self, room):
-        self.emit('text', {'msg': 'The game is over! Thank you for your participation!',
-                                   'room': room})
-        self.emit('set_attribute', {
-                      'room': room,
-                      'id': "type-area",
-                      'attribute': "style",
-                      'value': 'visibility:hidden'
-                  })
-        if room != "waiting_room":
-            response = requests.put(f"{uri}/room/{room}",
-                                headers={'Authorization': f"Token {token}"},
-                                json=dict(read_only=True)
-                                )
-            print(response)
-            sys.stdout.flush()
-            
-            for each_room_db in self.COLA_GAME_DB:
-                each_room_db.game_closed = True
-                if room == each_room_db.room:
-                    if each_room_db.ready_timer:
-                        each_room_db.ready_timer.cancel()
-                    if each_room_db.conversation_timer:
-                        each_room_db.conversation_timer.cancel()
-                    if each_room_db.answer_timer:
-                        each_room_db.answer_timer.cancel()
-                    if each_room_db.join_timer:
-                        each_room_db.join_timer.cancel()
-
-                    # all_players = each_room_db.players
-                    # for player in all_players:
-                    #     print(player)
-                    #     sys.stdout.flush()
-                        
-                    #     self.emit("leave_room", {'user': player["id"], 'room': room})
-                    #     user_id = player["id"]
-                    #     response = requests.get(f"{uri}/user/{user_id}",
-                    #                             headers={'Authorization': f"Token {token}"})
-                    #     print(response.text)
-                    #     sys.stdout.flush()
-                    #     user_token = response.json()["token"]
-                    #     response = requests.delete(f"{uri}/token/{user_token}",
-                    #                             headers={'Authorization': f"Token {token}"})
-                    #     print(response)
-                    #     sys.stdout.flush()
-                        
-                
-
-    def on_status(self, data):
+        each_room_db = self.COLA_GAME_DB.get(data['room'])
+        if each_room_db is not None and each_room_db.get_player(data['user']['id']):
+            if each_room_db.game_closed:
+                await self.send(each_room_db.room,
+                                'Cannot process this command. The game is already finished.'
+                                ' ',
+                                receiver_id=data['user']['id'])
+                return
+            room = each_room_db.room
+            # ID of the user #
+            self_id = data['user']['id']
+            other_id = each_room_db.get_partner(self_id)
+
+            # generate AMT token that will be sent to each player
+            amt_token = await self.log_token(room, 'no_reply', receiver_id=self_id)
+            await self.send(room, 'Here\'s your token: {}'.format(f'{amt_token}'),
+                            receiver_id=self_id)
+
+            await self.send(room, 'Your partner closed the game, because you were not responding for a while.',
+                            receiver_id=other_id)
+
+            await self.close_game(room, status='no_reply')
+
+    async def close_game(self, room, status=None):
+        """ End the game in a room and archive it.
+
+        The game stays available for late messages for TIME_EVICT minutes,
+        then it is removed from memory.
+        """
+        each_room_db = self.COLA_GAME_DB.get(room)
+        if each_room_db is not None and not each_room_db.game_closed:
+            each_room_db.close(status)
+            self.archive(each_room_db)
+            asyncio.get_running_loop().call_later(
+                60*TIME_EVICT, self.COLA_GAME_DB.pop, room, None
+            )
+        self.open_rooms.discard(room)
+        self.last_log_id.pop(room, None)
+
+        await self.send(room, 'The game is over! Thank you for your participation!')
+        await self.set_attribute(room, "type-area", "style", 'visibility:hidden')
+        await self.set_attribute(room, "text", "readonly", "True")
+        await self._check_drained()
+
+    def schedule_resync(self, room, user_id):
+        """ Restore the display of a rejoined user once the rejoins settle """
+        self.cancel_resync(room, user_id)
+        self.resync_timers[room, user_id] = self.later(
+            TIME_RESYNC, self.resync, room, user_id
+        )
+
+    def cancel_resync(self, room, user_id):
+        timer = self.resync_timers.pop((room, user_id), None)
+        if timer is not None:
+            timer.cancel()
+
+    async def resync(self, room, user_id):
+        """ Push the current image and question of a room to one user """
+        self.resync_timers.pop((room, user_id), None)
+        each_room_db = self.COLA_GAME_DB.get(room)
+        # the state is read now, so the user gets the latest one
+        if each_room_db is None or each_room_db.current_state is None:
+            return
+        curr_data = each_room_db.current_state
+        await asyncio.gather(
+            self.set_attribute(room, "current-image", "src", curr_data['data'],
+                               receiver_id=user_id),
+            self.set_text(room, "status-box", curr_data['question'],
+                          receiver_id=user_id),
+        )
+
+    @staticmethod
+    def archive(game_db):
+        """ Append the summary of a finished game to the archive file """
+        with open(ARCHIVE_FILE, "a") as archive_file:
+            archive_file.write(json.dumps(game_db.summary()) + "\n")
+
+    async def on_status(self, data):
         """  determine join/leave/rejoin status and display corresponding messages  """
-
-        #global COLA_GAME_DB
-        print("status:", data)
-        sys.stdout.flush()
+        LOG.debug(f"Status: {data}")
 
         # If this function is called because a player joins the room ...
         # Occurs when the player re-joins the room
         if data['type'] == "join":
-            if data['room'] == "waiting_room":
-                if not self.WAITING_TIMER.is_alive():
-                    self.WAITING_TIMER = Timer(5*60,
-                                            self.no_partner,
-                                            args=[data['room']]
-                                            )
-                    self.WAITING_TIMER.start()
+            if data['room'] == self.waiting_room:
+                if str(data['user']['id']) != str(self.user):
+                    self.waiting.add(data['user']['id'])
             else:
                 # ... find the correct database.
-                for each_room_db in self.COLA_GAME_DB:
-                    if each_room_db.room == data['room']:
-                        # update the display for the rejoined user.
-                        curr_data = each_room_db.current_state
-                        if curr_data is not None:
-                            rejoin_timer = Timer(3*1, self.emit, args=['set_attribute',
-                                                            {
-                                                                    'room':data['room'],
-                                                                    'id': "current-image",
-                                                                    'attribute': "src",
-                                                                    'value': curr_data['data'],
-                                                                    'receiver_id': data['user']['id']
-                                                                }
-                                                        ])
-                            rejoin_timer.start()
-
-                            rejoin_timer2 = Timer(3*1, self.emit, args=['set_text',
-                                                                        {
-                                                                            'room': data['room'],
-                                                                            'id': "status-box",
-                                                                            'text': curr_data['question'],
-                                                                            'receiver_id': data['user']['id']
-                                                                        }
-                                                        ])
-                            rejoin_timer2.start()
-
-                        other_user = [player for player in each_room_db.players
-                                    if player['id'] != data['user']['id']]
-                        user_name = data['user']['name']
-                        # Send a message to the other user, that the current user has
-                        # rejoined the chat.
-                        self.emit('text',
-                                {
-                                    'msg': f'{user_name} has rejoined the game.',
-                                    'room': each_room_db.room,
-                                    'receiver_id': other_user[0]['id']
-                                })
+                each_room_db = self.COLA_GAME_DB.get(data['room'])
+                if each_room_db is not None and each_room_db.get_player(data['user']['id']):
+                    # update the display for the rejoined user.
+                    self.schedule_resync(data['room'], data['user']['id'])
+
+                    other_user = each_room_db.get_partner(data['user']['id'])
+                    user_name = data['user']['name']
+                    # Send a message to the other user, that the current user has
+                    # rejoined the chat.
+                    await self.send(each_room_db.room, f'{user_name} has rejoined the game.',
+                                    receiver_id=other_user)
 
         # If this function is called because a player left the room ...
         if data['type'] == "leave":
-            for each_room_db in self.COLA_GAME_DB:
-                    # ... find the correct database.
-                    if each_room_db.room == data['room']:
-    #                    if data['user']['token']['task'] is not None:
-                        other_user = [player for player in each_room_db.players if
-                                    player['id'] != data['user']['id']]
-                        user_name = data['user']['name']
-                        # Send a message to the other user, that the current user has left the chat.
-                        self.emit('text', {'msg': f'{user_name} has left the game. Please wait a '
-                                                f'bit, your partner may rejoin.',
-                                        'room': each_room_db.room,
-                                        'receiver_id': other_user[0]['id']})
+            if data['room'] == self.waiting_room:
+                self.waiting.remove(data['user']['id'])
+            # ... find the correct database.
+            each_room_db = self.COLA_GAME_DB.get(data['room'])
+            if each_room_db is not None and each_room_db.get_player(data['user']['id']):
+                self.cancel_resync(data['room'], data['user']['id'])
+                other_user = each_room_db.get_partner(data['user']['id'])
+                user_name = data['user']['name']
+                # Send a message to the other user, that the current user has left the chat.
+                await self.send(each_room_db.room,
+                                f'{user_name} has left the game. Please wait a '
+                                f'bit, your partner may rejoin.',
+                                receiver_id=other_user)
+
+
+async def main(args):
+    cola_bot = ColaBot(args.token, args.user, args.host, args.port)
+    cola_bot.task_id = args.task_id
+    cola_bot.waiting_room = args.waiting_room
+
+    # finish running games before shutting down, e.g. on `docker stop`
+    asyncio.get_running_loop().add_signal_handler(
+        signal.SIGTERM, lambda: asyncio.ensure_future(cola_bot.drain())
+    )
+
+    # connect to chat server
+    await cola_bot.run()
+
 
 if __name__ == '__main__':
-    print("bot started")
-    parser = argparse.ArgumentParser(description='Cola Bot')
+    # set up logging configuration
+    logging.basicConfig(level=logging.DEBUG, format="%(levelname)s:%(message)s")
 
-    if 'TOKEN' in os.environ:
-        token = {'default': os.environ['TOKEN']}
-    else:
-        token = {'required': True}
+    # create commandline parser
+    parser = argparse.ArgumentParser(description='Run Cola Bot.')
 
-    if 'CHAT_HOST' in os.environ:
-        chat_host = {'default': os.environ['CHAT_HOST']}
+    # collect environment variables as defaults
+    if "SLURK_TOKEN" in os.environ:
+        token = {"default": os.environ["SLURK_TOKEN"]}
     else:
-        chat_host = {'default': 'http://localhost'}
-
-    if 'CHAT_PORT' in os.environ:
-        chat_port = {'default': os.environ['CHAT_PORT']}
+        token = {"required": True}
+    if "SLURK_USER" in os.environ:
+        user = {"default": os.environ["SLURK_USER"]}
     else:
-        chat_port = {'default': None}
-
-    if 'COLA_TASK_ID' in os.environ:
-        task_id = {'default': os.environ['COLA_TASK_ID']}
+        user = {"required": True}
+    if "SLURK_WAITING_ROOM" in os.environ:
+        waiting_room = {"default": os.environ["SLURK_WAITING_ROOM"]}
     else:
-        task_id = {'default': None}
-
-    parser.add_argument('-t', '--token',
-                        help='token for logging in as bot (see SERVURL/token)',
-                        **token)
-    parser.add_argument('-c', '--chat_host',
-                        help='full URL (protocol, hostname; ending with /) of chat server',
-                        **chat_host)
-    parser.add_argument('-p', '--chat_port',
-                        type=int,
-                        help='port of chat server',
-                        **chat_port)
-    parser.add_argument('--task_id',
-                        type=int,
-                        help='Task to join',
-                        **task_id)
+        waiting_room = {"required": True}
+    host = {"default": os.environ.get("SLURK_HOST", "http://localhost")}
+    port = {"default": os.environ.get("SLURK_PORT")}
+    task_id = {"default": os.environ.get("COLA_TASK_ID")}
+    archive = {"default": os.environ.get("COLA_ARCHIVE", ARCHIVE_FILE)}
+    rotation = {"default": os.environ.get("COLA_ROTATION", ROTATION_FILE)}
+
+    # register commandline arguments
+    parser.add_argument(
+        "-t", "--token", help="token for logging in as bot", **token
+    )
+    parser.add_argument("-u", "--user", help="user id for the bot", **user)
+    parser.add_argument(
+        "-c", "--host", help="full URL (protocol, hostname) of chat server", **host
+    )
+    parser.add_argument("-p", "--port", type=int, help="port of chat server", **port)
+    parser.add_argument(
+        "--waiting_room", type=int, help="room where users await their partner", **waiting_room
+    )
+    parser.add_argument("--task_id", type=int, help="task to join", **task_id)
+    parser.add_argument(
+        "--archive", help="file to which summaries of finished games are appended", **archive
+    )
+    parser.add_argument(
+        "--rotation", help="file keeping track of the games played recently", **rotation
+    )
     args = parser.parse_args()
-    TASK_ID = args.task_id
-
-    uri = args.chat_host
-    if args.chat_port:
-        uri += f":{args.chat_port}"
-
-    print("running cola bot on", uri, "with token", args.token)
-    sys.stdout.flush()
-    uri += "/api/v2"
-    token = args.token
-
-    # We pass token and name in request header
-    socketIO = SocketIO(args.chat_host, args.chat_port,
-                        headers={'Authorization': args.token, 'Name': 'Cola Bot'},
-                        Namespace=ChatNamespace)
-    socketIO.wait()
+    ARCHIVE_FILE = args.archive
+    scheduler.open(args.rotation)
+
+    asyncio.run(main(args))
@@ -0,0 +1,123 @@
+"""
+Process-wide catalog of the CoLA game content.
+The config, the game list and the category files are read
+once and shared by all rooms as read-only structures.
+They are read again when one of the files changes.
+"""
+import configparser
+import json
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+from types import MappingProxyType
+
+LOG = logging.getLogger(__name__)
+
+# data files are given relative to this directory in the config
+PROC_PATH = os.path.dirname(os.path.abspath(__file__))
+CONFIG_FILE = os.path.join(PROC_PATH, 'cola_config.ini')
+# seconds between two checks whether the files have changed
+RELOAD_INTERVAL = 30
+
+# config: section -> option -> value
+# games: names of the games that can be played
+# categories: game -> names of its categories / rules
+# patterns: law -> (file, whether its question belongs to the law)
+#   of the generated whichpattern stimuli
+Catalog = namedtuple('Catalog', ['config', 'games', 'categories', 'patterns'])
+
+# game -> (file option in the config, key of the category names
+# in that file, None if the names are the keys of the file)
+CATEGORY_FILES = {
+    'birds': ('birds_json', None),
+    'synthetic': ('synthetic_json', 'rules'),
+    'textcomp': ('textcomp_json', 'rules'),
+}
+
+_lock = threading.Lock()
+_catalog = None
+_mtimes = None
+_checked_at = None
+
+
+def get_catalog():
+    """ The current catalog, reloaded if one of its files has changed """
+    global _catalog, _mtimes, _checked_at
+
+    with _lock:
+        now = time.monotonic()
+        if _catalog is not None and now - _checked_at < RELOAD_INTERVAL:
+            return _catalog
+        _checked_at = now
+
+        mtimes = _get_mtimes(_catalog)
+        if _catalog is None or mtimes != _mtimes:
+            _catalog = _load()
+            # the files may have changed in the meantime, and
+            # config changes may have added or removed files
+            _mtimes = _get_mtimes(_catalog)
+            LOG.info(f"Loaded cola catalog with games {_catalog.games}")
+        return _catalog
+
+
+def _paths(catalog):
+    """ All files the catalog is built from """
+    paths = [CONFIG_FILE]
+    if catalog is not None:
+        process = catalog.config['process']
+        paths.append(os.path.join(PROC_PATH, process['game_file']))
+        for option, _ in CATEGORY_FILES.values():
+            paths.append(os.path.join(PROC_PATH, process[option]))
+        paths.append(os.path.join(PROC_PATH, process['pattern_index']))
+    return paths
+
+
+def _get_mtimes(catalog):
+    mtimes = []
+    for path in _paths(catalog):
+        try:
+            mtimes.append(os.stat(path).st_mtime_ns)
+        except OSError:
+            mtimes.append(None)
+    return tuple(mtimes)
+
+
+def _load():
+    parser = configparser.ConfigParser()
+    parser.read(CONFIG_FILE)
+    config = MappingProxyType({
+        section: MappingProxyType(dict(parser[section]))
+        for section in parser.sections()
+    })
+    process = config['process']
+
+    with open(os.path.join(PROC_PATH, process['game_file'])) as file:
+        games = tuple(line.strip() for line in file if line.strip())
+
+    categories = {}
+    for game, (option, key) in CATEGORY_FILES.items():
+        path = os.path.join(PROC_PATH, process[option])
+        try:
+            with open(path) as file:
+                content = json.load(file)
+        except OSError:
+            LOG.warning(f"No category file for {game}: {path}")
+            content = {}
+        names = content if key is None else content.get(key, [])
+        categories[game] = tuple(names)
+
+    path = os.path.join(PROC_PATH, process['pattern_index'])
+    try:
+        with open(path) as file:
+            index = json.load(file)
+    except OSError:
+        LOG.warning(f"No generated patterns, using the pre-rendered ones: {path}")
+        index = {}
+    patterns = MappingProxyType({
+        law: tuple((entry['file'], entry['belongs']) for entry in entries)
+        for law, entries in index.items() if entries
+    })
+
+    return Catalog(config, games, MappingProxyType(categories), patterns)
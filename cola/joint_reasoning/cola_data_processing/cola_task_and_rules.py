@@ -4,20 +4,23 @@ game data.
 This script is called when new task room
 is created.
 """
-import configparser
-import os
+import logging
 import random
-import string
 
-# Read the config file #
-CONFIG = configparser.ConfigParser()
-# change the path for config file
-CONFIG.read('/usr/src/cola/cola_data_processing/cola_config.ini')
+LOG = logging.getLogger(__name__)
 
-def process_whichpattern(input_dict, n_ques, room):
+
+def process_whichpattern(input_dict, n_ques, room, data_url, patterns=None):
+    """ Questions on the generated stimuli of `patterns` (law -> pairs
+    of file and whether the question belongs to the law), on the
+    pre-rendered images if there are none
+    """
     SYN_ROOM_DICT = []
-    laws = ['more_red_than_black', 'upper_left_red', 'diagonal_red']
-    rands = random.sample(laws, n_ques)
+    laws = list(patterns) if patterns else ['more_red_than_black', 'upper_left_red', 'diagonal_red']
+    if n_ques > len(laws):
+        LOG.warning(f"{n_ques} whichpattern questions per game, but only "
+                    f"{len(laws)} laws, asking {len(laws)} questions")
+    rands = random.sample(laws, min(n_ques, len(laws)))
     for law in rands:
         instances = str(4)
         ques = 'Based on the examples that are shown for class A, discuss whether the question example belongs to class A or not. \n\n\n\n' \
@@ -29,16 +32,23 @@ def process_whichpattern(input_dict, n_ques, room):
                'Look for the number of blocks of a type, lines of one color or positions in the grid.'\
                'The other player must then type "/agree", to show that this answer is indeed the joint answer. \n\n' \
                'You can keep discussing after a proposal has been made, but the round only ends once one of you has typed a proposal and the other has agreed to it.'
-        rand = random.choice(range(5))
-        filename = law + '_' + instances + '_' + str(rand) + ".jpg"
+        if patterns:
+            filename, belongs = random.choice(patterns[law])
+        else:
+            rand = random.choice(range(5))
+            filename = law + '_' + instances + '_' + str(rand) + ".jpg"
+            # not known for the pre-rendered images
+            belongs = None
 
         SYN_ROOM_DICT.append({
             'question': ques,
-            'data': CONFIG['path']['data_url'] + filename
+            'data': data_url + filename,
+            'law': law,
+            'belongs': belongs
         })
     return SYN_ROOM_DICT
 
-def process_whichbird(input_dict, n_ques, room):
+def process_whichbird(input_dict, n_ques, room, data_url):
     SYN_ROOM_DICT = []
     
     rands = random.sample(range(10), n_ques)
@@ -56,26 +66,29 @@ def process_whichbird(input_dict, n_ques, room):
                         'Don‘t just say "because it fits the description" in your answer. Please explain why you think the picture fits the text based on specific features.\n\n' \
                         'The other player must then type "/agree", to show that this answer is indeed the joint answer. \n\n' \
                         'You can keep discussing after a proposal has been made, but the round only ends once one of you has typed a proposal and the other player has agreed to it.',
-            'data': CONFIG['path']['data_url'] + filename
+            'data': data_url + filename
         })
     return SYN_ROOM_DICT
 
 
-def call_the_task(dict_task, num_ques, room_name):
+def call_the_task(dict_task, num_ques, room_name, catalog):
     """
     Called by the bot to get the data for the room
     :param dict_task: dict of task
+    :param catalog: content catalog, see catalog.get_catalog()
     :return: game_room_data  A dict of Question, Build-up Category Name and Data list
     """
+    data_url = catalog.config['path']['data_url']
     print(dict_task)
     all_data = []
     # Check which game
     for game in dict_task.keys():
         print(game)
         if game == 'whichpattern':
-            new_data = process_whichpattern(dict_task, num_ques, room_name)
+            new_data = process_whichpattern(dict_task, num_ques, room_name, data_url,
+                                            catalog.patterns)
         elif game == 'whichbird':
-            new_data = process_whichbird(dict_task, num_ques, room_name)
+            new_data = process_whichbird(dict_task, num_ques, room_name, data_url)
         else:
             continue
         print("new data: ",new_data)
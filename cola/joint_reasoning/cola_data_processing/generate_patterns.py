@@ -0,0 +1,234 @@
+"""
+Generate stimuli for the 'whichpattern' game.
+Each stimulus shows examples of class A, grids of coloured
+blocks that follow a law, and a question grid that may or may
+not follow it. Images are rendered from NumPy arrays and written
+as PNG files, an index of all stimuli is written for the bot.
+
+    python -m cola_data_processing.generate_patterns -n 20000 -o <image dir>
+
+The images have to be served under the data_url of the config,
+the index goes to the pattern_index of the config by default.
+"""
+import argparse
+import json
+import os
+import struct
+import zlib
+from multiprocessing import Pool
+
+import numpy as np
+
+from .catalog import CONFIG_FILE, PROC_PATH
+
+# colours of the blocks, indexed by the values of a grid
+EMPTY, RED, BLACK, YELLOW, BLUE = range(5)
+PALETTE = np.array([
+    [255, 255, 255],
+    [214, 39, 40],
+    [30, 30, 30],
+    [240, 200, 30],
+    [31, 119, 180],
+], dtype=np.uint8)
+LINE_COLOUR = (200, 200, 200)
+FRAME_COLOUR = (120, 120, 120)
+
+SIZE = 4           # blocks per row and column of a grid
+CELL = 24          # pixels per block
+MARGIN = 16        # pixels between two grids
+GAP = 64           # pixels between the examples and the question
+N_EXAMPLES = 4     # examples of class A per stimulus
+CHUNK = 256        # stimuli rendered by a worker at a time
+
+
+# --- laws --------------------------------------------------------------------------
+# Each law is a pair of functions: `holds(grid)` tells whether a grid
+# follows the law, `enforce(grid, rng)` changes a grid so that it does.
+# Negative examples are random grids for which the law does not hold.
+def _more_red_than_black(grid):
+    return np.count_nonzero(grid == RED) > np.count_nonzero(grid == BLACK)
+
+
+def _enforce_more_red_than_black(grid, rng):
+    while not _more_red_than_black(grid):
+        blacks = np.argwhere(grid == BLACK)
+        if len(blacks):
+            grid[tuple(blacks[rng.randint(len(blacks))])] = RED
+        else:
+            grid[rng.randint(SIZE), rng.randint(SIZE)] = RED
+
+
+def _upper_left_red(grid):
+    return grid[0, 0] == RED
+
+
+def _enforce_upper_left_red(grid, rng):
+    grid[0, 0] = RED
+
+
+def _diagonal_red(grid):
+    return bool(np.all(np.diag(grid) == RED))
+
+
+def _enforce_diagonal_red(grid, rng):
+    np.fill_diagonal(grid, RED)
+
+
+def _red_row(grid):
+    return bool(np.any(np.all(grid == RED, axis=1)))
+
+
+def _enforce_red_row(grid, rng):
+    grid[rng.randint(SIZE)] = RED
+
+
+def _no_black(grid):
+    return not np.any(grid == BLACK)
+
+
+def _enforce_no_black(grid, rng):
+    blacks = grid == BLACK
+    grid[blacks] = rng.choice([EMPTY, RED, YELLOW, BLUE], size=np.count_nonzero(blacks))
+
+
+def _mirrored(grid):
+    return bool(np.array_equal(grid, grid[:, ::-1]))
+
+
+def _enforce_mirrored(grid, rng):
+    grid[:, SIZE // 2:] = grid[:, :SIZE // 2][:, ::-1]
+
+
+LAWS = {
+    'more_red_than_black': (_more_red_than_black, _enforce_more_red_than_black),
+    'upper_left_red': (_upper_left_red, _enforce_upper_left_red),
+    'diagonal_red': (_diagonal_red, _enforce_diagonal_red),
+    'red_row': (_red_row, _enforce_red_row),
+    'no_black': (_no_black, _enforce_no_black),
+    'mirrored': (_mirrored, _enforce_mirrored),
+}
+
+
+def random_grid(rng):
+    return rng.randint(len(PALETTE), size=(SIZE, SIZE))
+
+
+def make_grid(law, positive, rng):
+    """ A random grid that follows the law, or that does not """
+    holds, enforce = LAWS[law]
+    while True:
+        grid = random_grid(rng)
+        if positive:
+            enforce(grid, rng)
+        if holds(grid) == positive:
+            return grid
+
+
+# --- rendering ---------------------------------------------------------------------
+def render_grid(grid):
+    """ RGB image of a grid, one CELL x CELL square per block """
+    blocks = np.repeat(np.repeat(grid, CELL, axis=0), CELL, axis=1)
+    image = PALETTE[blocks]
+    image[::CELL, :] = LINE_COLOUR
+    image[:, ::CELL] = LINE_COLOUR
+    image[-1, :] = LINE_COLOUR
+    image[:, -1] = LINE_COLOUR
+    return image
+
+
+def render_stimulus(examples, question):
+    """ The examples in a row, followed by the framed question grid """
+    side = SIZE * CELL
+    width = MARGIN + len(examples) * (side + MARGIN) + GAP + side + MARGIN
+    height = side + 2 * MARGIN
+    canvas = np.full((height, width, 3), 255, dtype=np.uint8)
+
+    x = MARGIN
+    for grid in examples:
+        canvas[MARGIN:MARGIN + side, x:x + side] = render_grid(grid)
+        x += side + MARGIN
+    x += GAP
+    frame = MARGIN // 4
+    canvas[MARGIN - frame:MARGIN + side + frame, x - frame:x + side + frame] = FRAME_COLOUR
+    canvas[MARGIN:MARGIN + side, x:x + side] = render_grid(question)
+    return canvas
+
+
+def write_png(path, image):
+    """ Write an RGB image as PNG using zlib only """
+    height, width, _ = image.shape
+    # every scanline starts with filter type 0 (none)
+    raw = np.zeros((height, width * 3 + 1), dtype=np.uint8)
+    raw[:, 1:] = image.reshape(height, width * 3)
+
+    def chunk(kind, data):
+        return (struct.pack('>I', len(data)) + kind + data
+                + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff))
+
+    with open(path, 'wb') as file:
+        file.write(b'\x89PNG\r\n\x1a\n')
+        file.write(chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)))
+        file.write(chunk(b'IDAT', zlib.compress(raw.tobytes(), 6)))
+        file.write(chunk(b'IEND', b''))
+
+
+# --- generation --------------------------------------------------------------------
+def _render_chunk(job):
+    """ Render stimuli start..start+count of a law, returns their index entries """
+    law, start, count, seed, out_dir, prefix = job
+    rng = np.random.RandomState(seed)
+    entries = []
+    for number in range(start, start + count):
+        examples = [make_grid(law, True, rng) for _ in range(N_EXAMPLES)]
+        positive = bool(rng.randint(2))
+        question = make_grid(law, positive, rng)
+        filename = f'{prefix}/{law}_{number:06d}.png'
+        write_png(os.path.join(out_dir, filename), render_stimulus(examples, question))
+        entries.append({'file': filename, 'belongs': positive})
+    return law, entries
+
+
+def generate(n, out_dir, laws=None, prefix='patterns', seed=0, processes=None):
+    """ Render n stimuli per law in parallel
+
+    :return: dict law -> index entries of its stimuli
+    """
+    laws = laws or list(LAWS)
+    os.makedirs(os.path.join(out_dir, prefix), exist_ok=True)
+    jobs = []
+    for law in laws:
+        for start in range(0, n, CHUNK):
+            jobs.append((law, start, min(CHUNK, n - start), seed + len(jobs), out_dir, prefix))
+
+    index = {law: [] for law in laws}
+    with Pool(processes) as pool:
+        for law, entries in pool.imap_unordered(_render_chunk, jobs):
+            index[law].extend(entries)
+    for entries in index.values():
+        entries.sort(key=lambda entry: entry['file'])
+    return index
+
+
+if __name__ == '__main__':
+    import configparser
+
+    config = configparser.ConfigParser()
+    config.read(CONFIG_FILE)
+    default_index = os.path.join(PROC_PATH, config['process']['pattern_index'])
+
+    parser = argparse.ArgumentParser(description='Generate whichpattern stimuli.')
+    parser.add_argument('-n', type=int, default=1000, help='stimuli per law')
+    parser.add_argument('-o', '--out_dir', required=True,
+                        help='directory served under data_url')
+    parser.add_argument('--laws', nargs='+', choices=list(LAWS), help='laws to render')
+    parser.add_argument('--index', default=default_index, help='index file to write')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first worker')
+    parser.add_argument('--processes', type=int, help='number of worker processes')
+    args = parser.parse_args()
+
+    index = generate(args.n, args.out_dir, args.laws, seed=args.seed,
+                     processes=args.processes)
+    os.makedirs(os.path.dirname(os.path.abspath(args.index)), exist_ok=True)
+    with open(args.index, 'w') as file:
+        json.dump(index, file)
+    print(f"{sum(map(len, index.values()))} stimuli written to {args.out_dir}")
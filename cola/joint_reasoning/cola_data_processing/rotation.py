@@ -0,0 +1,145 @@
+"""
+Rotation of games and categories over the rooms.
+Every name of a pool is handed out once before any name is
+repeated. The order is shuffled anew for each such epoch.
+The rotation state can be persisted, so that a restarted bot
+continues where the last one stopped.
+"""
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+
+LOG = logging.getLogger(__name__)
+
+# seconds between two writes of the state file while drawing
+SAVE_INTERVAL = 10
+
+
+class Rotation:
+    """ Draws names of one pool without replacement """
+
+    def __init__(self, names=(), remaining=(), epoch=0):
+        self.names = set(names)
+        # states saved by older versions may hold names several times
+        self.remaining = deque(dict.fromkeys(remaining))
+        self.epoch = epoch
+        # the sequence the names were last synced with
+        self._source = None
+
+    def sync(self, names):
+        """ Follow changes of the pool, e.g. after the catalog was reloaded """
+        if names is self._source:
+            return
+        self._source = names
+        names = set(names)
+        if names == self.names:
+            return
+        added = list(names - self.names)
+        random.shuffle(added)
+        self.remaining = deque(name for name in self.remaining if name in names)
+        self.remaining.extend(added)
+        self.names = names
+
+    def draw(self, k):
+        """ The next k names, names repeat only if the pool is smaller than k """
+        drawn = []
+        while len(drawn) < k and self.names:
+            if not self.remaining:
+                self._new_epoch(drawn)
+            drawn.append(self.remaining.popleft())
+        return drawn
+
+    def put_back(self, names):
+        """ Hand out names that were drawn but not used next """
+        names = [name for name in dict.fromkeys(names) if name in self.names]
+        self.remaining = deque(name for name in self.remaining if name not in names)
+        self.remaining.extendleft(reversed(names))
+
+    def _new_epoch(self, drawn):
+        # names of the current draw come last to avoid repeating them,
+        # each once and the most recently drawn last, as a draw larger
+        # than the pool holds names several times
+        order = list(self.names - set(drawn))
+        random.shuffle(order)
+        self.remaining.extend(order)
+        recent = list(dict.fromkeys(reversed(drawn)))[::-1]
+        self.remaining.extend(name for name in recent if name in self.names)
+        self.epoch += 1
+
+    def to_json(self):
+        return {"names": sorted(self.names), "remaining": list(self.remaining),
+                "epoch": self.epoch}
+
+
+class RotationScheduler:
+    """ Thread-safe rotations of several pools, persisted to `path` """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.rotations = {}
+        self._lock = threading.Lock()
+        self._saved_at = 0
+
+    def open(self, path):
+        """ Persist the rotations to `path`, continuing from its state """
+        with self._lock:
+            self.path = path
+            try:
+                with open(path) as file:
+                    state = json.load(file)
+            except FileNotFoundError:
+                return
+            except (OSError, ValueError) as error:
+                LOG.error(f"Could not read rotation state {path}: {error}")
+                return
+            for pool, rotation in state.items():
+                self.rotations[pool] = Rotation(
+                    rotation["names"], rotation["remaining"], rotation["epoch"]
+                )
+
+    def draw(self, pool, names, k):
+        """ Draw k of the names of a pool
+
+        :param pool: Name of the pool, e.g. a game or 'games'
+        :param names: All names of the pool
+        :param k: Number of names to draw
+        """
+        with self._lock:
+            rotation = self.rotations.setdefault(pool, Rotation())
+            rotation.sync(names)
+            drawn = rotation.draw(k)
+            if time.monotonic() - self._saved_at >= SAVE_INTERVAL:
+                self._save()
+            return drawn
+
+    def put_back(self, pool, names):
+        """ Return names drawn from a pool that were not used """
+        with self._lock:
+            rotation = self.rotations.get(pool)
+            if rotation is not None:
+                rotation.put_back(names)
+
+    def save(self):
+        with self._lock:
+            self._save()
+
+    def _save(self):
+        self._saved_at = time.monotonic()
+        if self.path is None:
+            return
+        state = {pool: rotation.to_json() for pool, rotation in self.rotations.items()}
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w") as file:
+                json.dump(state, file)
+            os.replace(tmp_path, self.path)
+        except OSError as error:
+            LOG.error(f"Could not save rotation state {self.path}: {error}")
+
+
+# rotations shared by all rooms of the process
+scheduler = RotationScheduler()
@@ -1,12 +1,12 @@
-import configparser
-import os
-import json
+import time
+from collections import namedtuple
 from cola_data_processing import cola_task_and_rules
+from cola_data_processing.catalog import get_catalog
+from cola_data_processing.rotation import scheduler
 
-LAST_GAMES_PLAYED = []
-LAST_BIRDS_CATEGORY = []
-LAST_SYNTHETIC_CATEGORY = []
-LAST_TEXT_CATEGORY = []
+# games of a room, the questions / data of its rounds and
+# the (pool, names) drawn from the rotations for it
+RoomPlan = namedtuple('RoomPlan', ['game_names', 'room_data', 'draws'])
 
 class ColaGameDb():
     """
@@ -23,15 +23,17 @@ class ColaGameDb():
 
     # initialize the object variables
     def __init__(self, room):
-        # Read the config file #
-        self.CONFIG = configparser.ConfigParser()
-        self.CONFIG.read('cola_data_processing/cola_config.ini')
-
         self.room = room
         self.players = []
+        # player id -> player, and player id -> ids of the other players
+        self.players_by_id = {}
+        self.partners = {}
         self.room_data_ready = False
         self.game_names = []
         self.room_data = []
+        # image, law and whether the question belongs to the law of
+        # each round, kept for the archive after room_data is dropped
+        self.stimuli = []
         self.answer_status = False
         self.count_msg = 0
         self.first_answer = False
@@ -46,126 +48,137 @@ class ColaGameDb():
         self.answer_timer = None
         self.join_timer = None
 
+        # set once the game has ended, see close()
+        self.game_closed = False
+        self.status = None
+        self.num_rounds = 0
+        self.rounds_played = 0
+        self.closed_at = None
+
     # --- instance methods --------------------------------------------------------
     def add_users(self, player):
         """ Assign a person to the instance of the database."""
         if not self.room_data_ready:
             player['got_noreply_token'] = False
+            for other_id in self.players_by_id:
+                self.partners[other_id].append(player['id'])
+            self.partners[player['id']] = list(self.players_by_id)
             self.players.append(player)
+            self.players_by_id[player['id']] = player
         else:
             print("Players should be present, once room data is ready!")
 
+    def get_player(self, user_id):
+        """ The player with this id, None if the user does not play here."""
+        return self.players_by_id.get(user_id)
+
+    def get_partner(self, user_id):
+        """ Id of the (first) other player in the room."""
+        partners = self.partners.get(user_id)
+        return partners[0] if partners else None
+
+    def close(self, status=None):
+        """ Stop the timers of a finished game and drop its room data.
+
+        Only what summary() reports is kept afterwards.
+        """
+        for timer in (self.ready_timer, self.conversation_timer,
+                      self.answer_timer, self.join_timer):
+            if timer:
+                timer.cancel()
+        self.rounds_played = self.num_rounds - len(self.room_data)
+        self.room_data = []
+        self.current_state = None
+        self.game_over_status = True
+        self.game_closed = True
+        self.status = status
+        self.closed_at = time.time()
+
+    def summary(self):
+        """ Compact record of a finished game for the archive."""
+        return {
+            'room': self.room,
+            'players': [{'id': player['id'], 'name': player['name']}
+                        for player in self.players],
+            'games': self.game_names,
+            'rounds': self.num_rounds,
+            'rounds_played': self.rounds_played,
+            'stimuli': self.stimuli[:self.rounds_played],
+            'status': self.status,
+            'closed_at': self.closed_at,
+        }
+
     def generate_cola_data(self):
         """" Generate data for each room """
+        self.apply_plan(ColaGameDb.make_plan())
+
+    def apply_plan(self, plan):
+        """ Use a plan made by make_plan() as the data of this room """
+        self.game_names = list(plan.game_names)
+        self.room_data = list(plan.room_data)
+        self.stimuli = [
+            {'data': data['data'], 'law': data.get('law'), 'belongs': data.get('belongs')}
+            for data in plan.room_data
+        ]
+
+        # the data for the game is ready
+        self.room_data_ready = True
+        self.num_rounds = len(self.room_data)
+
+    @staticmethod
+    def make_plan():
+        """ Draw the games and questions for a room.
+
+        Plans do not depend on the room, so they can be made in advance.
+        """
+        catalog = get_catalog()
 
-        num_ques_game = int(self.CONFIG['param']['num_ques_per_game'])
-        total_games = int(self.CONFIG['param']['num_games'])
+        num_ques_game = int(catalog.config['param']['num_ques_per_game'])
+        total_games = int(catalog.config['param']['num_games'])
 
         # get task names in a game #
-        self._get_game_name(total_games)
+        game_names = ColaGameDb._get_game_name(catalog, total_games)
 
         # get category names / rules for each game #
-        instances_of_room = self._get_game_instance(num_ques_game)
-        print("current game", instances_of_room)
-        print("room:", self.room)
+        instances_of_room = ColaGameDb._get_game_instance(catalog, game_names,
+                                                          num_ques_game)
         # get room data for the task #
-        self.room_data = cola_task_and_rules.call_the_task(instances_of_room,
-                                                           num_ques_game, self.room)
-        print(self.room_data)
+        room_data = cola_task_and_rules.call_the_task(instances_of_room,
+                                                      num_ques_game, None,
+                                                      catalog)
+        draws = [('games', tuple(game_names))]
+        draws.extend((game, tuple(names)) for game, names in instances_of_room.items() if names)
+        return RoomPlan(tuple(game_names), tuple(room_data), tuple(draws))
 
-        # the data for the game is ready
-        self.room_data_ready = True
+    @staticmethod
+    def give_back_plan(plan):
+        """ Return the draws of a plan that was not used to the rotations """
+        for pool, names in reversed(plan.draws):
+            scheduler.put_back(pool, names)
 
     # --- private methods ---------------------------------------------------------
-    def _get_game_name(self, num_games):
+    @staticmethod
+    def _get_game_name(catalog, num_games):
         """ get the game name to be played and categories to display """
-        global LAST_GAMES_PLAYED
-
         # handle games in each room
-        game_list_cola = open(os.path.join(
-            self.CONFIG['process']['proc_path'],
-            self.CONFIG['process']['game_file'])).readlines()
-        game_list_cola = [each_type.split('\n')[0]
-                          for each_type in game_list_cola]
-        print(game_list_cola, LAST_GAMES_PLAYED)
-
-        self.game_names, LAST_GAMES_PLAYED = ColaGameDb.get_current_params(num_games,
-                                                                           game_list_cola,
-                                                                           LAST_GAMES_PLAYED)
-        print("game_names: ", self.game_names)
+        return scheduler.draw('games', catalog.games, num_games)
 
-
-    def _get_game_instance(self, num_ques):
+    @staticmethod
+    def _get_game_instance(catalog, game_names, num_ques):
         """ get the instances of each game """
-        global LAST_BIRDS_CATEGORY, LAST_SYNTHETIC_CATEGORY, LAST_TEXT_CATEGORY
-
-        game_instances = {}
-        game_instances = game_instances.fromkeys(self.game_names)
-        game_instances = dict([(key, []) for key in game_instances])
+        # number of categories / rules per question of each game
+        per_question = {
+            'birds': int(catalog.config['param']['num_birds_rules']),
+            'synthetic': int(catalog.config['param']['num_synthetic_rules']),
+            'textcomp': int(catalog.config['param']['num_text_rules']),
+        }
+
+        game_instances = {key: [] for key in game_names}
         # handle categories for each room
-        for sub_game in self.game_names:
-            if sub_game == 'birds':
-                with open(os.path.join(self.CONFIG['process']['proc_path'],
-                                       self.CONFIG['process']['birds_json'])) as file:
-                    bird_category = json.load(file)
-                bird_category_keys = bird_category.keys()
-
-                bird_cat_per_game = int(self.CONFIG['param']['num_birds_rules'])
-                num_cat = bird_cat_per_game * num_ques
-                birds_cat_names, LAST_BIRDS_CATEGORY = ColaGameDb.get_current_params(
-                    num_cat, bird_category_keys, LAST_BIRDS_CATEGORY)
-                game_instances['birds'].extend(birds_cat_names)
-            elif sub_game == 'synthetic':
-                with open(os.path.join(self.CONFIG['process']['proc_path'],
-                                       self.CONFIG['process']['synthetic_json'])) as file:
-                    syn_category = json.load(file)
-                syn_category_keys = syn_category['rules']
-
-                syn_cat_per_game = int(self.CONFIG['param']['num_synthetic_rules'])
-                num_cat = syn_cat_per_game * num_ques
-                syn_cat_names, LAST_SYNTHETIC_CATEGORY = ColaGameDb.get_current_params(
-                    num_cat, syn_category_keys, LAST_SYNTHETIC_CATEGORY)
-                game_instances['synthetic'].extend(syn_cat_names)
-            elif sub_game == 'textcomp':
-                with open(os.path.join(self.CONFIG['process']['proc_path'],
-                                       self.CONFIG['process']['textcomp_json'])) as file:
-                    text_category = json.load(file)
-                text_category_keys = text_category['rules']
-
-                text_cat_per_game = int(self.CONFIG['param']['num_text_rules'])
-                num_cat = text_cat_per_game * num_ques
-                text_cat_names, LAST_TEXT_CATEGORY = ColaGameDb.get_current_params(
-                    num_cat, text_category_keys, LAST_TEXT_CATEGORY)
-                game_instances['textcomp'].extend(text_cat_names)
+        for sub_game in game_names:
+            if sub_game in per_question:
+                num_cat = per_question[sub_game] * num_ques
+                game_instances[sub_game].extend(scheduler.draw(
+                    sub_game, catalog.categories[sub_game], num_cat))
 
         return game_instances
-
-    @staticmethod
-    def get_current_params(num, name_list, prev_state):
-        ''' Update the last game state (global) and load current games (room) '''
-        curr_games = []
-        residue = list(set(name_list) - set(prev_state))
-
-        if len(residue) >= num:
-            for _ in range(num):
-                name = residue.pop()
-                curr_games.append(name)
-                prev_state.append(name)
-        else:
-            if not residue:
-                residue = name_list
-                prev_state = []
-                for _ in range(num):
-                    name = residue.pop()
-                    curr_games.append(name)
-                    prev_state.append(name)
-            else:
-                diff_len = num - len(residue)
-                residue = residue + name_list[0:diff_len]
-                prev_state = []
-                for _ in range(num):
-                    name = residue.pop()
-                    curr_games.append(name)
-                    prev_state.append(name)
-
-        return curr_games, prev_state
\ No newline at end of file
@@ -0,0 +1,72 @@
+"""
+Room plans made ahead of time.
+A background task keeps a bounded queue of plans filled,
+so that a new room can start without waiting for its content.
+Plans that were not used are given back when the pool is stopped,
+so that their draws from the rotations are not lost.
+"""
+import asyncio
+import logging
+
+LOG = logging.getLogger(__name__)
+
+# plans kept ready
+POOL_SIZE = 8
+# seconds to wait before trying again after a plan could not be made
+RETRY_DELAY = 5
+
+
+class PlanPool:
+    """ Bounded queue of plans, refilled in the background
+
+    :param make_plan: Function making a plan, it is called in
+        the default executor to keep the event loop free
+    :param size: Number of plans kept ready
+    :param give_back: Function taking back a plan that was not used
+    """
+
+    def __init__(self, make_plan, size=POOL_SIZE, give_back=None):
+        self._make_plan = make_plan
+        self._give_back = give_back
+        self._queue = asyncio.Queue(maxsize=size)
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.ensure_future(self._produce())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+        plans = []
+        while not self._queue.empty():
+            plans.append(self._queue.get_nowait())
+        # the plan to be used next is given back last, so it is first again
+        for plan in reversed(plans):
+            self._return(plan)
+
+    def _return(self, plan):
+        if self._give_back is not None:
+            self._give_back(plan)
+
+    async def get(self):
+        """ A ready plan, made on demand if the pool has run empty """
+        try:
+            return self._queue.get_nowait()
+        except asyncio.QueueEmpty:
+            LOG.warning("No room plan ready, making one now.")
+            return await asyncio.get_running_loop().run_in_executor(None, self._make_plan)
+
+    async def _produce(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                plan = await loop.run_in_executor(None, self._make_plan)
+            except Exception:
+                LOG.exception("Could not make a room plan.")
+                await asyncio.sleep(RETRY_DELAY)
+                continue
+            try:
+                await self._queue.put(plan)
+            except asyncio.CancelledError:
+                self._return(plan)
+                raise
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+
+# University of Potsdam
+"""Pattern stimulus test cases."""
+
+import os
+import struct
+import sys
+import tempfile
+import unittest
+import zlib
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from cola_data_processing.generate_patterns import (
+    LAWS, N_EXAMPLES, make_grid, random_grid, render_stimulus, write_png
+)
+
+
+def read_png(path):
+    """ Chunks of a PNG file, checking signature and checksums """
+    with open(path, 'rb') as file:
+        content = file.read()
+    assert content[:8] == b'\x89PNG\r\n\x1a\n', "no PNG signature"
+    chunks = []
+    offset = 8
+    while offset < len(content):
+        length, kind = struct.unpack('>I4s', content[offset:offset + 8])
+        data = content[offset + 8:offset + 8 + length]
+        crc, = struct.unpack('>I', content[offset + 8 + length:offset + 12 + length])
+        assert crc == zlib.crc32(kind + data) & 0xffffffff, f"bad checksum of {kind}"
+        chunks.append((kind, data))
+        offset += length + 12
+    return chunks
+
+
+class TestLaws(unittest.TestCase):
+    def setUp(self):
+        self.rng = np.random.RandomState(0)
+
+    def test_enforced_grids_follow_the_law(self):
+        for law, (holds, enforce) in LAWS.items():
+            with self.subTest(law=law):
+                for _ in range(200):
+                    grid = random_grid(self.rng)
+                    enforce(grid, self.rng)
+                    self.assertTrue(holds(grid))
+
+    def test_positive_grids_follow_the_law(self):
+        for law, (holds, _) in LAWS.items():
+            with self.subTest(law=law):
+                for _ in range(200):
+                    self.assertTrue(holds(make_grid(law, True, self.rng)))
+
+    def test_negative_grids_never_follow_the_law(self):
+        for law, (holds, _) in LAWS.items():
+            with self.subTest(law=law):
+                for _ in range(200):
+                    self.assertFalse(holds(make_grid(law, False, self.rng)))
+
+
+class TestRendering(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'stimulus.png')
+        rng = np.random.RandomState(0)
+        examples = [make_grid('upper_left_red', True, rng) for _ in range(N_EXAMPLES)]
+        self.image = render_stimulus(examples, make_grid('upper_left_red', False, rng))
+
+    def test_png_is_valid(self):
+        write_png(self.path, self.image)
+        chunks = read_png(self.path)
+
+        self.assertEqual([kind for kind, _ in chunks], [b'IHDR', b'IDAT', b'IEND'])
+        width, height, depth, colour = struct.unpack('>IIBB', chunks[0][1][:10])
+        self.assertEqual((height, width), self.image.shape[:2])
+        self.assertEqual((depth, colour), (8, 2))
+
+    def test_png_holds_the_pixels(self):
+        write_png(self.path, self.image)
+        chunks = read_png(self.path)
+        height, width, _ = self.image.shape
+
+        raw = np.frombuffer(zlib.decompress(chunks[1][1]), dtype=np.uint8)
+        rows = raw.reshape(height, width * 3 + 1)
+        # no scanline is filtered
+        self.assertFalse(rows[:, 0].any())
+        self.assertTrue(np.array_equal(rows[:, 1:].reshape(self.image.shape), self.image))
+
+
+if __name__ == "__main__":
+    unittest.main()
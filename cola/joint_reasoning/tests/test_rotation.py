@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+
+# University of Potsdam
+"""Rotation test cases."""
+
+import os
+import sys
+import tempfile
+import unittest
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from cola_data_processing.rotation import Rotation, RotationScheduler
+
+
+class TestRotation(unittest.TestCase):
+    def test_every_name_is_drawn_once_per_epoch(self):
+        rotation = Rotation("abcdef")
+        drawn = rotation.draw(2) + rotation.draw(2) + rotation.draw(2)
+
+        self.assertEqual(sorted(drawn), list("abcdef"))
+        self.assertEqual(rotation.epoch, 1)
+
+    def test_names_of_a_draw_are_distinct(self):
+        rotation = Rotation("abcde")
+        for _ in range(20):
+            drawn = rotation.draw(3)
+            self.assertEqual(len(set(drawn)), 3)
+
+    def test_draw_larger_than_the_pool_keeps_names_once(self):
+        rotation = Rotation("ab")
+        for k in [5, 7, 3, 9]:
+            drawn = rotation.draw(k)
+            self.assertEqual(len(drawn), k)
+            self.assertLessEqual(max(Counter(drawn).values()) - min(Counter(drawn).values()), 1)
+            self.assertEqual(len(rotation.remaining), len(set(rotation.remaining)))
+
+    def test_sync_follows_the_pool(self):
+        rotation = Rotation("abc")
+        rotation.draw(1)
+        rotation.sync(("b", "c", "d"))
+
+        self.assertEqual(rotation.names, {"b", "c", "d"})
+        self.assertEqual(sorted(rotation.draw(3)), ["b", "c", "d"])
+
+    def test_names_put_back_are_drawn_next(self):
+        rotation = Rotation("abcdef")
+        drawn = rotation.draw(2)
+        rotation.put_back(drawn)
+
+        self.assertEqual(rotation.draw(2), drawn)
+        self.assertEqual(len(rotation.remaining), 4)
+
+
+class TestRotationScheduler(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "rotation.json")
+
+    def test_state_is_kept_between_runs(self):
+        scheduler = RotationScheduler()
+        scheduler.open(self.path)
+        first = scheduler.draw("games", ("a", "b", "c", "d"), 2)
+        scheduler.save()
+
+        restarted = RotationScheduler()
+        restarted.open(self.path)
+        second = restarted.draw("games", ("a", "b", "c", "d"), 2)
+
+        self.assertEqual(sorted(first + second), ["a", "b", "c", "d"])
+
+    def test_pools_rotate_separately(self):
+        scheduler = RotationScheduler()
+        games = scheduler.draw("games", ("a", "b"), 2)
+        rules = scheduler.draw("birds", ("a", "b"), 2)
+
+        self.assertEqual(sorted(games), ["a", "b"])
+        self.assertEqual(sorted(rules), ["a", "b"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+
+# University of Potsdam
+"""Waiting room deadline test cases."""
+
+import asyncio
+import os
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from waiting import WaitingList
+
+
+class TestWaitingList(unittest.TestCase):
+    def setUp(self):
+        self.expired = []
+
+    async def on_expire(self, user_id):
+        self.expired.append(user_id)
+
+    def run_waits(self, scenario, timeout=0.05):
+        async def main():
+            waiting = WaitingList(timeout, self.on_expire)
+            await scenario(waiting)
+            waiting.stop()
+            return waiting
+        return asyncio.run(main())
+
+    def test_waits_end_in_order(self):
+        async def scenario(waiting):
+            waiting.add(1)
+            await asyncio.sleep(0.01)
+            waiting.add(2)
+            await asyncio.sleep(0.1)
+
+        waiting = self.run_waits(scenario)
+
+        self.assertEqual(self.expired, [1, 2])
+        self.assertEqual(len(waiting), 0)
+
+    def test_removed_user_does_not_expire(self):
+        async def scenario(waiting):
+            waiting.add(1)
+            waiting.add(2)
+            waiting.remove(1)
+            await asyncio.sleep(0.1)
+
+        self.run_waits(scenario)
+
+        self.assertEqual(self.expired, [2])
+
+    def test_running_wait_is_not_restarted(self):
+        async def scenario(waiting):
+            waiting.add(1)
+            await asyncio.sleep(0.03)
+            waiting.add(1)
+            await asyncio.sleep(0.03)
+            self.assertNotIn(1, waiting)
+
+        self.run_waits(scenario)
+
+        self.assertEqual(self.expired, [1])
+
+    def test_user_can_wait_again(self):
+        async def scenario(waiting):
+            waiting.add(1)
+            waiting.remove(1)
+            waiting.add(1)
+            self.assertIn(1, waiting)
+            await asyncio.sleep(0.1)
+
+        self.run_waits(scenario)
+
+        self.assertEqual(self.expired, [1])
+
+    def test_compensated_user_does_not_wait_again(self):
+        async def scenario(waiting):
+            waiting.add(1)
+            await asyncio.sleep(0.1)
+            # e.g. the page of the user was reloaded
+            waiting.remove(1)
+            waiting.add(1)
+            self.assertNotIn(1, waiting)
+            await asyncio.sleep(0.1)
+
+        self.run_waits(scenario)
+
+        self.assertEqual(self.expired, [1])
+
+    def test_matched_user_can_wait_again(self):
+        async def scenario(waiting):
+            waiting.add(1)
+            await asyncio.sleep(0.1)
+            waiting.matched(1)
+            waiting.add(1)
+            await asyncio.sleep(0.1)
+
+        self.run_waits(scenario)
+
+        self.assertEqual(self.expired, [1, 1])
+
+    def test_nothing_expires_before_the_timeout(self):
+        async def scenario(waiting):
+            waiting.add(1)
+            await asyncio.sleep(0.01)
+
+        waiting = self.run_waits(scenario, timeout=1)
+
+        self.assertEqual(self.expired, [])
+        self.assertIn(1, waiting)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+"""
+Deadlines of the users in the waiting room.
+All deadlines are kept in one heap and served by a single timer
+on the event loop, which is set to the earliest of them.
+A user is compensated for waiting in vain only once, until they
+find a partner.
+"""
+import asyncio
+import heapq
+import logging
+
+LOG = logging.getLogger(__name__)
+
+
+class WaitingList:
+    """ Users waiting for a partner and when their wait ends
+
+    :param timeout: Seconds a user waits at most
+    :param on_expire: Coroutine function called with the id of
+        a user whose wait has ended
+    """
+
+    def __init__(self, timeout, on_expire):
+        self.timeout = timeout
+        self._on_expire = on_expire
+        # user id -> deadline, the heap may hold outdated entries
+        self._deadlines = {}
+        self._heap = []
+        self._timer = None
+        # users whose wait has ended, they do not wait again
+        self.compensated = set()
+
+    def __contains__(self, user_id):
+        return user_id in self._deadlines
+
+    def __len__(self):
+        return len(self._deadlines)
+
+    def add(self, user_id):
+        """ Start the wait of a user, unless it is already running
+        or has already ended without a partner
+        """
+        if user_id in self._deadlines or user_id in self.compensated:
+            return
+        deadline = asyncio.get_running_loop().time() + self.timeout
+        self._deadlines[user_id] = deadline
+        heapq.heappush(self._heap, (deadline, user_id))
+        if self._heap[0][1] == user_id:
+            self._arm()
+
+    def remove(self, user_id):
+        """ End the wait of a user, e.g. once a partner was found """
+        # the heap entry is skipped when it comes up
+        self._deadlines.pop(user_id, None)
+
+    def matched(self, user_id):
+        """ End the wait of a user who found a partner, they may wait again """
+        self.remove(user_id)
+        self.compensated.discard(user_id)
+
+    def stop(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _arm(self):
+        self.stop()
+        if self._heap:
+            self._timer = asyncio.get_running_loop().call_at(self._heap[0][0], self._expire)
+
+    def _expire(self):
+        self._timer = None
+        now = asyncio.get_running_loop().time()
+        while self._heap and self._heap[0][0] <= now:
+            deadline, user_id = heapq.heappop(self._heap)
+            if self._deadlines.get(user_id) != deadline:
+                continue
+            del self._deadlines[user_id]
+            self.compensated.add(user_id)
+            LOG.debug(f"User {user_id} has waited {self.timeout} seconds.")
+            asyncio.ensure_future(self._on_expire(user_id))
+        self._arm()
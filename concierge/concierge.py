@@ -1,23 +1,80 @@
 import argparse
 import logging
 import os
+import random
+import signal
+import socket
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timezone
 
 import requests
 import socketio
 
+from matchmaking import Matchmaker, SharedMatchmaker, Waiting
+from pair_filter import PairFilter
+from resilience import Client, RequestFailed
+from room_pool import RoomPool
+from wait_times import StatusServer, WaitEstimator
+
 
 LOG = logging.getLogger(__name__)
 
+# seconds a status reported by a task bot is reused
+STATUS_TTL = 2
+# seconds between attempts to move users that are held back
+# and to look up tasks that could not be looked up on join
+HOLD_INTERVAL = 5
+# users moved to their task rooms at the same time
+TRANSFER_WORKERS = 8
+# seconds between two checks whether the waiting users are connected
+PRUNE_INTERVAL = 60
+# waiting users looked up at most per check, those checked longest ago first
+PRUNE_LOOKUPS = 20
+# groups formed at the same time by a matching tick
+GROUP_WORKERS = 4
+# times in a row the server may refuse to move a user before the
+# user is no longer queued
+MAX_REFUSALS = 3
 
-class ConciergeBot:
-    sio = socketio.Client(logger=True)
-    tasks = dict()
 
-    def __init__(self, token, user, host, port):
-        """This bot lists users joining a designated
-        waiting room and sends a group of users to a task room
-        as soon as the minimal number of users needed for the
-        task is reached.
+class TransferError(RequestFailed):
+    """A user could not be moved from one room to another."""
+
+
+class Transfer:
+    """The move of one user of a group to the task room.
+
+    A transfer is pending until the user was let into the room, then
+    moved, and arrived once the server lists the connected user as a
+    member of the room. It fails if the user could not be moved, is
+    returned if the user was sent back to the waiting room, and the
+    user is gone if their connection was lost.
+
+    :param waiting: The user as taken from the queue.
+    :type waiting: matchmaking.Waiting
+    """
+    PENDING = "pending"
+    MOVED = "moved"
+    ARRIVED = "arrived"
+    FAILED = "failed"
+    RETURNED = "returned"
+    GONE = "gone"
+
+    def __init__(self, waiting):
+        self.waiting = waiting
+        self.state = Transfer.PENDING
+        # whether the server refused a failed move, rather than not answering
+        self.refused = False
+
+
+class ConciergeBot:
+    def __init__(self, token, user, host, port, session=None):
+        """This bot lists users joining its waiting rooms and
+        sends a group of users to a task room as soon as the
+        minimal number of users needed for the task is reached.
+        Users of each waiting room and task wait in their own queue.
 
         :param token: A uuid; a string following the same pattern
             as `0c45b30f-d049-43d1-b80d-e3c3a3ca22a0`
@@ -29,9 +86,89 @@ class ConciergeBot:
         :type host: str
         :param port: Port used by the slurk chat server.
         :type port: int
+        :param session: Session whose connections are reused for
+            all requests, may be shared by several bots.
+        :type session: requests.Session
+        :param bot_status: Each task is mapped to the url where the
+            bot serving the task publishes its load. Groups for
+            such a task are only formed while the bot accepts rooms.
+        :type bot_status: dict
+        :param waiting_rooms: Rooms the bot joins once connected,
+            in addition to the room of its token.
+        :type waiting_rooms: list
+        :param estimator: Expected waits of the users in each queue.
+        :type estimator: WaitEstimator
+        :param estimate_interval: Seconds between two checks of how
+            long the waiting users will probably wait, no such messages
+            are sent if not set.
+        :type estimate_interval: float
+        :param announced: Each waiting user, by queue, is mapped to the
+            expected wait they were last told, so that they are only
+            told again once it has changed.
+        :type announced: dict
+        :param batch_interval: Seconds between two matching ticks.
+            If set, joining users are only queued and all groups
+            possible are formed at once by the next tick.
+        :type batch_interval: float
+        :param held: Keys of the queues with enough waiting users
+            whose bot does not accept new rooms or whose group could
+            not be moved, mapped to the task of the queue.
+        :type held: dict
+        :param rooms: Rooms in which the bot has seen users.
+        :type rooms: set
+        :param matchmaker: Queues of the users waiting for each task,
+            a `SharedMatchmaker` if several bots serve the waiting room.
+        :type matchmaker: Matchmaker
+        :param pairs: Pairs of users that were grouped before, other
+            partners are preferred for them while any are waiting.
+        :type pairs: PairFilter
+        :param room_pool: Task rooms created ahead of time, disabled
+            until its `max_rooms` is set.
+        :type room_pool: RoomPool
+        :param unresolved: Users whose task could not be looked up
+            when they joined, mapped to the user and the room.
+        :type unresolved: dict
+        :param refusals: Users the server refused to move, mapped to
+            the number of refusals in a row.
+        :type refusals: dict
+        :param task_catalog: All tasks of the server mapped to their
+            identifier, prefetched once the bot is connected.
+        :type task_catalog: dict
+        :param user_tasks: Each user whose task was looked up is
+            mapped to the identifier of the task, or None, until
+            the user leaves.
+        :type user_tasks: dict
+        :param disconnected_at: Time at which the connection to
+            the server was lost, None while connected.
+        :type disconnected_at: datetime.datetime
+        :param last_log_id: Each room is mapped to the newest log
+            entry that was replayed after a reconnect.
+        :type last_log_id: dict
         """
         self.token = token
         self.user = user
+        self.bot_status = dict()
+        self.waiting_rooms = list()
+        self.estimator = WaitEstimator()
+        self.estimate_interval = None
+        self.announced = dict()
+        self.batch_interval = None
+        self.held = dict()
+        self.rooms = set()
+        self.matchmaker = Matchmaker()
+        self.pairs = PairFilter()
+        self.room_pool = RoomPool(self.create_room, self.delete_task_room, 0)
+        self.task_catalog = dict()
+        self.user_tasks = dict()
+        self.unresolved = dict()
+        self.refusals = dict()
+        self.client = Client(token, session)
+        self.sio = socketio.Client(logger=True, http_session=self.client.session)
+        self.disconnected_at = None
+        self.last_log_id = dict()
+        self._status_cache = dict()
+        self._transfers = ThreadPoolExecutor(TRANSFER_WORKERS)
+        self._groups = ThreadPoolExecutor(GROUP_WORKERS)
         self.uri = host
         if port is not None:
             self.uri += f":{port}"
@@ -43,27 +180,165 @@ class ConciergeBot:
 
     def run(self):
         # establish a connection to the server
-        self.sio.connect(
-            self.uri,
-            headers={"Authorization": f"Bearer {self.token}", "user": self.user},
-            namespaces="/",
-        )
+        delay = 1
+        while True:
+            try:
+                self.sio.connect(
+                    self.uri,
+                    headers={"Authorization": f"Bearer {self.token}", "user": self.user},
+                    namespaces="/",
+                )
+                break
+            except socketio.exceptions.ConnectionError as error:
+                LOG.error(f"Could not connect to server: {error}")
+                time.sleep(random.uniform(delay / 2, delay))
+                delay = min(2 * delay, 60)
+        self.fetch_tasks()
+        self.join_waiting_rooms()
+        self.room_pool.reclaim()
+        self.sio.start_background_task(self.release_held)
+        self.sio.start_background_task(self.prune_waiting)
+        if self.batch_interval:
+            self.sio.start_background_task(self.match_batches)
+        if self.estimate_interval:
+            self.sio.start_background_task(self.announce_waits)
+        if self.room_pool.max_rooms:
+            self.sio.start_background_task(self.room_pool.refill)
+        shared = isinstance(self.matchmaker, SharedMatchmaker)
+        if shared:
+            self.sio.start_background_task(self.matchmaker.keep_leases)
         # wait until the connection with the server ends
-        self.sio.wait()
+        try:
+            self.sio.wait()
+        finally:
+            self.room_pool.stop()
+            self.pairs.save()
+            if shared:
+                self.matchmaker.release()
+
+    def join_waiting_rooms(self):
+        """Join the waiting rooms the bot was given."""
+        for room_id in self.waiting_rooms:
+            try:
+                response = self.client.request(
+                    "user_rooms", "POST", f"{self.uri}/users/{self.user}/rooms/{room_id}"
+                )
+            except RequestFailed as error:
+                LOG.error(f"Could not join waiting room {room_id}: {error}")
+                continue
+            if not response.ok:
+                LOG.error(f"Could not join waiting room {room_id}: {response.status_code}")
+                continue
+            self.rooms.add(room_id)
+
+    def resume(self):
+        """Catch up on what happened while the connection was lost.
+
+        The bot rejoins any of its rooms it is no longer part of
+        and replays the join and leave events it missed.
+        """
+        since, self.disconnected_at = self.disconnected_at, None
+        LOG.info(f"Reconnected, resuming {len(self.rooms)} rooms.")
+        # tasks may have changed while the connection was lost
+        self.fetch_tasks()
+
+        try:
+            response = self.client.request("users", "GET", f"{self.uri}/users/{self.user}")
+        except RequestFailed as error:
+            LOG.error(f"Could not get bot user: {error}")
+            return
+        if not response.ok:
+            LOG.error(f"Could not get bot user: {response.status_code}")
+            return
+        joined = set(response.json().get("rooms", []))
+
+        for room_id in list(self.rooms):
+            try:
+                if room_id not in joined:
+                    response = self.client.request(
+                        "user_rooms", "POST", f"{self.uri}/users/{self.user}/rooms/{room_id}"
+                    )
+                    if not response.ok:
+                        LOG.error(f"Could not rejoin room {room_id}: {response.status_code}")
+                        continue
+                self.replay_logs(room_id, since)
+            except RequestFailed as error:
+                LOG.error(f"Could not resume room {room_id}: {error}")
+
+    def replay_logs(self, room_id, since):
+        """Handle join and leave events logged while disconnected.
+
+        :param room_id: Identifier of a room the bot is in.
+        :type room_id: int
+        :param since: Entries created before this time were already
+            received while connected.
+        :type since: datetime.datetime
+        :raises RequestFailed: If the server could not be reached.
+        """
+        response = self.client.request(
+            "logs", "GET", f"{self.uri}/rooms/{room_id}/users/{self.user}/logs"
+        )
+        if not response.ok:
+            LOG.error(f"Could not get logs of room {room_id}: {response.status_code}")
+            return
+
+        handler = self.sio.handlers["/"]["status"]
+        for entry in sorted(response.json(), key=lambda entry: entry["id"]):
+            created = datetime.fromisoformat(entry["date_created"].replace("Z", "+00:00"))
+            if created.tzinfo is None:
+                created = created.replace(tzinfo=timezone.utc)
+            # entries may already have been replayed after an earlier reconnect
+            if created < since or entry["id"] <= self.last_log_id.get(room_id, 0):
+                continue
+            self.last_log_id[room_id] = entry["id"]
+            if entry["event"] not in {"join", "leave"}:
+                continue
+            if str(entry["user_id"]) == str(self.user):
+                continue
+
+            user = self.client.request("users", "GET", f"{self.uri}/users/{entry['user_id']}")
+            if not user.ok:
+                LOG.error(f"Could not get user: {user.status_code}")
+                continue
+            user = user.json()
+            handler({
+                "type": entry["event"],
+                "room": room_id,
+                "user": {"id": user["id"], "name": user["name"]}
+            })
 
     def register_callbacks(self):
+        @self.sio.event
+        def connect():
+            if self.disconnected_at is not None:
+                self.sio.start_background_task(self.resume)
+
+        @self.sio.event
+        def disconnect():
+            LOG.warning("Disconnected from server.")
+            self.disconnected_at = datetime.now(timezone.utc)
+
         @self.sio.event
         def status(data):
+            self.rooms.add(data["room"])
             if data["type"] == "join":
                 user = data["user"]
-                task = self.get_user_task(user)
+                try:
+                    task = self.get_user_task(user)
+                except RequestFailed as error:
+                    LOG.error(f"Could not get task of user {user['id']}: {error}")
+                    self.unresolved[user["id"]] = (user, data["room"])
+                    return
                 if task:
                     self.user_task_join(user, task, data["room"])
             elif data["type"] == "leave":
                 user = data["user"]
-                task = self.get_user_task(user)
-                if task:
-                    self.user_task_leave(user, task)
+                self.unresolved.pop(user["id"], None)
+                # only users whose task was looked up on join can be waiting,
+                # the task is looked up again if the user comes back
+                task_id = self.user_tasks.pop(user["id"], None)
+                if task_id is not None:
+                    self.user_task_leave(user, self.task_catalog[task_id], data["room"])
 
     @staticmethod
     def message_callback(success, error_msg=None):
@@ -82,41 +357,202 @@ class ConciergeBot:
         """
         if not success:
             LOG.error(f"Could not send message: {error_msg}")
-            exit(1)
+            return
         LOG.debug("Sent message successfully.")
 
+    def fetch_tasks(self):
+        """Prefetch all tasks of the server into the task catalog."""
+        try:
+            response = self.client.request("tasks", "GET", f"{self.uri}/tasks")
+        except RequestFailed as error:
+            LOG.error(f"Could not get tasks: {error}")
+            return
+        if not response.ok:
+            LOG.error(f"Could not get tasks: {response.status_code}")
+            return
+        self.task_catalog = {task["id"]: task for task in response.json()}
+        LOG.debug(f"Prefetched {len(self.task_catalog)} tasks.")
+
     def get_user_task(self, user):
         """Retrieve task assigned to user.
 
+        The task is only requested from the server when a user joins
+        who is not known yet, afterwards it is taken from the catalog
+        until the user leaves.
+
         :param user: Holds keys `id` and `name`.
         :type user: dict
+        :raises RequestFailed: If the task could not be looked up.
         """
-        task = requests.get(
-            f'{self.uri}/users/{user["id"]}/task',
-            headers={"Authorization": f"Bearer {self.token}"}
-        )
+        user_id = user["id"]
+        if user_id in self.user_tasks:
+            task_id = self.user_tasks[user_id]
+            if task_id is None or task_id in self.task_catalog:
+                return self.task_catalog.get(task_id)
+
+        task = self.client.request("user_task", "GET", f"{self.uri}/users/{user_id}/task")
         if not task.ok:
-            LOG.error(f"Could not get task: {task.status_code}")
-            exit(2)
+            raise RequestFailed(f"Could not get task: {task.status_code}")
         LOG.debug("Got user task successfully.")
-        return task.json()
+        task = task.json()
+        if task:
+            self.task_catalog[task["id"]] = task
+            self.user_tasks[user_id] = task["id"]
+        else:
+            self.user_tasks[user_id] = None
+        return task
+
+    def bot_accepts(self, task_id):
+        """Ask the bot serving a task whether it accepts a new room.
+
+        Tasks without a known status url are always accepted, as
+        is any task whose bot cannot be reached.
+
+        :param task_id: Identifier of a task.
+        :type task_id: int
+        """
+        url = self.bot_status.get(task_id)
+        if url is None:
+            return True
+        checked, accepting = self._status_cache.get(task_id, (None, True))
+        if checked is not None and time.monotonic() - checked < STATUS_TTL:
+            return accepting
+        try:
+            response = requests.get(url, timeout=1)
+            response.raise_for_status()
+            accepting = response.json()["accepting"]
+        except (requests.RequestException, ValueError, KeyError) as err:
+            LOG.warning(f"Could not get status of bot for task {task_id}: {err}")
+            accepting = True
+        self._status_cache[task_id] = (time.monotonic(), accepting)
+        return accepting
+
+    def release_held(self):
+        """Periodically move held back users once their bot has capacity
+        or the server is reachable again.
+        """
+        while True:
+            self.sio.sleep(HOLD_INTERVAL)
+            for user_id, (user, room) in list(self.unresolved.items()):
+                try:
+                    task = self.get_user_task(user)
+                except RequestFailed as error:
+                    LOG.debug(f"Still cannot get tasks: {error}")
+                    break
+                # the user may have left in the meantime
+                if self.unresolved.pop(user_id, None) is not None and task:
+                    self.user_task_join(user, task, room)
+            for (room, _), task in list(self.held.items()):
+                self.form_group(task, room)
+
+    def match_batches(self):
+        """Periodically form every group possible across all tasks.
+
+        The groups of a tick are moved to their rooms concurrently,
+        the next tick starts once all of them are done.
+        """
+        while True:
+            self.sio.sleep(self.batch_interval)
+            futures = []
+            for room, task_id in self.matchmaker.keys():
+                task = self.task_catalog.get(task_id)
+                if task is None:
+                    continue
+                while True:
+                    group = self.take_group(task, room)
+                    if group is None:
+                        break
+                    futures.append(self._groups.submit(self.start_group, task, room, group))
+            if futures:
+                wait(futures)
+                LOG.debug(f"Formed {len(futures)} groups in one tick.")
+
+    def announce_waits(self):
+        """Periodically tell each waiting user how long they will probably
+        wait, whenever the rounded estimate has changed.
+        """
+        while True:
+            self.sio.sleep(self.estimate_interval)
+            announced = dict()
+            for key in self.matchmaker.keys():
+                room, task_id = key
+                task = self.task_catalog.get(task_id)
+                if task is None or not self.matchmaker.owns(task_id):
+                    continue
+                users = self.matchmaker.users(key)
+                for position, user_id in enumerate(users):
+                    estimate = self.estimator.estimate(
+                        key, position, len(users), task["num_users"]
+                    )
+                    if estimate is None:
+                        continue
+                    if estimate < 60:
+                        duration = "less than a minute"
+                    else:
+                        duration = f"about {round(estimate / 60)} minute(s)"
+                    announced[key, user_id] = duration
+                    if self.announced.get((key, user_id)) == duration:
+                        continue
+                    self.sio.emit(
+                        "text",
+                        {
+                            "message":
+                                f"You are number {position + 1} in line, "
+                                f"you will probably wait {duration}.",
+                            "receiver_id": user_id,
+                            "room": room
+                        },
+                        callback=self.message_callback
+                    )
+            # users who are no longer waiting are forgotten
+            self.announced = announced
+
+    def status(self):
+        """Queues and expected waits of the bot, for the operators."""
+        queues = dict()
+        for key, summary in self.matchmaker.summary().items():
+            room, task_id = key
+            task = self.task_catalog.get(task_id)
+            num_users = task["num_users"] if task else 1
+            queues[f"{room}/{task_id}"] = {
+                **summary,
+                **self.estimator.summary(key, summary["waiting"], num_users)
+            }
+        return {"queues": queues, "held": len(self.held), "unresolved": len(self.unresolved)}
 
     def create_room(self, layout_id):
         """Create room for the task.
 
         :param layout_id: Unique key of layout object.
         :type layout_id: int
+        :return: The room and its ETag.
+        :rtype: tuple
+        :raises RequestFailed: If the room could not be created.
         """
-        room = requests.post(
-            f"{self.uri}/rooms",
-            headers={"Authorization": f"Bearer {self.token}"},
-            json={"layout_id": layout_id}
+        room = self.client.request(
+            "rooms", "POST", f"{self.uri}/rooms", json={"layout_id": layout_id}
         )
         if not room.ok:
-            LOG.error(f"Could not create task room: {room.status_code}")
-            exit(3)
+            raise TransferError(f"Could not create task room: {room.status_code}")
         LOG.debug("Created room successfully.")
-        return room.json()
+        return room.json(), room.headers["ETag"]
+
+    def delete_task_room(self, room, etag):
+        """Delete a task room that was not used.
+
+        :param room: The room as returned by the server.
+        :type room: dict
+        :param etag: Used for request validation.
+        :type etag: str
+        """
+        response = self.client.request(
+            "rooms", "DELETE", f"{self.uri}/rooms/{room['id']}", etag=etag
+        )
+        if not response.ok:
+            raise TransferError(
+                f"Could not delete room {room['id']}: {response.status_code}"
+            )
+        LOG.debug("Deleted room successfully.")
 
     def join_room(self, user_id, room_id):
         """Let user join task room.
@@ -126,13 +562,13 @@ class ConciergeBot:
         :param room_id: Identifier of room.
         :type room_id: int
         """
-        response = requests.post(
-            f"{self.uri}/users/{user_id}/rooms/{room_id}",
-            headers={"Authorization": f"Bearer {self.token}"}
+        response = self.client.request(
+            "user_rooms", "POST", f"{self.uri}/users/{user_id}/rooms/{room_id}"
         )
         if not response.ok:
-            LOG.error(f"Could not let user join room: {response.status_code}")
-            exit(4)
+            raise TransferError(
+                f"Could not let user {user_id} join room {room_id}: {response.status_code}"
+            )
         LOG.debug("Sending user to new room was successful.")
         return response.headers["ETag"]
 
@@ -146,16 +582,179 @@ class ConciergeBot:
         :param etag: Used for request validation.
         :type etag: str
         """
-        response = requests.delete(
-            f"{self.uri}/users/{user_id}/rooms/{room_id}",
-            headers={"Authorization": f"Bearer {self.token}",
-                     "If-Match": etag}
+        response = self.client.request(
+            "user_rooms", "DELETE", f"{self.uri}/users/{user_id}/rooms/{room_id}", etag=etag
         )
         if not response.ok:
-            LOG.error(f"Could not remove user from room: {response.status_code}")
-            exit(5)
+            raise TransferError(
+                f"Could not remove user {user_id} from room {room_id}: {response.status_code}"
+            )
         LOG.debug("Removing user from room was successful.")
 
+    def move_user(self, user_id, old_room_id, new_room_id):
+        """Move a user to another room.
+
+        The user leaves the old room only after having joined the
+        new one. If leaving fails, the user is taken out of the new
+        room again, so that a failed move leaves the user where
+        they were.
+
+        :raises RequestFailed: If the user could not be moved.
+        """
+        etag = self.join_room(user_id, new_room_id)
+        try:
+            self.delete_room(user_id, old_room_id, etag)
+        except RequestFailed:
+            try:
+                self.delete_room(user_id, new_room_id, etag)
+            except RequestFailed as error:
+                LOG.error(f"Could not undo join: {error}")
+            raise
+
+    def user_rooms(self, user_id):
+        """Rooms of a user, None if the user is not connected.
+
+        :param user_id: Identifier of user.
+        :type user_id: int
+        :raises RequestFailed: If the user could not be looked up.
+        """
+        response = self.client.request("users", "GET", f"{self.uri}/users/{user_id}")
+        if not response.ok:
+            raise RequestFailed(f"Could not get user {user_id}: {response.status_code}")
+        user = response.json()
+        if user.get("session_id") is None:
+            return None
+        return set(user.get("rooms", []))
+
+    def _each(self, step, transfers, *args):
+        """Take a step of several transfers at the same time."""
+        futures = [self._transfers.submit(step, transfer, *args) for transfer in transfers]
+        for future in futures:
+            future.result()
+
+    def _check(self, transfer):
+        try:
+            if self.user_rooms(transfer.waiting.user_id) is None:
+                transfer.state = Transfer.GONE
+        except RequestFailed as error:
+            LOG.warning(error)
+
+    def _move(self, transfer, room_id):
+        waiting = transfer.waiting
+        try:
+            self.move_user(waiting.user_id, waiting.room, room_id)
+            transfer.state = Transfer.MOVED
+        except RequestFailed as error:
+            LOG.error(error)
+            transfer.state = Transfer.FAILED
+            transfer.refused = isinstance(error, TransferError)
+
+    def _check_membership(self, transfer, room_id):
+        # only tells that the server lists the user in the room,
+        # not that their browser has loaded it
+        try:
+            rooms = self.user_rooms(transfer.waiting.user_id)
+        except RequestFailed as error:
+            LOG.error(f"Could not check membership: {error}")
+            return
+        if rooms is None:
+            transfer.state = Transfer.GONE
+        elif room_id in rooms:
+            transfer.state = Transfer.ARRIVED
+
+    def _return(self, transfer, room_id):
+        waiting = transfer.waiting
+        try:
+            self.move_user(waiting.user_id, room_id, waiting.room)
+            transfer.state = Transfer.RETURNED
+        except RequestFailed as error:
+            LOG.error(f"Could not move user back: {error}")
+
+    def transfer_group(self, transfers, room_id):
+        """Move a group of users to a room, all users at the same time.
+
+        Each user counts as arrived once the server lists them as
+        connected and a member of the room. If not every user arrives,
+        the users that were moved are sent back to the rooms they came
+        from.
+
+        :param transfers: The transfers of the users of the group.
+        :type transfers: list
+        :param room_id: Identifier of the room for the group.
+        :type room_id: int
+        :return: `True` if every user arrived.
+        :rtype: bool
+        """
+        self._each(self._move, transfers, room_id)
+        if all(transfer.state == Transfer.MOVED for transfer in transfers):
+            self._each(self._check_membership, transfers, room_id)
+            if all(transfer.state == Transfer.ARRIVED for transfer in transfers):
+                return True
+
+        moved = [
+            transfer for transfer in transfers
+            if transfer.state in {Transfer.MOVED, Transfer.ARRIVED}
+        ]
+        self._each(self._return, moved, room_id)
+        return False
+
+    def requeue_survivors(self, key, task, transfers):
+        """Queue the users of a group that failed again.
+
+        Users who were not moved or were sent back are first in line.
+        Users who could not be moved wait at the end of the queue, and
+        are dropped once the server has refused to move them
+        `MAX_REFUSALS` times in a row. Users whose connection is gone
+        are dropped as well.
+        """
+        first, last = [], []
+        for transfer in transfers:
+            user_id = transfer.waiting.user_id
+            if transfer.state == Transfer.GONE:
+                LOG.info(f"User {user_id} is gone, not queued again.")
+            elif transfer.state in {Transfer.PENDING, Transfer.RETURNED}:
+                first.append(transfer.waiting)
+            elif transfer.state == Transfer.FAILED:
+                if transfer.refused:
+                    self.refusals[user_id] = self.refusals.get(user_id, 0) + 1
+                    if self.refusals[user_id] >= MAX_REFUSALS:
+                        LOG.error(f"User {user_id} cannot be moved, not queued again.")
+                        del self.refusals[user_id]
+                        continue
+                last.append(transfer.waiting)
+            else:
+                LOG.error(f"User {user_id} is stuck in the task room.")
+        self.matchmaker.requeue(key, first)
+        for waiting in last:
+            self.matchmaker.enqueue(key, waiting.user_id)
+        self.held[key] = task
+
+    def prune_waiting(self):
+        """Periodically remove users whose connection is gone from the queues.
+
+        At most `PRUNE_LOOKUPS` users are looked up per check, the
+        users that were checked longest ago first.
+        """
+        checked_at = dict()
+        while True:
+            self.sio.sleep(PRUNE_INTERVAL)
+            waiting = [
+                (key, user_id)
+                for key in self.matchmaker.keys() if self.matchmaker.owns(key[1])
+                for user_id in self.matchmaker.users(key)
+            ]
+            # users who are no longer waiting are forgotten
+            checked_at = {entry: checked_at.get(entry, 0) for entry in waiting}
+            due = sorted(waiting, key=checked_at.get)[:PRUNE_LOOKUPS]
+            transfers = [Transfer(Waiting(user_id, key[0], None)) for key, user_id in due]
+            self._each(self._check, transfers)
+            now = time.monotonic()
+            for (key, user_id), transfer in zip(due, transfers):
+                checked_at[key, user_id] = now
+                if transfer.state == Transfer.GONE:
+                    LOG.info(f"Removing user {user_id}, who is gone.")
+                    self.matchmaker.remove(key, user_id)
+
     def user_task_join(self, user, task, room):
         """A connected user and their task are registered.
 
@@ -174,26 +773,34 @@ class ConciergeBot:
         task_id = task["id"]
         user_id = user["id"]
         user_name = user["name"]
-        # register task together with the user_id
-        self.tasks.setdefault(task_id, {})[user_id] = room
-
-        if len(self.tasks[task_id]) == task["num_users"]:
-            new_room = self.create_room(task["layout_id"])
-            # list cast necessary because the dictionary is actively altered
-            # due to parallely received "leave" events
-            for user_id, old_room_id in list(self.tasks[task_id].items()):
-                etag = self.join_room(user_id, new_room["id"])
-                self.delete_room(user_id, old_room_id, etag)
-            del self.tasks[task_id]
-            self.sio.emit("room_created", {"room": new_room["id"], "task": task_id})
+        key = (room, task_id)
+        # every bot sees the join, the one queuing the user greets them
+        new = self.matchmaker.enqueue(key, user_id)
+        greeting = (
+            f"### Hello, {user_name}!\n\n"
+            "I am looking for a partner for you, it might take "
+            "some time, so be patient, please..."
+        )
+        if not self.matchmaker.owns(task_id):
+            # retried until the owner of the task has let its lease expire
+            self.held[key] = task
         else:
+            self.estimator.arrived(key)
+            # in batches, groups are formed by the next matching tick
+            if not self.batch_interval and self.matchmaker.waiting(key) >= task["num_users"]:
+                if self.form_group(task, room):
+                    return
+                greeting = (
+                    f"### Hello, {user_name}!\n\n"
+                    "All game rooms are busy at the moment. You will "
+                    "be moved as soon as one becomes available, "
+                    "so be patient, please..."
+                )
+        if new:
             self.sio.emit(
                 "text",
                 {
-                    "message":
-                        f"### Hello, {user_name}!\n\n"
-                        "I am looking for a partner for you, it might take "
-                        "some time, so be patient, please...",
+                    "message": greeting,
                     "receiver_id": user_id,
                     "room": room,
                     "html": True
@@ -201,7 +808,105 @@ class ConciergeBot:
                 callback=self.message_callback
             )
 
-    def user_task_leave(self, user, task):
+    def form_group(self, task, room):
+        """Move the first users waiting in a room for a task to a new task room.
+
+        If the bot serving the task does not accept another room
+        the users stay in the waiting room and the task is held
+        back until the bot has capacity again.
+
+        :param task: Holds keys `date_created`, `date_modified`, `id`,
+            `layout_id`, `name` and `num_users`.
+        :type task: dict
+        :param room: Identifier of the waiting room.
+        :type room: int
+        :return: `True` if a group was moved to a new room.
+        :rtype: bool
+        """
+        group = self.take_group(task, room)
+        if group is None:
+            return False
+        return self.start_group(task, room, group)
+
+    def take_group(self, task, room):
+        """Take the first users waiting in a room for a task out of the queue.
+
+        :param task: Holds keys `date_created`, `date_modified`, `id`,
+            `layout_id`, `name` and `num_users`.
+        :type task: dict
+        :param room: Identifier of the waiting room.
+        :type room: int
+        :return: The users of the group, None if there are not
+            enough users or the bot is busy.
+        :rtype: list
+        """
+        task_id = task["id"]
+        key = (room, task_id)
+        if self.matchmaker.waiting(key) < task["num_users"]:
+            self.held.pop(key, None)
+            return None
+        if not self.matchmaker.owns(task_id):
+            # held until the lease of the owner expires
+            self.held[key] = task
+            return None
+        if not self.bot_accepts(task_id):
+            LOG.debug(f"Bot for task {task_id} is busy, holding users.")
+            self.held[key] = task
+            return None
+
+        # take the group out of the queue, so that parallely
+        # received events do not alter it while users are moved
+        group = self.matchmaker.take(key, task["num_users"], self.pairs.seen)
+        if self.matchmaker.waiting(key) < task["num_users"]:
+            self.held.pop(key, None)
+        return group
+
+    def start_group(self, task, room, group):
+        """Move a group taken from the queue to a new task room.
+
+        :param task: Holds keys `date_created`, `date_modified`, `id`,
+            `layout_id`, `name` and `num_users`.
+        :type task: dict
+        :param room: Identifier of the waiting room.
+        :type room: int
+        :param group: The users taken from the queue.
+        :type group: list
+        :return: `True` if the group was moved.
+        :rtype: bool
+        """
+        task_id = task["id"]
+        key = (room, task_id)
+        layout_id = task["layout_id"]
+        started = time.monotonic()
+        transfers = [Transfer(waiting) for waiting in group]
+        # no room is used for a group of which a user is already gone
+        self._each(self._check, transfers)
+        if any(transfer.state == Transfer.GONE for transfer in transfers):
+            self.requeue_survivors(key, task, transfers)
+            return False
+        try:
+            new_room, etag = self.room_pool.get(layout_id) or self.create_room(layout_id)
+        except RequestFailed as error:
+            LOG.error(error)
+            self.requeue_survivors(key, task, transfers)
+            return False
+        if not self.transfer_group(transfers, new_room["id"]):
+            # the survivors wait again, an empty room is kept for another group
+            self.requeue_survivors(key, task, transfers)
+            if not any(transfer.state in {Transfer.MOVED, Transfer.ARRIVED}
+                       for transfer in transfers):
+                self.room_pool.put(layout_id, new_room, etag)
+            return False
+        self.matchmaker.record_match(key, group)
+        for waiting in group:
+            self.refusals.pop(waiting.user_id, None)
+        self.pairs.add_group([waiting.user_id for waiting in group])
+        self.estimator.matched(key, time.monotonic() - started)
+        LOG.debug(f"Waits per room and task: {self.matchmaker.summary()}")
+        self.sio.emit("room_created", {"room": new_room["id"], "task": task_id})
+        return True
+
+    def user_task_leave(self, user, task, room):
         """The task entry of a disconnected user is removed.
 
         :param user: Holds keys `id` and `name`.
@@ -209,11 +914,11 @@ class ConciergeBot:
         :param task: Holds keys `date_created`, `date_modified`, `id`,
             `layout_id`, `name` and `num_users`.
         :type task: dict
+        :param room: Identifier of the room that the user left.
+        :type room: int
         """
-        task_id = task["id"]
-        user_id = user["id"]
-        if task_id in self.tasks and user_id in self.tasks[task_id]:
-            del self.tasks[task["id"]][user["id"]]
+        self.matchmaker.remove((room, task["id"]), user["id"])
+        self.refusals.pop(user["id"], None)
 
 
 if __name__ == "__main__":
@@ -234,6 +939,16 @@ if __name__ == "__main__":
         user = {"required": True}
     host = {"default": os.environ.get("SLURK_HOST", "http://localhost")}
     port = {"default": os.environ.get("SLURK_PORT")}
+    bot_status = {"default": os.environ.get("CONCIERGE_BOT_STATUS", "").split()}
+    batch_interval = {"default": os.environ.get("CONCIERGE_BATCH_INTERVAL")}
+    estimate_interval = {"default": os.environ.get("CONCIERGE_ESTIMATE_INTERVAL")}
+    status_port = {"default": os.environ.get("CONCIERGE_STATUS_PORT")}
+    waiting_rooms = {"default": os.environ.get("CONCIERGE_WAITING_ROOMS", "").split()}
+    room_pool = {"default": os.environ.get("CONCIERGE_ROOM_POOL", 0)}
+    room_pool_file = {"default": os.environ.get("CONCIERGE_ROOM_POOL_FILE")}
+    store = {"default": os.environ.get("CONCIERGE_STORE")}
+    pair_filter = {"default": os.environ.get("CONCIERGE_PAIR_FILTER")}
+    shard = {"default": os.environ.get("CONCIERGE_SHARD", "0/1")}
 
     # register commandline arguments
     parser.add_argument(
@@ -244,9 +959,89 @@ if __name__ == "__main__":
         "-c", "--host", help="full URL (protocol, hostname) of chat server", **host
     )
     parser.add_argument("-p", "--port", type=int, help="port of chat server", **port)
+    parser.add_argument(
+        "--bot_status",
+        nargs="*",
+        metavar="TASK_ID=URL",
+        help="status url published by the bot serving a task",
+        **bot_status
+    )
+    parser.add_argument(
+        "--waiting_rooms",
+        nargs="*",
+        type=int,
+        metavar="ROOM_ID",
+        help="further waiting rooms served by the bot",
+        **waiting_rooms
+    )
+    parser.add_argument(
+        "--estimate_interval",
+        type=float,
+        help="seconds between checks of the expected waits, users are told if theirs changed",
+        **estimate_interval
+    )
+    parser.add_argument(
+        "--status_port",
+        type=int,
+        help="port to publish the queues and expected waits on",
+        **status_port
+    )
+    parser.add_argument(
+        "--batch_interval",
+        type=float,
+        help="seconds between matching ticks, users are matched on join if not given",
+        **batch_interval
+    )
+    parser.add_argument(
+        "--room_pool",
+        type=int,
+        help="rooms created ahead of time at most per layout, 0 to disable",
+        **room_pool
+    )
+    parser.add_argument(
+        "--room_pool_file",
+        help="file to keep the rooms of the pool in, left over rooms are deleted on start",
+        **room_pool_file
+    )
+    parser.add_argument(
+        "--store",
+        help="SQLite database with the queues shared by several concierge bots",
+        **store
+    )
+    parser.add_argument(
+        "--pair_filter",
+        help="file to keep the pairs of users that were grouped before in",
+        **pair_filter
+    )
+    parser.add_argument(
+        "--shard",
+        metavar="INDEX/COUNT",
+        help="number of this bot and of all bots sharing the store",
+        **shard
+    )
     args = parser.parse_args()
 
     # create bot instance
     concierge_bot = ConciergeBot(args.token, args.user, args.host, args.port)
+    for entry in args.bot_status:
+        task_id, url = entry.split("=", 1)
+        concierge_bot.bot_status[int(task_id)] = url
+    concierge_bot.waiting_rooms = [int(room_id) for room_id in args.waiting_rooms]
+    concierge_bot.batch_interval = args.batch_interval
+    concierge_bot.estimate_interval = args.estimate_interval
+    if args.status_port is not None:
+        StatusServer(args.status_port, concierge_bot.status).start()
+    concierge_bot.room_pool.max_rooms = args.room_pool
+    # bots sharing a store are told apart by their shard
+    shard, shards = map(int, args.shard.split("/"))
+    concierge_bot.room_pool.path = args.room_pool_file or f"room_pool_{shard}.json"
+    if args.pair_filter:
+        concierge_bot.pairs.open(args.pair_filter)
+    if args.store:
+        concierge_bot.matchmaker = SharedMatchmaker(
+            args.store, f"{socket.gethostname()}-{os.getpid()}", shard, shards
+        )
+    # unused rooms are deleted when the bot is stopped
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
     # connect to chat server
     concierge_bot.run()
@@ -0,0 +1,382 @@
+"""Queues of the users waiting for their task.
+
+Users of a task are served first come, first served. Each task
+has its own queue in each waiting room, so tasks with different
+group sizes can share a waiting room and one bot can serve several
+waiting rooms. A queue is identified by its key, the pair of the
+waiting room and the task id. The queues are kept in memory, or in
+an SQLite database that several concierge bots serving the same
+waiting room share.
+"""
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque, namedtuple
+from contextlib import contextmanager
+from itertools import islice
+
+
+LOG = logging.getLogger(__name__)
+
+# waits kept per task for the statistics
+RECENT_WAITS = 100
+# seconds a bot owns a task of the shared queues without renewing it
+LEASE = 15
+# users at the head of a queue considered for a group
+CANDIDATES = 50
+
+# a user in a queue, `since` is the time of the join
+Waiting = namedtuple("Waiting", ["user_id", "room", "since"])
+
+
+def choose(candidates, num_users, seen=None):
+    """Choose a group from the users at the head of a queue.
+
+    The first user is always part of the group. Users who were
+    grouped with a chosen user before are skipped while other users
+    are waiting, otherwise the group is filled up in order.
+
+    :param candidates: Waiting users, the first in line first.
+    :type candidates: list
+    :param num_users: Size of the group.
+    :type num_users: int
+    :param seen: Tells whether two user ids were grouped before.
+    :type seen: callable
+    :return: The group, None if fewer users are waiting.
+    :rtype: list
+    """
+    if len(candidates) < num_users:
+        return None
+    if seen is None:
+        return candidates[:num_users]
+    group = candidates[:1]
+    for waiting in candidates[1:]:
+        if len(group) == num_users:
+            return group
+        if not any(seen(waiting.user_id, member.user_id) for member in group):
+            group.append(waiting)
+    for waiting in candidates:
+        if len(group) == num_users:
+            break
+        if waiting not in group:
+            group.append(waiting)
+    return group
+
+
+class WaitStats:
+    """Time users of a task waited until they were matched."""
+
+    def __init__(self):
+        self.matched = 0
+        self.total = 0.0
+        self.longest = 0.0
+        self.recent = deque(maxlen=RECENT_WAITS)
+
+    def add(self, wait):
+        self.matched += 1
+        self.total += wait
+        self.longest = max(self.longest, wait)
+        self.recent.append(wait)
+
+    def to_dict(self):
+        recent = sorted(self.recent)
+        return {
+            "matched": self.matched,
+            "mean": self.total / self.matched if self.matched else None,
+            "median": recent[len(recent) // 2] if recent else None,
+            "longest": self.longest,
+        }
+
+
+class Matchmaker:
+    """First come, first served queues of users, one per task and room.
+
+    Adding, taking and removing a user take constant time. All
+    methods are thread-safe.
+    """
+
+    clock = staticmethod(time.monotonic)
+
+    def __init__(self):
+        self.queues = dict()
+        self.stats = dict()
+        self._lock = threading.Lock()
+
+    def keys(self):
+        """Keys of the queues users have waited in."""
+        return list(self.queues)
+
+    def owns(self, task_id):
+        """Whether this bot forms the groups of a task."""
+        return True
+
+    def waiting(self, key):
+        """Number of users waiting in a queue."""
+        return len(self.queues.get(key, ()))
+
+    def users(self, key):
+        """Identifiers of the users in a queue, the first in line first."""
+        with self._lock:
+            return list(self.queues.get(key, ()))
+
+    def enqueue(self, key, user_id):
+        """Let a user wait in the queue of a task and room.
+
+        A user who is already waiting keeps their place.
+
+        :return: `True` if the user was not waiting yet.
+        :rtype: bool
+        """
+        with self._lock:
+            queue = self.queues.setdefault(key, OrderedDict())
+            if user_id in queue:
+                return False
+            queue[user_id] = Waiting(user_id, key[0], self.clock())
+            return True
+
+    def remove(self, key, user_id):
+        """Remove a user from a queue.
+
+        :return: `True` if the user was waiting.
+        :rtype: bool
+        """
+        with self._lock:
+            return self.queues.get(key, {}).pop(user_id, None) is not None
+
+    def take(self, key, num_users, seen=None):
+        """Take the users that have waited longest in a queue.
+
+        :param seen: Tells whether two user ids were grouped before,
+            see `choose`.
+        :type seen: callable
+        :return: `num_users` waiting users, or None if fewer are waiting.
+        :rtype: list
+        """
+        with self._lock:
+            queue = self.queues.get(key, {})
+            candidates = list(islice(queue.values(), CANDIDATES))
+            group = choose(candidates, num_users, seen)
+            for waiting in group or ():
+                del queue[waiting.user_id]
+            return group
+
+    def requeue(self, key, group):
+        """Put a group that could not be moved back to the head of the queue."""
+        with self._lock:
+            queue = self.queues.setdefault(key, OrderedDict())
+            for waiting in reversed(group):
+                queue[waiting.user_id] = waiting
+                queue.move_to_end(waiting.user_id, last=False)
+
+    def record_match(self, key, group):
+        """Record the wait of each user of a group that was moved."""
+        now = self.clock()
+        with self._lock:
+            stats = self.stats.setdefault(key, WaitStats())
+            for waiting in group:
+                stats.add(now - waiting.since)
+
+    def summary(self):
+        """Waiting users and wait statistics of each queue."""
+        with self._lock:
+            return {
+                key: {
+                    "waiting": len(self.queues.get(key, ())),
+                    **self.stats.get(key, WaitStats()).to_dict(),
+                }
+                for key in self.queues.keys() | self.stats.keys()
+            }
+
+
+class SharedMatchmaker(Matchmaker):
+    """Queues shared by several bots through an SQLite database.
+
+    Every bot queues the users it sees, but only the bot owning a
+    task forms its groups. Each bot prefers the tasks of its shard
+    and takes over other tasks once their owner has stopped renewing
+    its lease. Users are taken out of the queue in a transaction,
+    so no user is moved by two bots.
+
+    :param path: Path of the database, on a local file system.
+    :param owner: Name of this bot, unique among the bots.
+    :param shard: Number of this bot, tasks with `task_id % shards
+        == shard` are served by it first.
+    :param shards: Number of bots.
+    """
+
+    clock = staticmethod(time.time)
+
+    def __init__(self, path, owner, shard=0, shards=1):
+        super().__init__()
+        self.path = path
+        self.owner = owner
+        self.shard = shard
+        self.shards = shards
+        self._local = threading.local()
+        with self._transaction() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS waiting ("
+                " room NOT NULL, task_id NOT NULL, user_id NOT NULL,"
+                " since REAL NOT NULL, position REAL NOT NULL,"
+                " PRIMARY KEY (room, task_id, user_id))"
+            )
+            db.execute(
+                "CREATE INDEX IF NOT EXISTS waiting_order ON waiting (room, task_id, position)"
+            )
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS leases ("
+                " task_id PRIMARY KEY, owner NOT NULL, expires REAL NOT NULL)"
+            )
+
+    @contextmanager
+    def _transaction(self, write=True):
+        # sqlite connections cannot be shared between threads
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            self._local.db = db
+        # only writers take the lock of the database, readers see a snapshot
+        db.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+        try:
+            yield db
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+    def keys(self):
+        with self._transaction(write=False) as db:
+            return db.execute("SELECT DISTINCT room, task_id FROM waiting").fetchall()
+
+    def owns(self, task_id):
+        now = time.time()
+        with self._transaction(write=False) as db:
+            owned = self._lease(db, task_id, now)
+        if owned is not None:
+            return owned
+        with self._transaction() as db:
+            # another bot may have taken the lease in the meantime
+            owned = self._lease(db, task_id, now)
+            if owned is not None:
+                return owned
+            row = db.execute(
+                "SELECT owner FROM leases WHERE task_id = ?", (task_id,)
+            ).fetchone()
+            if row is None or row[0] != self.owner:
+                LOG.info(f"Taking over task {task_id}.")
+            db.execute(
+                "INSERT OR REPLACE INTO leases VALUES (?, ?, ?)",
+                (task_id, self.owner, now + LEASE)
+            )
+            return True
+
+    def _lease(self, db, task_id, now):
+        """Whether this bot owns a task without renewing its lease.
+
+        :return: `True` if the lease of this bot is far from
+            expiring, `False` if the task is left to another bot,
+            None if this bot may take or has to renew the lease.
+        """
+        row = db.execute(
+            "SELECT owner, expires FROM leases WHERE task_id = ?", (task_id,)
+        ).fetchone()
+        if row is not None and row[0] == self.owner:
+            return True if row[1] - now > LEASE / 2 else None
+        if row is not None and row[1] > now:
+            return False
+        if task_id % self.shards != self.shard:
+            # give the bot of the shard some time to claim the task
+            if row is not None:
+                waited = now - row[1]
+            else:
+                oldest = db.execute(
+                    "SELECT MIN(since) FROM waiting WHERE task_id = ?", (task_id,)
+                ).fetchone()[0]
+                waited = 0 if oldest is None else now - oldest
+            if waited < LEASE:
+                return False
+        return None
+
+    def keep_leases(self):
+        """Renew the leases of the tasks owned by this bot until it stops."""
+        while True:
+            time.sleep(LEASE / 3)
+            with self._transaction() as db:
+                db.execute(
+                    "UPDATE leases SET expires = ? WHERE owner = ?",
+                    (time.time() + LEASE, self.owner)
+                )
+
+    def release(self):
+        """Give up all tasks, so that other bots take them over at once."""
+        with self._transaction() as db:
+            db.execute("DELETE FROM leases WHERE owner = ?", (self.owner,))
+
+    def waiting(self, key):
+        with self._transaction(write=False) as db:
+            return db.execute(
+                "SELECT COUNT(*) FROM waiting WHERE room = ? AND task_id = ?", key
+            ).fetchone()[0]
+
+    def users(self, key):
+        with self._transaction(write=False) as db:
+            return [row[0] for row in db.execute(
+                "SELECT user_id FROM waiting WHERE room = ? AND task_id = ? ORDER BY position", key
+            )]
+
+    def enqueue(self, key, user_id):
+        with self._transaction() as db:
+            return db.execute(
+                "INSERT OR IGNORE INTO waiting SELECT ?, ?, ?, ?,"
+                " COALESCE(MAX(position), 0) + 1 FROM waiting WHERE room = ? AND task_id = ?",
+                (*key, user_id, time.time(), *key)
+            ).rowcount > 0
+
+    def remove(self, key, user_id):
+        with self._transaction() as db:
+            return db.execute(
+                "DELETE FROM waiting WHERE room = ? AND task_id = ? AND user_id = ?",
+                (*key, user_id)
+            ).rowcount > 0
+
+    def take(self, key, num_users, seen=None):
+        with self._transaction() as db:
+            rows = db.execute(
+                "SELECT user_id, room, since FROM waiting WHERE room = ? AND task_id = ?"
+                " ORDER BY position LIMIT ?",
+                (*key, CANDIDATES if seen else num_users)
+            ).fetchall()
+            group = choose([Waiting(*row) for row in rows], num_users, seen)
+            if group is not None:
+                db.executemany(
+                    "DELETE FROM waiting WHERE room = ? AND task_id = ? AND user_id = ?",
+                    [(*key, waiting.user_id) for waiting in group]
+                )
+            return group
+
+    def requeue(self, key, group):
+        with self._transaction() as db:
+            for waiting in reversed(group):
+                db.execute(
+                    "INSERT OR REPLACE INTO waiting SELECT ?, ?, ?, ?, COALESCE(MIN(position), 0)"
+                    " - 1 FROM waiting WHERE room = ? AND task_id = ?",
+                    (*key, waiting.user_id, waiting.since, *key)
+                )
+
+    def summary(self):
+        with self._transaction(write=False) as db:
+            counts = {
+                (room, task_id): count for room, task_id, count in db.execute(
+                    "SELECT room, task_id, COUNT(*) FROM waiting GROUP BY room, task_id"
+                )
+            }
+        with self._lock:
+            return {
+                key: {
+                    "waiting": counts.get(key, 0),
+                    **self.stats.get(key, WaitStats()).to_dict(),
+                }
+                for key in counts.keys() | self.stats.keys()
+            }
@@ -0,0 +1,115 @@
+"""Remember which users were grouped together before.
+
+The pairs are kept in a Bloom filter, so the memory it takes is
+fixed no matter how many pairs are added. A pair that was never
+added is reported as seen with a small probability, a pair that
+was added is always reported as seen.
+"""
+import hashlib
+import logging
+import math
+import os
+import struct
+import threading
+import time
+
+
+LOG = logging.getLogger(__name__)
+
+# pairs the filter is sized for, and the rate of false positives at that size
+CAPACITY = 100000
+ERROR_RATE = 0.01
+# seconds between two writes of the filter file while adding pairs
+SAVE_INTERVAL = 10
+
+_HEADER = struct.Struct(">4sQQQ")
+_MAGIC = b"PAIR"
+
+
+class PairFilter:
+    """Bloom filter of unordered pairs of user ids.
+
+    :param capacity: Number of pairs the filter is sized for.
+    :type capacity: int
+    :param error_rate: Probability of a false positive at capacity.
+    :type error_rate: float
+    """
+
+    def __init__(self, capacity=CAPACITY, error_rate=ERROR_RATE):
+        self.capacity = capacity
+        self.size = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.count = 0
+        self.bits = bytearray((self.size + 7) // 8)
+        self.path = None
+        self._lock = threading.Lock()
+        self._saved_at = 0
+
+    def open(self, path):
+        """Persist the filter to `path`, continuing from its content."""
+        with self._lock:
+            self.path = path
+            try:
+                with open(path, "rb") as file:
+                    magic, size, hashes, count = _HEADER.unpack(file.read(_HEADER.size))
+                    bits = bytearray(file.read())
+            except FileNotFoundError:
+                return
+            except (OSError, struct.error) as error:
+                LOG.error(f"Could not read pair filter {path}: {error}")
+                return
+            if magic != _MAGIC or len(bits) != (size + 7) // 8:
+                LOG.error(f"Not a pair filter: {path}")
+                return
+            if size != self.size or hashes != self.hashes:
+                LOG.warning(f"Pair filter {path} was made for another capacity, keeping its size.")
+            # the filter keeps the size and hashes it was made with,
+            # its capacity is the one these are optimal for
+            self.size, self.hashes, self.count, self.bits = size, hashes, count, bits
+            self.capacity = max(1, round(size * math.log(2) / hashes))
+            LOG.info(f"Loaded {count} pairs from {path}")
+
+    def _positions(self, first, second):
+        # the pair is unordered, (a, b) and (b, a) are the same
+        low, high = sorted((str(first), str(second)))
+        digest = hashlib.blake2b(f"{low}:{high}".encode(), digest_size=16).digest()
+        h1, h2 = struct.unpack(">QQ", digest)
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def seen(self, first, second):
+        """Whether two users were probably grouped together before."""
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(first, second)
+        )
+
+    def add_group(self, user_ids):
+        """Remember every pair of users of a group."""
+        with self._lock:
+            full = self.count > self.capacity
+            for i, first in enumerate(user_ids):
+                for second in user_ids[i + 1:]:
+                    for position in self._positions(first, second):
+                        self.bits[position >> 3] |= 1 << (position & 7)
+                    self.count += 1
+            if not full and self.count > self.capacity:
+                LOG.warning("Pair filter is over capacity, more new pairs will be taken as seen.")
+            if time.monotonic() - self._saved_at >= SAVE_INTERVAL:
+                self._save()
+
+    def save(self):
+        with self._lock:
+            self._save()
+
+    def _save(self):
+        self._saved_at = time.monotonic()
+        if self.path is None:
+            return
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "wb") as file:
+                file.write(_HEADER.pack(_MAGIC, self.size, self.hashes, self.count))
+                file.write(self.bits)
+            os.replace(tmp_path, self.path)
+        except OSError as error:
+            LOG.error(f"Could not save pair filter {self.path}: {error}")
@@ -0,0 +1,138 @@
+"""Retries and circuit breaking for the requests to the server.
+
+Requests failing with a transient error are retried with a
+jittered exponential backoff. Each endpoint has a circuit breaker:
+after repeated failures, requests to the endpoint fail at once for
+a while instead of waiting for the server, and a single request
+probes whether it has recovered.
+"""
+import logging
+import random
+import threading
+import time
+
+import requests
+
+
+LOG = logging.getLogger(__name__)
+
+# status codes of responses worth retrying
+TRANSIENT = {408, 425, 429, 500, 502, 503, 504}
+ATTEMPTS = 3
+# seconds before the first retry, doubled for each further one
+BACKOFF = 0.5
+# failures in a row after which a circuit opens
+THRESHOLD = 5
+# seconds a circuit stays open
+COOLDOWN = 30
+# seconds until a request is given up
+TIMEOUT = 10
+
+
+class RequestFailed(Exception):
+    """A request to the server failed and was not retried further."""
+
+
+class CircuitBreaker:
+    """Lets requests to an endpoint fail fast while it is down."""
+
+    def __init__(self, name):
+        self.name = name
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Whether a request may be sent."""
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if self._probing or time.monotonic() - self.opened_at < COOLDOWN:
+                return False
+            # half open, one request probes the endpoint
+            self._probing = True
+            return True
+
+    def succeeded(self):
+        with self._lock:
+            if self.opened_at is not None:
+                LOG.info(f"Circuit for {self.name} closed.")
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def failed(self):
+        with self._lock:
+            self.failures += 1
+            if self._probing or self.failures >= THRESHOLD:
+                if self.opened_at is None:
+                    LOG.warning(f"Circuit for {self.name} opened.")
+                self.opened_at = time.monotonic()
+                self._probing = False
+
+
+class Client:
+    """Sends requests to the server, one circuit breaker per endpoint.
+
+    :param token: Token the requests are authorized with.
+    :type token: str
+    :param session: Session whose connections are reused, may be
+        shared by several clients. A new one is created if not given.
+    :type session: requests.Session
+    """
+
+    def __init__(self, token, session=None):
+        self.token = token
+        self.session = session or requests.Session()
+        self.breakers = dict()
+        self._lock = threading.Lock()
+
+    def breaker(self, endpoint):
+        with self._lock:
+            if endpoint not in self.breakers:
+                self.breakers[endpoint] = CircuitBreaker(endpoint)
+            return self.breakers[endpoint]
+
+    def request(self, endpoint, method, url, etag=None, **kwargs):
+        """Send a request, retrying it on transient errors.
+
+        :param endpoint: Name of the endpoint for its circuit breaker.
+        :type endpoint: str
+        :param method: HTTP method, e.g. "GET".
+        :type method: str
+        :param url: URL of the request.
+        :type url: str
+        :param etag: Sent as `If-Match` header if given.
+        :type etag: str
+        :return: The response, which may be an error the server
+            will give again, e.g. 404 or 412.
+        :rtype: requests.Response
+        :raises RequestFailed: If the circuit of the endpoint is
+            open or the server did not answer after all attempts.
+        """
+        breaker = self.breaker(endpoint)
+        headers = {"Authorization": f"Bearer {self.token}"}
+        if etag is not None:
+            headers["If-Match"] = etag
+        kwargs.setdefault("timeout", TIMEOUT)
+
+        delay = BACKOFF
+        for attempt in range(1, ATTEMPTS + 1):
+            if not breaker.allow():
+                raise RequestFailed(f"Circuit for {endpoint} is open")
+            try:
+                response = self.session.request(method, url, headers=headers, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as error:
+                problem = error
+            else:
+                if response.status_code not in TRANSIENT:
+                    breaker.succeeded()
+                    return response
+                problem = response.status_code
+            breaker.failed()
+            if attempt < ATTEMPTS:
+                LOG.warning(f"Request to {endpoint} failed ({problem}), retrying.")
+                time.sleep(random.uniform(delay / 2, delay))
+                delay *= 2
+        raise RequestFailed(f"Request to {endpoint} failed: {problem}")
@@ -0,0 +1,167 @@
+"""Task rooms created ahead of time.
+
+Creating a room is the slowest step between finding a group and
+moving it. The pool keeps a few rooms of each layout ready, as
+many as are expected to be needed while new rooms are created.
+The rooms in the pool are written to a file, so that rooms left
+over by a bot that was killed are deleted when it starts again.
+"""
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import defaultdict, deque
+
+
+LOG = logging.getLogger(__name__)
+
+# seconds over which the match rate of a layout is averaged
+RATE_WINDOW = 300
+# seconds of matches the pool should cover
+LEAD_TIME = 10
+# matches expected during LEAD_TIME below which no room is kept,
+# so that the pool of a layout drains once it is rarely matched
+MIN_DEMAND = 0.1
+# seconds between two checks of the pool if no room was taken
+REFILL_INTERVAL = 30
+
+
+class RoomPool:
+    """Rooms ready to be used, per layout.
+
+    :param create: Function creating a room of a layout, returns
+        the room and its ETag.
+    :param delete: Function deleting a room given the room and its ETag.
+    :param max_rooms: Rooms kept at most per layout, 0 disables the pool.
+    :param path: File the rooms of the pool are kept in, if given.
+    """
+
+    def __init__(self, create, delete, max_rooms, path=None):
+        self.create = create
+        self.delete = delete
+        self.max_rooms = max_rooms
+        self.path = path
+        # layout -> pairs of a room and its ETag
+        self.rooms = defaultdict(deque)
+        # layout -> (matches per second, time of the last match)
+        self.rates = dict()
+        self._lock = threading.Lock()
+        self._wanted = threading.Event()
+        self._stopped = False
+
+    def reclaim(self):
+        """Delete the rooms a previous run left in the file of the pool."""
+        if self.path is None:
+            return
+        try:
+            with open(self.path) as file:
+                leftover = json.load(file)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as error:
+            LOG.error(f"Could not read room pool {self.path}: {error}")
+            return
+        for room, etag in leftover:
+            self._delete(room, etag)
+        with self._lock:
+            self._save()
+        LOG.info(f"Deleted {len(leftover)} rooms left over in the pool.")
+
+    def get(self, layout_id):
+        """Take a room of a layout and its ETag, None if there is none ready."""
+        with self._lock:
+            self._count_match(layout_id)
+            rooms = self.rooms[layout_id]
+            room = rooms.popleft() if rooms else None
+            if room is not None:
+                self._save()
+        self._wanted.set()
+        return room
+
+    def put(self, layout_id, room, etag):
+        """Return a room that was not used."""
+        with self._lock:
+            if not self._stopped and len(self.rooms[layout_id]) < self.target(layout_id):
+                self.rooms[layout_id].append((room, etag))
+                self._save()
+                return
+        self._delete(room, etag)
+
+    def target(self, layout_id):
+        """Rooms of a layout that should be ready."""
+        rate, last = self.rates.get(layout_id, (0.0, None))
+        if last is None:
+            return 0
+        rate *= math.exp(-(time.monotonic() - last) / RATE_WINDOW)
+        demand = rate * LEAD_TIME
+        if demand < MIN_DEMAND:
+            return 0
+        return min(self.max_rooms, math.ceil(demand))
+
+    def refill(self):
+        """Keep the pool filled until it is stopped."""
+        while not self._stopped:
+            self._wanted.wait(REFILL_INTERVAL)
+            self._wanted.clear()
+            for layout_id in list(self.rates):
+                self._fill(layout_id)
+
+    def stop(self):
+        """Delete all rooms that were not used."""
+        with self._lock:
+            self._stopped = True
+            rooms = [room for layout in self.rooms.values() for room in layout]
+            self.rooms.clear()
+        self._wanted.set()
+        for room, etag in rooms:
+            self._delete(room, etag)
+        if rooms:
+            with self._lock:
+                self._save()
+        LOG.info(f"Deleted {len(rooms)} unused rooms.")
+
+    def _count_match(self, layout_id):
+        # matches per second, decaying exponentially over RATE_WINDOW
+        now = time.monotonic()
+        rate, last = self.rates.get(layout_id, (0.0, now))
+        rate = rate * math.exp(-(now - last) / RATE_WINDOW) + 1 / RATE_WINDOW
+        self.rates[layout_id] = (rate, now)
+
+    def _fill(self, layout_id):
+        # rooms above the target are deleted, so an idle layout drains
+        with self._lock:
+            rooms = self.rooms[layout_id]
+            surplus = [rooms.pop() for _ in range(len(rooms) - self.target(layout_id))]
+            if surplus:
+                self._save()
+            elif not rooms and self.target(layout_id) == 0:
+                del self.rates[layout_id]
+        for room, etag in surplus:
+            self._delete(room, etag)
+        while not self._stopped and len(self.rooms[layout_id]) < self.target(layout_id):
+            try:
+                room, etag = self.create(layout_id)
+            except Exception as error:
+                LOG.error(f"Could not create room for the pool: {error}")
+                return
+            self.put(layout_id, room, etag)
+
+    def _save(self):
+        if self.path is None:
+            return
+        rooms = [room for layout in self.rooms.values() for room in layout]
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w") as file:
+                json.dump(rooms, file)
+            os.replace(tmp_path, self.path)
+        except OSError as error:
+            LOG.error(f"Could not save room pool {self.path}: {error}")
+
+    def _delete(self, room, etag):
+        try:
+            self.delete(room, etag)
+        except Exception as error:
+            LOG.error(f"Could not delete room {room['id']}: {error}")
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+
+# University of Potsdam
+"""Group transfer test cases."""
+
+import os
+import sys
+import unittest
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from concierge import MAX_REFUSALS, ConciergeBot
+from resilience import RequestFailed
+
+WAITING_ROOM = 5
+TASK = {"id": 4, "layout_id": 2, "num_users": 2}
+KEY = (WAITING_ROOM, TASK["id"])
+
+
+class StubResponse:
+    def __init__(self, status_code=200, json=None):
+        self.status_code = status_code
+        self.ok = status_code < 400
+        self.headers = {"ETag": "etag"}
+        self._json = json
+
+    def json(self):
+        return self._json
+
+
+class StubClient:
+    """Stands in for `resilience.Client` and keeps the rooms of the users.
+
+    Users in `refused` cannot join a room, the server answers 403;
+    joins of users in `unreachable` fail as if the server was down.
+    """
+    def __init__(self, connected):
+        self.rooms = {user_id: {WAITING_ROOM} for user_id in connected}
+        self.refused = set()
+        self.unreachable = set()
+        self.created = []
+        self.deleted = []
+        self.moves = []
+
+    def request(self, endpoint, method, url, etag=None, **kwargs):
+        path = url.split("/slurk/api", 1)[1].strip("/").split("/")
+        if path == ["rooms"] and method == "POST":
+            room_id = 100 + len(self.created)
+            self.created.append(room_id)
+            return StubResponse(json={"id": room_id})
+        if path[0] == "rooms" and method == "DELETE":
+            self.deleted.append(int(path[1]))
+            return StubResponse()
+        user_id = int(path[1])
+        if len(path) == 2:
+            if user_id not in self.rooms:
+                return StubResponse(json={"id": user_id, "session_id": None})
+            rooms = sorted(self.rooms[user_id])
+            return StubResponse(json={"id": user_id, "session_id": "s", "rooms": rooms})
+        room_id = int(path[3])
+        if method == "POST":
+            if user_id in self.unreachable:
+                raise RequestFailed("Circuit for user_rooms is open")
+            if user_id in self.refused:
+                return StubResponse(403)
+            self.rooms[user_id].add(room_id)
+        else:
+            self.rooms[user_id].discard(room_id)
+        self.moves.append((method, user_id, room_id))
+        return StubResponse()
+
+
+class TestGroupTransfer(unittest.TestCase):
+    def setUp(self):
+        self.bot = ConciergeBot("token", 1, "http://localhost", None)
+        self.client = StubClient(connected=[10, 11, 12])
+        self.bot.client = self.client
+        self.bot.sio.emit = mock.Mock()
+        self.bot.task_catalog[TASK["id"]] = TASK
+
+    def queue(self, *user_ids):
+        for user_id in user_ids:
+            self.bot.matchmaker.enqueue(KEY, user_id)
+
+    def form_group(self):
+        return self.bot.form_group(TASK, WAITING_ROOM)
+
+    def test_group_is_moved_to_a_new_room(self):
+        self.queue(10, 11)
+
+        self.assertTrue(self.form_group())
+        self.assertEqual(self.client.rooms[10], {100})
+        self.assertEqual(self.client.rooms[11], {100})
+        self.assertEqual(self.bot.matchmaker.waiting(KEY), 0)
+        self.bot.sio.emit.assert_called_once_with(
+            "room_created", {"room": 100, "task": TASK["id"]}
+        )
+
+    def test_failed_transfer_is_rolled_back(self):
+        self.client.refused.add(11)
+        self.queue(10, 11, 12)
+
+        self.assertFalse(self.form_group())
+        # nobody stays in the task room, which is deleted
+        self.assertEqual(self.client.rooms[10], {WAITING_ROOM})
+        self.assertEqual(self.client.rooms[11], {WAITING_ROOM})
+        self.assertEqual(self.client.deleted, [100])
+        self.bot.sio.emit.assert_not_called()
+
+    def test_refused_user_waits_at_the_end(self):
+        self.client.refused.add(11)
+        self.queue(10, 11, 12)
+        self.form_group()
+
+        self.assertEqual(self.bot.matchmaker.users(KEY), [10, 12, 11])
+        self.assertIn(KEY, self.bot.held)
+        self.assertEqual(self.bot.refusals, {11: 1})
+
+    def test_refused_user_is_dropped_after_the_limit(self):
+        self.client.refused.add(11)
+        self.queue(10, 11)
+        for _ in range(MAX_REFUSALS):
+            self.assertFalse(self.form_group())
+
+        self.assertEqual(self.bot.matchmaker.users(KEY), [10])
+        self.assertEqual(len(self.client.created), MAX_REFUSALS)
+        # no further room is made and nobody is moved again
+        self.assertFalse(self.form_group())
+        self.assertEqual(len(self.client.created), MAX_REFUSALS)
+
+    def test_unreachable_server_is_not_a_refusal(self):
+        self.client.unreachable.add(11)
+        self.queue(10, 11)
+        self.form_group()
+
+        self.assertEqual(self.bot.matchmaker.users(KEY), [10, 11])
+        self.assertEqual(self.bot.refusals, {})
+
+    def test_gone_user_is_dropped_before_a_room_is_made(self):
+        del self.client.rooms[11]
+        self.queue(10, 11, 12)
+
+        self.assertFalse(self.form_group())
+        self.assertEqual(self.client.created, [])
+        self.assertEqual(self.bot.matchmaker.users(KEY), [10, 12])
+
+    def test_returned_users_are_first_in_line(self):
+        self.queue(10, 11, 12)
+        # user 11 loses the connection once moved
+        move_user = self.bot.move_user
+
+        def move_and_leave(user_id, old_room_id, new_room_id):
+            move_user(user_id, old_room_id, new_room_id)
+            if user_id == 11 and new_room_id != WAITING_ROOM:
+                del self.client.rooms[11]
+        self.bot.move_user = move_and_leave
+
+        self.assertFalse(self.form_group())
+        self.assertEqual(self.client.rooms[10], {WAITING_ROOM})
+        self.assertEqual(self.bot.matchmaker.users(KEY), [10, 12])
+
+    def test_successful_move_resets_the_refusals(self):
+        self.client.refused.add(11)
+        self.queue(10, 11)
+        self.form_group()
+        self.client.refused.clear()
+
+        self.assertTrue(self.form_group())
+        self.assertEqual(self.bot.refusals, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+
+# University of Potsdam
+"""Queue test cases."""
+
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+import matchmaking
+from matchmaking import LEASE, Matchmaker, SharedMatchmaker
+
+
+class TestMatchmaker(unittest.TestCase):
+    def setUp(self):
+        self.matchmaker = Matchmaker()
+        self.key = (10, 4)
+        for user_id in [1, 2, 3, 4, 5]:
+            self.matchmaker.enqueue(self.key, user_id)
+
+    def user_ids(self, group):
+        return [waiting.user_id for waiting in group]
+
+    def test_groups_are_taken_first_come_first_served(self):
+        first = self.matchmaker.take(self.key, 2)
+        second = self.matchmaker.take(self.key, 2)
+
+        self.assertEqual(self.user_ids(first), [1, 2])
+        self.assertEqual(self.user_ids(second), [3, 4])
+        self.assertIsNone(self.matchmaker.take(self.key, 2))
+        self.assertEqual(self.matchmaker.users(self.key), [5])
+
+    def test_waiting_user_keeps_their_place(self):
+        self.assertFalse(self.matchmaker.enqueue(self.key, 1))
+        self.assertTrue(self.matchmaker.enqueue(self.key, 6))
+
+        self.assertEqual(self.matchmaker.users(self.key), [1, 2, 3, 4, 5, 6])
+
+    def test_requeued_group_is_first_in_line(self):
+        group = self.matchmaker.take(self.key, 2)
+        self.matchmaker.enqueue(self.key, 6)
+        self.matchmaker.requeue(self.key, group)
+
+        self.assertEqual(self.matchmaker.users(self.key), [1, 2, 3, 4, 5, 6])
+        self.assertEqual(self.user_ids(self.matchmaker.take(self.key, 2)), [1, 2])
+
+    def test_queues_are_separate_per_room_and_task(self):
+        self.matchmaker.enqueue((11, 4), 6)
+        self.matchmaker.enqueue((10, 5), 7)
+
+        self.assertEqual(self.matchmaker.waiting(self.key), 5)
+        self.assertEqual(self.matchmaker.users((11, 4)), [6])
+        self.assertEqual(self.matchmaker.users((10, 5)), [7])
+
+    def test_previous_partners_are_skipped(self):
+        def seen(first, second):
+            return {first, second} == {1, 2}
+
+        group = self.matchmaker.take(self.key, 2, seen)
+
+        self.assertEqual(self.user_ids(group), [1, 3])
+        self.assertEqual(self.matchmaker.users(self.key), [2, 4, 5])
+
+    def test_removed_user_is_not_taken(self):
+        self.assertTrue(self.matchmaker.remove(self.key, 2))
+        self.assertFalse(self.matchmaker.remove(self.key, 2))
+
+        self.assertEqual(self.user_ids(self.matchmaker.take(self.key, 2)), [1, 3])
+
+
+class TestSharedMatchmaker(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "queues.db")
+        self.first = SharedMatchmaker(path, "first", 0, 2)
+        self.second = SharedMatchmaker(path, "second", 1, 2)
+        self.now = matchmaking.time.time()
+
+    def later(self, seconds):
+        """Let `seconds` pass for the leases."""
+        self.now += seconds
+        return mock.patch.object(matchmaking.time, "time", return_value=self.now)
+
+    def test_queues_are_shared(self):
+        self.assertTrue(self.first.enqueue((10, 4), 1))
+        self.assertFalse(self.second.enqueue((10, 4), 1))
+        self.second.enqueue((10, 4), 2)
+
+        self.assertEqual(self.first.users((10, 4)), [1, 2])
+        self.assertEqual([w.user_id for w in self.second.take((10, 4), 2)], [1, 2])
+        self.assertEqual(self.first.waiting((10, 4)), 0)
+
+    def test_requeued_group_is_first_in_line(self):
+        for user_id in [1, 2, 3]:
+            self.first.enqueue((10, 4), user_id)
+        group = self.first.take((10, 4), 2)
+        self.second.requeue((10, 4), group)
+
+        self.assertEqual(self.second.users((10, 4)), [1, 2, 3])
+
+    def test_task_is_served_by_the_bot_of_its_shard(self):
+        self.first.enqueue((10, 4), 1)
+        self.first.enqueue((10, 5), 2)
+
+        self.assertFalse(self.second.owns(4))
+        self.assertTrue(self.first.owns(4))
+        self.assertFalse(self.first.owns(5))
+        self.assertTrue(self.second.owns(5))
+
+    def test_lease_keeps_the_owner(self):
+        self.first.enqueue((10, 4), 1)
+        self.assertTrue(self.first.owns(4))
+
+        with self.later(LEASE / 2):
+            self.assertFalse(self.second.owns(4))
+
+    def test_task_is_taken_over_once_the_lease_expired(self):
+        self.first.enqueue((10, 4), 1)
+        self.assertTrue(self.first.owns(4))
+
+        # the bot of another shard waits for the lease and a grace period
+        with self.later(LEASE + 1):
+            self.assertFalse(self.second.owns(4))
+        with self.later(LEASE):
+            self.assertTrue(self.second.owns(4))
+            self.assertFalse(self.first.owns(4))
+
+    def expires(self, task_id):
+        with self.first._transaction(write=False) as db:
+            return db.execute(
+                "SELECT expires FROM leases WHERE task_id = ?", (task_id,)
+            ).fetchone()[0]
+
+    def test_fresh_lease_is_not_written_again(self):
+        self.first.enqueue((10, 4), 1)
+        with self.later(0):
+            self.assertTrue(self.first.owns(4))
+        expires = self.expires(4)
+
+        with self.later(LEASE / 4):
+            self.assertTrue(self.first.owns(4))
+        self.assertEqual(self.expires(4), expires)
+
+    def test_lease_close_to_expiring_is_renewed(self):
+        self.first.enqueue((10, 4), 1)
+        with self.later(0):
+            self.assertTrue(self.first.owns(4))
+
+        with self.later(LEASE * 3 / 4):
+            self.assertTrue(self.first.owns(4))
+        self.assertEqual(self.expires(4), self.now + LEASE)
+
+    def test_released_task_is_taken_over(self):
+        self.first.enqueue((10, 4), 1)
+        self.assertTrue(self.first.owns(4))
+        self.first.release()
+
+        # only the grace period of a task without lease applies
+        with self.later(LEASE + 1):
+            self.assertTrue(self.second.owns(4))
+
+
+if __name__ == "__main__":
+    unittest.main()
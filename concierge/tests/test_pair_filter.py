@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+
+# University of Potsdam
+"""Pair filter test cases."""
+
+import os
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from pair_filter import PairFilter
+
+
+class TestPairFilter(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "pairs.bin")
+
+    def test_pairs_of_a_group_are_seen_in_any_order(self):
+        pairs = PairFilter(1000)
+        pairs.add_group([1, 2, 3])
+
+        self.assertTrue(pairs.seen(1, 2))
+        self.assertTrue(pairs.seen(3, 1))
+        self.assertFalse(pairs.seen(1, 4))
+        self.assertEqual(pairs.count, 3)
+
+    def test_pairs_are_kept_between_runs(self):
+        pairs = PairFilter(1000)
+        pairs.open(self.path)
+        pairs.add_group([1, 2])
+        pairs.save()
+
+        loaded = PairFilter(1000)
+        loaded.open(self.path)
+
+        self.assertTrue(loaded.seen(2, 1))
+        self.assertFalse(loaded.seen(1, 3))
+        self.assertEqual(loaded.count, 1)
+
+    def test_loaded_filter_keeps_its_size(self):
+        pairs = PairFilter(1000)
+        pairs.open(self.path)
+        pairs.add_group([1, 2])
+        pairs.save()
+
+        loaded = PairFilter(50000)
+        loaded.open(self.path)
+
+        self.assertEqual((loaded.size, loaded.hashes), (pairs.size, pairs.hashes))
+        self.assertAlmostEqual(loaded.capacity, 1000, delta=100)
+        self.assertTrue(loaded.seen(1, 2))
+
+    def test_invalid_file_is_ignored(self):
+        with open(self.path, "wb") as file:
+            file.write(b"not a pair filter at all")
+        pairs = PairFilter(1000)
+        pairs.open(self.path)
+
+        self.assertEqual(pairs.count, 0)
+        self.assertFalse(pairs.seen(1, 2))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+
+# University of Potsdam
+"""Retry and circuit breaker test cases."""
+
+import os
+import sys
+import unittest
+from unittest import mock
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+import resilience
+from resilience import COOLDOWN, THRESHOLD, CircuitBreaker, Client, RequestFailed
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        clock = mock.Mock(monotonic=lambda: self.now)
+        patcher = mock.patch.object(resilience, "time", clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker("users")
+
+    def open_circuit(self):
+        for _ in range(THRESHOLD):
+            self.assertTrue(self.breaker.allow())
+            self.breaker.failed()
+
+    def test_circuit_opens_after_repeated_failures(self):
+        self.open_circuit()
+
+        self.assertFalse(self.breaker.allow())
+
+    def test_success_resets_the_failures(self):
+        for _ in range(THRESHOLD - 1):
+            self.breaker.failed()
+        self.breaker.succeeded()
+        self.breaker.failed()
+
+        self.assertTrue(self.breaker.allow())
+
+    def test_half_open_circuit_lets_one_probe_through(self):
+        self.open_circuit()
+        self.now += COOLDOWN
+
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())
+
+    def test_successful_probe_closes_the_circuit(self):
+        self.open_circuit()
+        self.now += COOLDOWN
+        self.breaker.allow()
+        self.breaker.succeeded()
+
+        self.assertTrue(self.breaker.allow())
+        self.assertTrue(self.breaker.allow())
+
+    def test_failed_probe_opens_the_circuit_again(self):
+        self.open_circuit()
+        self.now += COOLDOWN
+        self.breaker.allow()
+        self.breaker.failed()
+
+        self.assertFalse(self.breaker.allow())
+        self.now += COOLDOWN
+        self.assertTrue(self.breaker.allow())
+
+
+class TestClient(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(resilience.time, "sleep")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.session = mock.Mock(spec=requests.Session)
+        self.client = Client("token", self.session)
+
+    def response(self, status_code):
+        return mock.Mock(status_code=status_code)
+
+    def test_transient_error_is_retried(self):
+        self.session.request.side_effect = [self.response(503), self.response(200)]
+
+        response = self.client.request("users", "GET", "http://localhost/users/1")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.session.request.call_count, 2)
+
+    def test_other_error_is_returned(self):
+        self.session.request.return_value = self.response(404)
+
+        response = self.client.request("users", "GET", "http://localhost/users/1")
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.session.request.call_count, 1)
+
+    def test_request_fails_after_all_attempts(self):
+        self.session.request.side_effect = requests.ConnectionError("refused")
+
+        with self.assertRaises(RequestFailed):
+            self.client.request("users", "GET", "http://localhost/users/1")
+        self.assertEqual(self.session.request.call_count, resilience.ATTEMPTS)
+
+    def test_open_circuit_fails_at_once(self):
+        self.session.request.side_effect = requests.ConnectionError("refused")
+        for _ in range(THRESHOLD):
+            self.client.breaker("users").failed()
+
+        with self.assertRaises(RequestFailed):
+            self.client.request("users", "GET", "http://localhost/users/1")
+        self.session.request.assert_not_called()
+        # other endpoints have circuits of their own
+        self.assertTrue(self.client.breaker("rooms").allow())
+
+
+if __name__ == "__main__":
+    unittest.main()
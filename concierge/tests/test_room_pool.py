@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+
+# University of Potsdam
+"""Room pool test cases."""
+
+import json
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+import room_pool
+from room_pool import LEAD_TIME, MIN_DEMAND, RATE_WINDOW, RoomPool
+
+
+class TestRoomPool(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        clock = mock.Mock(monotonic=lambda: self.now)
+        patcher = mock.patch.object(room_pool, "time", clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "rooms.json")
+
+        self.created = []
+        self.deleted = []
+        self.pool = RoomPool(self.create, self.delete, 4, self.path)
+
+    def create(self, layout_id):
+        room = {"id": 100 + len(self.created), "layout_id": layout_id}
+        self.created.append(room["id"])
+        return room, f"etag-{room['id']}"
+
+    def delete(self, room, etag):
+        self.deleted.append(room["id"])
+
+    def match(self, layout_id, times, every=1.0):
+        """Take `times` rooms of a layout, `every` seconds apart."""
+        for _ in range(times):
+            self.now += every
+            self.pool.get(layout_id)
+
+    def saved(self):
+        with open(self.path) as file:
+            return [room["id"] for room, _ in json.load(file)]
+
+    def test_unknown_layout_keeps_no_rooms(self):
+        self.assertEqual(self.pool.target(1), 0)
+
+    def test_rare_matches_keep_no_rooms(self):
+        # a single match is below the demand a room is kept for
+        self.match(1, 1)
+
+        self.assertLess(LEAD_TIME / RATE_WINDOW, MIN_DEMAND)
+        self.assertEqual(self.pool.target(1), 0)
+
+    def test_target_follows_the_match_rate(self):
+        self.match(1, 100)
+
+        self.assertEqual(self.pool.target(1), 3)
+        self.match(2, 300)
+        self.assertEqual(self.pool.target(2), 4)
+
+    def test_rate_decays(self):
+        self.match(1, 100)
+        self.now += 3 * RATE_WINDOW
+
+        self.assertEqual(self.pool.target(1), 1)
+        self.now += 3 * RATE_WINDOW
+        self.assertEqual(self.pool.target(1), 0)
+
+    def test_pool_is_filled_up_to_the_target(self):
+        self.match(1, 100)
+        self.pool._fill(1)
+
+        self.assertEqual(len(self.created), 3)
+        self.assertEqual(self.saved(), self.created)
+        self.assertEqual(self.pool.get(1)[0]["id"], self.created[0])
+        self.assertEqual(self.saved(), self.created[1:])
+
+    def test_idle_layout_drains(self):
+        self.match(1, 100)
+        self.pool._fill(1)
+        self.now += 6 * RATE_WINDOW
+        self.pool._fill(1)
+
+        self.assertEqual(sorted(self.deleted), self.created)
+        self.assertEqual(self.saved(), [])
+        self.pool._fill(1)
+        self.assertNotIn(1, self.pool.rates)
+
+    def test_room_put_back_above_the_target_is_deleted(self):
+        room, etag = self.create(1)
+        self.pool.put(1, room, etag)
+
+        self.assertEqual(self.deleted, [room["id"]])
+
+    def test_room_put_back_after_stop_is_deleted(self):
+        self.match(1, 100)
+        self.pool._fill(1)
+        self.pool.stop()
+        room, etag = self.create(1)
+        self.pool.put(1, room, etag)
+
+        self.assertEqual(sorted(self.deleted), self.created)
+        self.assertEqual(self.saved(), [])
+
+    def test_leftover_rooms_are_reclaimed(self):
+        self.match(1, 100)
+        self.pool._fill(1)
+        # the bot is killed, the next one finds the rooms in the file
+        pool = RoomPool(self.create, self.delete, 4, self.path)
+        pool.reclaim()
+
+        self.assertEqual(sorted(self.deleted), self.created)
+        self.assertEqual(self.saved(), [])
+
+    def test_reclaim_without_file(self):
+        self.pool.reclaim()
+
+        self.assertEqual(self.deleted, [])
+        self.assertFalse(os.path.exists(self.path))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+
+# University of Potsdam
+"""Wait estimate test cases."""
+
+import os
+import sys
+import unittest
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+import wait_times
+from wait_times import WaitEstimator
+
+
+class TestWaitEstimator(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        clock = mock.Mock(monotonic=lambda: self.now)
+        patcher = mock.patch.object(wait_times, "time", clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.estimator = WaitEstimator(alpha=0.5)
+        self.key = (10, 4)
+
+    def arrive(self, *intervals):
+        for interval in intervals:
+            self.now += interval
+            self.estimator.arrived(self.key)
+
+    def test_unknown_without_arrivals(self):
+        self.assertIsNone(self.estimator.interval(self.key))
+        self.assertIsNone(self.estimator.estimate(self.key, 0, 1, 2))
+
+    def test_interval_is_a_moving_average(self):
+        self.arrive(0, 10, 20)
+
+        # 10 at first, then halfway towards 20
+        self.assertEqual(self.estimator.interval(self.key), 15)
+
+    def test_interval_grows_while_nobody_arrives(self):
+        self.arrive(0, 10)
+        self.now += 40
+
+        self.assertEqual(self.estimator.interval(self.key), 40)
+
+    def test_complete_group_only_waits_for_the_room(self):
+        self.estimator.matched(self.key, 2.0)
+
+        self.assertEqual(self.estimator.estimate(self.key, 1, 2, 2), 2.0)
+
+    def test_estimate_counts_the_missing_users(self):
+        self.arrive(0, 10)
+        self.estimator.matched(self.key, 2.0)
+
+        # a pair misses one user, and a user after the next pair
+        # misses the rest of that pair and a partner
+        self.assertEqual(self.estimator.estimate(self.key, 0, 1, 2), 12.0)
+        self.assertEqual(self.estimator.estimate(self.key, 2, 3, 2), 12.0)
+        self.assertEqual(self.estimator.estimate(self.key, 4, 3, 2), 32.0)
+
+    def test_summary(self):
+        self.arrive(0, 30)
+        self.estimator.matched(self.key, 2.0)
+
+        summary = self.estimator.summary(self.key, 1, 2)
+
+        self.assertEqual(summary["arrivals_per_minute"], 2)
+        self.assertEqual(summary["match_latency"], 2.0)
+        self.assertEqual(summary["estimated_wait"], 32.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+"""Estimate how long users wait and publish it to the operators."""
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+LOG = logging.getLogger(__name__)
+
+# weight of the most recent observation in the moving averages
+ALPHA = 0.2
+
+
+class WaitEstimator:
+    """Moving averages of the arrivals and match latencies per queue.
+
+    The time between two arrivals and the time it takes to move a
+    complete group are averaged exponentially for each queue.
+    """
+
+    def __init__(self, alpha=ALPHA):
+        self.alpha = alpha
+        # key -> (seconds between arrivals, time of the last arrival)
+        self.arrivals = dict()
+        # key -> seconds from taking a group to the room being ready
+        self.latencies = dict()
+        self._lock = threading.Lock()
+
+    def _average(self, old, new):
+        return new if old is None else old + self.alpha * (new - old)
+
+    def arrived(self, key):
+        """Count a user who started waiting in a queue."""
+        now = time.monotonic()
+        with self._lock:
+            interval, last = self.arrivals.get(key, (None, None))
+            if last is not None:
+                interval = self._average(interval, now - last)
+            self.arrivals[key] = (interval, now)
+
+    def matched(self, key, latency):
+        """Count a group of a queue that was moved after `latency` seconds."""
+        with self._lock:
+            self.latencies[key] = self._average(self.latencies.get(key), latency)
+
+    def interval(self, key):
+        """Expected seconds until the next user arrives, None if unknown."""
+        interval, last = self.arrivals.get(key, (None, None))
+        if interval is None:
+            return None
+        # a queue nobody has arrived at for long slows down
+        return max(interval, time.monotonic() - last)
+
+    def estimate(self, key, position, waiting, num_users):
+        """Expected seconds until a user is moved, None if unknown.
+
+        :param key: Key of the queue.
+        :param position: Place of the user in the queue, 0 for the first.
+        :param waiting: Number of users in the queue.
+        :param num_users: Size of a group of the task.
+        """
+        # users ahead are matched first, the group of the user is
+        # complete once it is filled up by new arrivals
+        missing = max(0, (position // num_users + 1) * num_users - waiting)
+        latency = self.latencies.get(key, 0.0)
+        if missing == 0:
+            return latency
+        interval = self.interval(key)
+        if interval is None:
+            return None
+        return missing * interval + latency
+
+    def summary(self, key, waiting, num_users):
+        """Numbers of a queue for the operators."""
+        interval = self.interval(key)
+        return {
+            "arrivals_per_minute": 60 / interval if interval else None,
+            "match_latency": self.latencies.get(key),
+            "estimated_wait": self.estimate(key, waiting, waiting, num_users),
+        }
+
+
+class _StatusHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") not in {"", "/status"}:
+            self.send_error(404)
+            return
+        body = json.dumps(self.server.status()).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        LOG.debug(format, *args)
+
+
+class StatusServer(ThreadingHTTPServer):
+    """Serve the queues of the bot as JSON under `/status`.
+
+    :param port: Port to listen on.
+    :type port: int
+    :param status: Returns the current status as a dict.
+    :type status: callable
+    :param host: Interface to bind to, all by default.
+    :type host: str
+    """
+    daemon_threads = True
+
+    def __init__(self, port, status, host=""):
+        super().__init__((host, port), _StatusHandler)
+        self.status = status
+
+    def start(self):
+        """Serve requests in a background thread."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        LOG.info(f"Serving concierge status on port {self.server_address[1]}")
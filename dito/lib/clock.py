@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""Time sources the bot uses to schedule and delay its actions."""
+
+import heapq
+import itertools
+import threading
+import time
+
+
+class Clock:
+    """Wall clock backed by one thread per timer.
+
+    This is what the bot uses when it is connected to a
+    running chat server.
+    """
+    @staticmethod
+    def timer(interval, function, args=None, kwargs=None):
+        """Create a timer calling `function` after `interval` seconds."""
+        return threading.Timer(interval, function, args=args, kwargs=kwargs)
+
+    @staticmethod
+    def sleep(secs):
+        time.sleep(secs)
+
+    @staticmethod
+    def time():
+        """Seconds elapsed since an arbitrary but fixed point."""
+        return time.monotonic()
+
+
+class VirtualTimer:
+    """Drop-in replacement for `threading.Timer` on a virtual clock.
+
+    Args:
+        clock (VirtualClock): Clock which decides when the timer fires.
+        interval (float): Seconds until `function` is called.
+        function (callable): Called once the interval has passed.
+        args (list): Positional arguments for `function`.
+        kwargs (dict): Keyword arguments for `function`.
+    """
+    def __init__(self, clock, interval, function, args=None, kwargs=None):
+        self._clock = clock
+        self.interval = interval
+        self.function = function
+        self.args = args if args is not None else []
+        self.kwargs = kwargs if kwargs is not None else {}
+        self.deadline = None
+        self.finished = False
+
+    def start(self):
+        self.deadline = self._clock.now + self.interval
+        self._clock._schedule(self)
+
+    def cancel(self):
+        self.finished = True
+
+    def is_alive(self):
+        return self.deadline is not None and not self.finished
+
+    def run(self):
+        if not self.finished:
+            self.finished = True
+            self.function(*self.args, **self.kwargs)
+
+
+class VirtualClock:
+    """Clock that only moves forward when told to.
+
+    Timers fire in order of their deadline once the clock is
+    advanced past it. `sleep` moves the clock forward without
+    firing any timer, so that a handler is never interrupted
+    by a timer callback; overdue timers fire on the next call
+    to `advance`.
+
+    Args:
+        start (float): Initial reading of the clock in seconds.
+    """
+    def __init__(self, start=0.0):
+        self.now = start
+        self._queue = []
+        self._counter = itertools.count()
+
+    def timer(self, interval, function, args=None, kwargs=None):
+        return VirtualTimer(self, interval, function, args, kwargs)
+
+    def sleep(self, secs):
+        self.now += secs
+
+    def time(self):
+        return self.now
+
+    def advance(self, secs):
+        """Move the clock `secs` seconds forward and fire due timers."""
+        target = self.now + secs
+        while self._queue and self._queue[0][0] <= target:
+            deadline, _, timer = heapq.heappop(self._queue)
+            if timer.finished:
+                continue
+            self.now = max(self.now, deadline)
+            timer.run()
+            # callbacks may sleep past the original target
+            target = max(target, self.now)
+        self.now = target
+
+    def pending(self):
+        """Number of timers that are started but have not fired yet."""
+        return sum(1 for _, _, timer in self._queue if not timer.finished)
+
+    def _schedule(self, timer):
+        heapq.heappush(self._queue, (timer.deadline, next(self._counter), timer))
@@ -34,6 +34,16 @@ TIME_ANSWER = 2.0
 TIME_GAME = 5.5
 # The participants will be moved back to the waiting room after the game finished.
 TIME_CLOSE = 0.25
+# Once the bot is asked to shut down, games still running after this time are
+# ended and both players receive an AMT Token. None waits for them to end.
+TIME_DRAIN = 10.0
+
+# Number of task rooms served at the same time, None for no limit.
+# Rooms created beyond this capacity wait until another game has ended.
+MAX_ROOMS = None
+# The bot reports that it does not accept new rooms while its event handlers
+# take longer than this many seconds on average, None to disable.
+MAX_LATENCY = None
 
 
 TASK_TITLE = "Identify the difference."
@@ -7,13 +7,15 @@ import logging
 import os
 import random
 import string
-from threading import Timer
-from time import sleep
+from collections import deque
+from datetime import datetime, timezone
 
 import requests
 import socketio
 
+from lib.clock import Clock
 from lib.image_data import ImageData
+from lib.load import LatencyMonitor
 from lib.config import *
 
 
@@ -52,8 +54,13 @@ class DiToBot:
     task_id = None
     """The ID of the room where users for this task are waiting."""
     waiting_room = None
+    """Number of task rooms served at the same time (None for no limit)."""
+    max_rooms = MAX_ROOMS
+    """Average handler duration in seconds above which the bot
+    reports that it does not accept new rooms (None to disable)."""
+    max_latency = MAX_LATENCY
 
-    def __init__(self, token, user, host, port):
+    def __init__(self, token, user, host, port, sio=None, session=None, clock=None):
         """This bot allows two players that are shown two different
         or equal pictures to discuss about what they see and decide
         whether there are differences.
@@ -87,9 +94,40 @@ class DiToBot:
             them once there are two. If this single user waits for
             a prolonged time their receive an AMT token for waiting.
         :type waiting_timer: Timer
+        :param deferred_rooms: New task rooms that arrived while the
+            bot was at capacity. They are served in order of arrival
+            once other games have ended.
+        :type deferred_rooms: collections.deque
+        :param latency: Moving average of the handler durations.
+        :type latency: lib.load.LatencyMonitor
+        :param draining: Set once the bot was asked to shut down.
+            It then serves no new task rooms and disconnects as
+            soon as the running games have ended.
+        :type draining: bool
+        :param drain_timer: Ends the games still running a while
+            after the bot was asked to shut down.
+        :type drain_timer: Timer
+        :param disconnected_at: Time at which the connection to
+            the server was lost, None while connected.
+        :type disconnected_at: datetime.datetime
+        :param last_log_id: Each room is mapped to the newest log
+            entry that was replayed after a reconnect.
+        :type last_log_id: dict
+        :param sio: Socket connection to the chat server. Defaults
+            to the client shared by all instances of this class.
+        :type sio: socketio.Client, optional
+        :param session: Used for all calls to the REST API.
+        :type session: requests.Session, optional
+        :param clock: Creates the timers and delays of the game.
+            Defaults to the wall clock.
+        :type clock: lib.clock.Clock, optional
         """
         self.token = token
         self.user = user
+        if sio is not None:
+            self.sio = sio
+        self.session = session if session is not None else requests.Session()
+        self.clock = clock if clock is not None else Clock()
 
         self.uri = host
         if port is not None:
@@ -104,22 +142,195 @@ class DiToBot:
         self.waiting_timer = None
         self.received_waiting_token = set()
 
+        self.deferred_rooms = deque()
+        self.latency = LatencyMonitor(self.clock)
+
+        self.draining = False
+        self.drain_timer = None
+
+        self.disconnected_at = None
+        self.last_log_id = dict()
+
         LOG.info(f"Running dito bot on {self.uri} with token {self.token}")
         # register all event handlers
         self.register_callbacks()
 
     def run(self):
         # establish a connection to the server
-        self.sio.connect(
-            self.uri,
-            headers={"Authorization": f"Bearer {self.token}", "user": self.user},
-            namespaces="/",
-        )
+        delay = 1
+        while True:
+            try:
+                self.sio.connect(
+                    self.uri,
+                    headers={"Authorization": f"Bearer {self.token}", "user": self.user},
+                    namespaces="/",
+                )
+                break
+            except socketio.exceptions.ConnectionError as error:
+                LOG.error(f"Could not connect to server: {error}")
+                self.clock.sleep(random.uniform(delay / 2, delay))
+                delay = min(2 * delay, 60)
         # wait until the connection with the server ends
         self.sio.wait()
 
+    def resume(self):
+        """Catch up on what happened while the connection was lost.
+
+        The bot rejoins any of its rooms it is no longer part of
+        and replays the events it missed from the room logs.
+        """
+        since, self.disconnected_at = self.disconnected_at, None
+        rooms = list(self.players_per_room)
+        if self.waiting_room is not None:
+            rooms.append(self.waiting_room)
+        LOG.info(f"Reconnected, resuming {len(rooms)} rooms.")
+
+        response = self.session.get(
+            f"{self.uri}/users/{self.user}",
+            headers={"Authorization": f"Bearer {self.token}"}
+        )
+        if not response.ok:
+            LOG.error(f"Could not get bot user: {response.status_code}")
+            response.raise_for_status()
+        joined = set(response.json().get("rooms", []))
+
+        for room_id in rooms:
+            if room_id not in joined:
+                response = self.session.post(
+                    f"{self.uri}/users/{self.user}/rooms/{room_id}",
+                    headers={"Authorization": f"Bearer {self.token}"}
+                )
+                if not response.ok:
+                    LOG.error(f"Could not rejoin room {room_id}: {response.status_code}")
+                    continue
+            self._replay_logs(room_id, since)
+
+    def _replay_logs(self, room_id, since):
+        """Pass events logged while disconnected to their handlers.
+
+        :param room_id: Identifier of a room the bot is in.
+        :type room_id: int
+        :param since: Entries created before this time were already
+            received while connected.
+        :type since: datetime.datetime
+        """
+        response = self.session.get(
+            f"{self.uri}/rooms/{room_id}/users/{self.user}/logs",
+            headers={"Authorization": f"Bearer {self.token}"}
+        )
+        if not response.ok:
+            LOG.error(f"Could not get logs of room {room_id}: {response.status_code}")
+            return
+
+        names = {usr["id"]: usr["name"] for usr in self.players_per_room.get(room_id, [])}
+        handlers = self.sio.handlers["/"]
+        for entry in sorted(response.json(), key=lambda entry: entry["id"]):
+            created = datetime.fromisoformat(entry["date_created"].replace("Z", "+00:00"))
+            if created.tzinfo is None:
+                created = created.replace(tzinfo=timezone.utc)
+            # entries may already have been replayed after an earlier reconnect
+            if created < since or entry["id"] <= self.last_log_id.get(room_id, 0):
+                continue
+            self.last_log_id[room_id] = entry["id"]
+            if str(entry["user_id"]) == str(self.user):
+                continue
+
+            user = {"id": entry["user_id"], "name": names.get(entry["user_id"], "")}
+            data = entry.get("data") or {}
+            event = {"room": room_id, "user": user}
+            if entry["event"] == "text_message":
+                handlers["text_message"]({**event, "message": data.get("message", "")})
+            elif entry["event"] == "command":
+                handlers["command"]({**event, "command": data.get("command", "")})
+            elif entry["event"] in {"join", "leave"}:
+                handlers["status"]({**event, "type": entry["event"]})
+            LOG.debug(f"Replayed missed {entry['event']} event in room {room_id}.")
+        # the game may have ended with one of the replayed events
+        if room_id not in self.players_per_room and room_id != self.waiting_room:
+            self.last_log_id.pop(room_id, None)
+
+    def has_capacity(self):
+        """Whether another task room can be served right now."""
+        return self.max_rooms is None or len(self.players_per_room) < self.max_rooms
+
+    def load(self):
+        """Report how busy the bot is, e.g. to the concierge bot."""
+        return {
+            "task": self.task_id,
+            "rooms": len(self.players_per_room),
+            "deferred": len(self.deferred_rooms),
+            "capacity": self.max_rooms,
+            "latency": self.latency.value,
+            "draining": self.draining,
+            "accepting": (
+                not self.draining
+                and self.has_capacity()
+                and not self.deferred_rooms
+                and (self.max_latency is None
+                     or self.latency.value <= self.max_latency)
+            )
+        }
+
+    def drain(self, timeout=TIME_DRAIN):
+        """Stop taking new task rooms and shut down once games have ended.
+
+        This allows a replacement bot to take over new rooms
+        without interrupting any running game.
+
+        :param timeout: Minutes after which games that are still
+            running are ended. None waits until they end by themselves.
+        :type timeout: float, optional
+        """
+        if self.draining:
+            return
+        LOG.info(f"Draining: waiting for {len(self.players_per_room)} "
+                 f"running and {len(self.deferred_rooms)} deferred games.")
+        self.draining = True
+        if timeout is not None:
+            self.drain_timer = self.clock.timer(timeout*60, self._end_games)
+            self.drain_timer.start()
+        self._check_drained()
+
+    def _end_games(self):
+        """End all games when a draining bot runs out of time."""
+        while self.players_per_room:
+            room_id = next(iter(self.players_per_room))
+            self.sio.emit(
+                "text",
+                {"message": "Sorry, this game has to end now. "
+                            "Thank you for participating!",
+                 "room": room_id}
+            )
+            self.confirmation_code(room_id, "drain")
+            self.close_game(room_id)
+
+    def _check_drained(self):
+        """Disconnect a draining bot once it has no more games to serve."""
+        if not self.draining or self.players_per_room or self.deferred_rooms:
+            return
+        LOG.info("All games have ended, disconnecting.")
+        # pending timers would keep the process alive
+        for timer in (self.drain_timer, self.waiting_timer):
+            if timer is not None:
+                timer.cancel()
+        # pending messages are sent before the connection closes
+        self.sio.disconnect()
+
     def register_callbacks(self):
         @self.sio.event
+        def connect():
+            """Triggered whenever a connection was established."""
+            if self.disconnected_at is not None:
+                self.sio.start_background_task(self.resume)
+
+        @self.sio.event
+        def disconnect():
+            """Triggered whenever the connection was lost or closed."""
+            LOG.warning("Disconnected from server.")
+            self.disconnected_at = datetime.now(timezone.utc)
+
+        @self.sio.event
+        @self.latency.timed
         def new_task_room(data):
             """Triggered after a new task room is created.
 
@@ -127,51 +338,23 @@ class DiToBot:
             bot emitted a room_created event once enough
             users for a task have entered the waiting room.
             """
-            room_id = data["room"]
             task_id = data["task"]
 
             LOG.debug(f"A new task room was created with id: {data['task']}")
             LOG.debug(f"This bot is looking for task id: {self.task_id}")
 
             if task_id is not None and task_id == self.task_id:
-                for usr in data['users']:
-                    self.received_waiting_token.discard(usr['id'])
-
-                # create image items for this room
-                LOG.debug("Create data for the new task room...")
-
-                self.images_per_room.get_image_pairs(room_id)
-                self.players_per_room[room_id] = []
-                for usr in data["users"]:
-                    self.players_per_room[room_id].append(
-                        {**usr, "msg_n": 0, "status": "joined"}
-                    )
-                self.last_message_from[room_id] = None
-
-                # register ready timer for this room
-                self.timers_per_room[room_id] = RoomTimers()
-                self.timers_per_room[room_id].ready_timer = Timer(
-                    TIME_READY*60,
-                    self.sio.emit, args=[
-                        "text",
-                        {"message": "Are you ready? "
-                                    "Please type **/ready** to begin the game.",
-                         "room": room_id,
-                         "html": True}
-                    ]
-                )
-                self.timers_per_room[room_id].ready_timer.start()
-
-                response = requests.post(
-                    f"{self.uri}/users/{self.user}/rooms/{room_id}",
-                    headers={"Authorization": f"Bearer {self.token}"}
-                )
-                if not response.ok:
-                    LOG.error(f"Could not let dito bot join room: {response.status_code}")
-                    response.raise_for_status()
-                LOG.debug("Sending dito bot to new room was successful.")
+                if self.draining:
+                    LOG.warning(f"Draining, room {data['room']} is left to other bots.")
+                elif self.has_capacity():
+                    self._open_room(data)
+                else:
+                    LOG.warning(f"Serving {len(self.players_per_room)} rooms, "
+                                f"room {data['room']} has to wait.")
+                    self.deferred_rooms.append(data)
 
         @self.sio.event
+        @self.latency.timed
         def joined_room(data):
             """Triggered once after the bot joins a room."""
             room_id = data["room"]
@@ -185,9 +368,9 @@ class DiToBot:
                          "room": room_id,
                          "html": True}
                     )
-                    sleep(.5)
+                    self.latency.sleep(.5)
                 # ask players to send \ready
-                response = requests.patch(
+                response = self.session.patch(
                     f"{self.uri}/rooms/{room_id}/text/instr_title",
                     json={"text": line},
                     headers={"Authorization": f"Bearer {self.token}"}
@@ -197,10 +380,11 @@ class DiToBot:
                     response.raise_for_status()
 
         @self.sio.event
+        @self.latency.timed
         def status(data):
             """Triggered if a user enters or leaves a room."""
             # check whether the user is eligible to join this task
-            task = requests.get(
+            task = self.session.get(
                 f"{self.uri}/users/{data['user']['id']}/task",
                 headers={"Authorization": f"Bearer {self.token}"}
             )
@@ -218,7 +402,7 @@ class DiToBot:
                     self.waiting_timer.cancel()
                 if data["type"] == "join":
                     LOG.debug("Waiting Timer restarted.")
-                    self.waiting_timer = Timer(
+                    self.waiting_timer = self.clock.timer(
                         TIME_WAITING*60,
                         self._no_partner,
                         args=[
@@ -252,6 +436,7 @@ class DiToBot:
                     )
 
         @self.sio.event
+        @self.latency.timed
         def text_message(data):
             """Triggered once a text message is sent (no leading /).
 
@@ -278,7 +463,7 @@ class DiToBot:
                 LOG.debug(f"{data['user']['name']} awaits an answer.")
                 if self.last_message_from[room_id] is not None:
                     self.timers_per_room[room_id].last_answer_timer.cancel()
-                self.timers_per_room[room_id].last_answer_timer = Timer(
+                self.timers_per_room[room_id].last_answer_timer = self.clock.timer(
                     TIME_ANSWER*60,
                     self._noreply,
                     args=[room_id, user_id]
@@ -288,6 +473,7 @@ class DiToBot:
                 self.last_message_from[room_id] = user_id
 
         @self.sio.event
+        @self.latency.timed
         def command(data):
             """Parse user commands."""
             LOG.debug(f"Received a command from {data['user']['name']}: {data['command']}")
@@ -322,6 +508,46 @@ class DiToBot:
                          "receiver_id": user_id}
                     )
 
+    def _open_room(self, data):
+        """Set up a new task room and let the bot join it."""
+        room_id = data["room"]
+        for usr in data['users']:
+            self.received_waiting_token.discard(usr['id'])
+
+        # create image items for this room
+        LOG.debug("Create data for the new task room...")
+
+        self.images_per_room.get_image_pairs(room_id)
+        self.players_per_room[room_id] = []
+        for usr in data["users"]:
+            self.players_per_room[room_id].append(
+                {**usr, "msg_n": 0, "status": "joined"}
+            )
+        self.last_message_from[room_id] = None
+
+        # register ready timer for this room
+        self.timers_per_room[room_id] = RoomTimers()
+        self.timers_per_room[room_id].ready_timer = self.clock.timer(
+            TIME_READY*60,
+            self.sio.emit, args=[
+                "text",
+                {"message": "Are you ready? "
+                            "Please type **/ready** to begin the game.",
+                 "room": room_id,
+                 "html": True}
+            ]
+        )
+        self.timers_per_room[room_id].ready_timer.start()
+
+        response = self.session.post(
+            f"{self.uri}/users/{self.user}/rooms/{room_id}",
+            headers={"Authorization": f"Bearer {self.token}"}
+        )
+        if not response.ok:
+            LOG.error(f"Could not let dito bot join room: {response.status_code}")
+            response.raise_for_status()
+        LOG.debug("Sending dito bot to new room was successful.")
+
     def _command_ready(self, room_id, user_id):
         """Must be sent to begin a conversation."""
         # identify the user that has not sent this event
@@ -331,7 +557,7 @@ class DiToBot:
 
         # only one user has sent /ready repetitively
         if curr_usr["status"] in {"ready", "done"}:
-            sleep(.5)
+            self.latency.sleep(.5)
             self.sio.emit(
                 "text",
                 {"message": "You have already typed /ready.",
@@ -344,7 +570,7 @@ class DiToBot:
         self.timers_per_room[room_id].ready_timer.cancel()
         # a first ready command was sent
         if other_usr["status"] == "joined":
-            sleep(.5)
+            self.latency.sleep(.5)
             # give the user feedback that his command arrived
             self.sio.emit(
                 "text",
@@ -353,7 +579,7 @@ class DiToBot:
                  "room": room_id}
             )
             # give the other user time before reminding him
-            self.timers_per_room[room_id].ready_timer = Timer(
+            self.timers_per_room[room_id].ready_timer = self.clock.timer(
                 (TIME_READY/2)*60,
                 self.sio.emit,
                 args=[
@@ -374,7 +600,7 @@ class DiToBot:
             )
             self.show_item(room_id)
             # kindly ask the users to come to an end after a certain time
-            self.timers_per_room[room_id].game_timer = Timer(
+            self.timers_per_room[room_id].game_timer = self.clock.timer(
                 TIME_GAME*60,
                 self.sio.emit,
                 args=[
@@ -412,7 +638,7 @@ class DiToBot:
             )
         # this user has already recently typed /difference
         elif curr_usr["status"] == "done":
-            sleep(.5)
+            self.latency.sleep(.5)
             self.sio.emit(
                 "text",
                 {"message": "You have already typed **/difference**.",
@@ -426,7 +652,7 @@ class DiToBot:
             # only one user thinks they are done
             if other_usr["status"] != "done":
                 # await for the other user to agree
-                self.timers_per_room[room_id].done_timer = Timer(
+                self.timers_per_room[room_id].done_timer = self.clock.timer(
                     TIME_DONE*60,
                     self._not_done,
                     args=[room_id, user_id]
@@ -460,9 +686,9 @@ class DiToBot:
                         {"message": "The game is over! Thank you for participating!",
                          "room": room_id}
                     )
-                    sleep(1)
+                    self.latency.sleep(1)
                     self.confirmation_code(room_id, "success")
-                    sleep(1)
+                    self.latency.sleep(1)
                     self.close_game(room_id)
                 else:
                     self.sio.emit(
@@ -476,7 +702,7 @@ class DiToBot:
                         usr["status"] = "ready"
                         usr["msg_n"] = 0
                     self.timers_per_room[room_id].game_timer.cancel()
-                    self.timers_per_room[room_id].game_timer = Timer(
+                    self.timers_per_room[room_id].game_timer = self.clock.timer(
                         TIME_GAME*60,
                         self.sio.emit,
                         args=[
@@ -513,7 +739,7 @@ class DiToBot:
             images = self.images_per_room[room_id][0]
             # show a different image to each user
             for usr, img in zip(users, images):
-                response = requests.patch(
+                response = self.session.patch(
                     f"{self.uri}/rooms/{room_id}/attribute/id/current-image",
                     json={"attribute": "src", "value": img, "receiver_id": usr["id"]},
                     headers={"Authorization": f"Bearer {self.token}"}
@@ -523,7 +749,7 @@ class DiToBot:
                     response.raise_for_status()
 
             # the task for both users is the same - no special receiver
-            response = requests.patch(
+            response = self.session.patch(
                 f"{self.uri}/rooms/{room_id}/text/instr_title",
                 json={"text": TASK_TITLE},
                 headers={"Authorization": f"Bearer {self.token}"}
@@ -532,7 +758,7 @@ class DiToBot:
                 LOG.error(f"Could not set task instruction title: {response.status_code}")
                 response.raise_for_status()
 
-            response = requests.patch(
+            response = self.session.patch(
                 f"{self.uri}/rooms/{room_id}/text/instr",
                 json={"text": TASK_DESCR},
                 headers={"Authorization": f"Bearer {self.token}"}
@@ -551,7 +777,7 @@ class DiToBot:
             )
             # create token and send it to user
             self.confirmation_code(room_id, "no_partner", receiver_id=user_id)
-            sleep(5)
+            self.latency.sleep(5)
             self.sio.emit(
                 "text",
                 {"message": "You may also wait some more :)",
@@ -559,7 +785,7 @@ class DiToBot:
              )
             # no need to cancel
             # the running out of this timer triggered this event
-            self.waiting_timer = Timer(
+            self.waiting_timer = self.clock.timer(
                 TIME_WAITING*60,
                 self._no_partner,
                 args=[room_id, user_id]
@@ -572,7 +798,7 @@ class DiToBot:
                 {"message": "You won't be remunerated for further waiting time.",
                  "room": room_id, "receiver_id": user_id}
             )
-            sleep(2)
+            self.latency.sleep(2)
             self.sio.emit(
                 "text",
                 {"message": "Please check back at another time of the day.",
@@ -612,7 +838,7 @@ class DiToBot:
             string.ascii_uppercase + string.digits, k=6
         ))
         # post AMT token to logs
-        response = requests.post(
+        response = self.session.post(
             f"{self.uri}/logs",
             json={"event": "confirmation_log",
                   "room_id": room_id,
@@ -663,11 +889,17 @@ class DiToBot:
         self.timers_per_room.pop(room_id)
         self.players_per_room.pop(room_id)
         self.last_message_from.pop(room_id)
+        self.last_log_id.pop(room_id, None)
+
+        # serve rooms that had to wait for a free slot
+        while self.deferred_rooms and self.has_capacity():
+            self._open_room(self.deferred_rooms.popleft())
+        self._check_drained()
 
 
     def room_to_read_only(self, room_id):
         """Set room to read only."""
-        response = requests.patch(
+        response = self.session.patch(
             f"{self.uri}/rooms/{room_id}/attribute/id/text",
             json={"attribute": "readonly", "value": "True"},
             headers={"Authorization": f"Bearer {self.token}"}
@@ -675,7 +907,7 @@ class DiToBot:
         if not response.ok:
             LOG.error(f"Could not set room to read_only: {response.status_code}")
             response.raise_for_status()
-        response = requests.patch(
+        response = self.session.patch(
             f"{self.uri}/rooms/{room_id}/attribute/id/text",
             json={"attribute": "placeholder", "value": "This room is read-only"},
             headers={"Authorization": f"Bearer {self.token}"}
@@ -692,7 +924,7 @@ class DiToBot:
 
             new_name = random.choice(names)
 
-            response = requests.get(
+            response = self.session.get(
                 f"{self.uri}/users/{user_id}",
                 headers={"Authorization": f"Bearer {self.token}"}
             )
@@ -702,7 +934,7 @@ class DiToBot:
                 )
                 response.raise_for_status()
 
-            response = requests.patch(
+            response = self.session.patch(
                 f"{self.uri}/users/{user_id}",
                 json={"name": new_name},
                 headers={"If-Match": response.headers["ETag"],
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""Measure and publish how busy the bot is."""
+
+import functools
+import json
+import logging
+import math
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+LOG = logging.getLogger(__name__)
+
+# Seconds over which the latency decays by a factor of e while the bot is idle.
+LATENCY_DECAY = 60.0
+
+
+class LatencyMonitor:
+    """Exponentially weighted moving average of handler durations.
+
+    Only the work of a handler counts, the time it spends in `sleep`
+    to pace its messages does not. The average decays towards zero
+    while no handler runs, so that an idle bot reports a low latency.
+
+    Args:
+        clock (lib.clock.Clock): Used to time the handlers.
+        alpha (float): Weight of the most recent observation.
+        decay (float): Seconds over which the average decays
+            by a factor of e while no handler runs.
+    """
+    def __init__(self, clock, alpha=0.1, decay=LATENCY_DECAY):
+        self._clock = clock
+        self._alpha = alpha
+        self._decay = decay
+        self._value = 0.0
+        self._observed_at = clock.time()
+        self._lock = threading.Lock()
+        # seconds slept by the handlers of each thread
+        self._local = threading.local()
+
+    @property
+    def value(self):
+        with self._lock:
+            return self._decayed(self._clock.time())
+
+    def _decayed(self, now):
+        return self._value * math.exp(-max(0.0, now - self._observed_at) / self._decay)
+
+    def observe(self, duration):
+        with self._lock:
+            now = self._clock.time()
+            value = self._decayed(now)
+            self._value = value + self._alpha * (duration - value)
+            self._observed_at = now
+
+    def sleep(self, secs):
+        """Sleep on the clock without counting it as handler duration."""
+        self._local.slept = getattr(self._local, "slept", 0.0) + secs
+        self._clock.sleep(secs)
+
+    def timed(self, handler):
+        """Decorate an event handler to observe its duration."""
+        @functools.wraps(handler)
+        def wrapper(*args, **kwargs):
+            start = self._clock.time()
+            slept = getattr(self._local, "slept", 0.0)
+            try:
+                return handler(*args, **kwargs)
+            finally:
+                paused = getattr(self._local, "slept", 0.0) - slept
+                self.observe(max(0.0, self._clock.time() - start - paused))
+        return wrapper
+
+
+class _StatusHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") not in {"", "/status"}:
+            self.send_error(404)
+            return
+        body = json.dumps(self.server.load()).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        LOG.debug(format, *args)
+
+
+class StatusServer(ThreadingHTTPServer):
+    """Serve the load of the bot as JSON under `/status`.
+
+    Args:
+        port (int): Port to listen on.
+        load (callable): Returns the current load as a dict.
+        host (str): Interface to bind to, all by default.
+    """
+    daemon_threads = True
+
+    def __init__(self, port, load, host=""):
+        super().__init__((host, port), _StatusHandler)
+        self.load = load
+
+    def start(self):
+        """Serve requests in a background thread."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        LOG.info(f"Serving bot status on port {self.server_address[1]}")
@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+"""Play scripted DiTo games against a fake chat server.
+
+The bot is connected to an in-memory socket and REST layer and
+runs on a virtual clock, so that timeouts of several minutes pass
+instantly. Use it to regression-test the timing logic of the game
+or to benchmark the bot:
+
+```python -m lib.simulation --games 10000```
+"""
+
+import itertools
+import logging
+import time
+
+from lib.clock import VirtualClock
+from lib.config import DATA_PATH, N, TIME_ANSWER, TIME_DONE, TIME_WAITING
+from lib.dito_bot import DiToBot
+from lib.image_data import ImageData
+
+
+LOG = logging.getLogger(__name__)
+
+TASK_ID = 1
+WAITING_ROOM = 1
+
+# Each step of a script is a tuple of an action and its argument.
+# Players are referenced by their index (0 or 1) in the game,
+# waiting times are given in minutes like the settings in lib.config.
+#   ("room", None)        both players are moved to a new task room
+#   ("ready", p)          player p types /ready
+#   ("text", p)           player p sends a chat message
+#   ("difference", p)     player p types /difference with a description
+#   ("leave", p)          player p leaves the task room
+#   ("join", p)           player p (re)joins the task room
+#   ("waiting", p)        player p enters the waiting room
+#   ("leave_waiting", p)  player p leaves the waiting room
+#   ("wait", minutes)     the clock moves forward
+DISCUSSION = [("text", 0), ("text", 1)] * 3
+
+SCRIPTS = {
+    "success": [
+        ("room", None), ("ready", 0), ("ready", 1),
+        *DISCUSSION,
+        ("difference", 0), ("difference", 1)
+    ],
+    "rejoin": [
+        ("room", None), ("ready", 0), ("ready", 1),
+        ("text", 0), ("leave", 1), ("wait", TIME_ANSWER / 2), ("join", 1),
+        *DISCUSSION,
+        ("difference", 1), ("difference", 0)
+    ],
+    "not_done": [
+        ("room", None), ("ready", 0), ("ready", 1),
+        *DISCUSSION,
+        ("difference", 0), ("wait", TIME_DONE), ("text", 1), ("text", 0),
+        ("difference", 0), ("difference", 1)
+    ],
+    "no_reply": [
+        ("room", None), ("ready", 0), ("ready", 1),
+        ("text", 0), ("text", 1), ("text", 0), ("wait", TIME_ANSWER)
+    ],
+    "no_partner": [
+        ("waiting", 0), ("wait", TIME_WAITING), ("leave_waiting", 0)
+    ],
+}
+
+# confirmation codes that are handed out by the end of each script
+OUTCOMES = {
+    "success": ["success"],
+    "rejoin": ["success"],
+    "not_done": ["success"],
+    "no_reply": ["no_reply"],
+    "no_partner": ["no_partner"],
+}
+
+
+class FakeResponse:
+    """Successful answer of the REST API."""
+    ok = True
+    status_code = 200
+
+    def __init__(self, json=None):
+        self._json = json if json is not None else {}
+        self.headers = {"ETag": "fake-etag"}
+
+    def json(self):
+        return self._json
+
+    def raise_for_status(self):
+        pass
+
+
+class FakeSession:
+    """Stands in for `requests.Session` and answers every call.
+
+    Args:
+        task_id (int): Task assigned to every user.
+    """
+    def __init__(self, task_id):
+        self.task = {"id": task_id}
+        self.calls = 0
+        self.logs = []
+        # room logs as returned by the server, mapped from the room id
+        self.room_logs = dict()
+
+    def get(self, url, **kwargs):
+        self.calls += 1
+        if url.endswith("/task"):
+            return FakeResponse(self.task)
+        if url.endswith("/logs"):
+            room_id = int(url.split("/rooms/")[1].split("/")[0])
+            return FakeResponse(self.room_logs.get(room_id, []))
+        return FakeResponse()
+
+    def post(self, url, json=None, **kwargs):
+        self.calls += 1
+        if url.endswith("/logs"):
+            self.logs.append(json)
+        return FakeResponse()
+
+    def patch(self, url, **kwargs):
+        self.calls += 1
+        return FakeResponse()
+
+    def delete(self, url, **kwargs):
+        self.calls += 1
+        return FakeResponse()
+
+
+class FakeSocket:
+    """Stands in for `socketio.Client`.
+
+    Handlers are registered the same way as for the real client
+    and are invoked through `trigger`. Emitted events are collected
+    in `emitted`.
+    """
+    def __init__(self):
+        self.handlers = {"/": {}}
+        self.emitted = []
+        self.connected = False
+
+    def event(self, handler):
+        self.handlers["/"][handler.__name__] = handler
+        return handler
+
+    def on(self, event, handler=None, namespace=None):
+        def set_handler(handler):
+            self.handlers[namespace or "/"][event] = handler
+            return handler
+        if handler is None:
+            return set_handler
+        set_handler(handler)
+
+    def emit(self, event, data=None, namespace=None, callback=None):
+        self.emitted.append((event, data))
+
+    def trigger(self, event, *args):
+        handler = self.handlers["/"].get(event)
+        if handler is not None:
+            handler(*args)
+
+    def start_background_task(self, target, *args, **kwargs):
+        target(*args, **kwargs)
+
+    def connect(self, url, headers=None, namespaces=None, **kwargs):
+        self.connected = True
+
+    def wait(self):
+        pass
+
+    def disconnect(self):
+        self.connected = False
+
+
+class Simulation:
+    """Drive one bot instance through scripted games."""
+    def __init__(self):
+        self.clock = VirtualClock()
+        self.sio = FakeSocket()
+        self.session = FakeSession(TASK_ID)
+        self.bot = DiToBot(
+            "00000000-0000-0000-0000-000000000000", 0, "http://localhost", None,
+            sio=self.sio, session=self.session, clock=self.clock
+        )
+        self.bot.task_id = TASK_ID
+        self.bot.waiting_room = WAITING_ROOM
+        # random sampling re-reads the whole data file for every room,
+        # it is covered by the tests of ImageData
+        self.bot.images_per_room = ImageData(DATA_PATH, N)
+
+        self._room_ids = itertools.count(WAITING_ROOM + 1)
+        self._user_ids = itertools.count(1)
+
+    def play(self, script):
+        """Run a single game and return the confirmation codes handed out.
+
+        Args:
+            script (list): Steps as described for SCRIPTS.
+
+        Returns:
+            list: The status of every AMT token that was logged.
+        """
+        self.session.logs.clear()
+        self.sio.emitted.clear()
+        room_id = next(self._room_ids)
+        players = [
+            {"id": next(self._user_ids), "name": f"Player {i}"} for i in range(2)
+        ]
+        for action, arg in script:
+            self.step(action, arg, room_id, players)
+        return [log["data"]["status_txt"] for log in self.session.logs]
+
+    def step(self, action, arg, room_id, players):
+        """Perform a single step of a script."""
+        if action == "wait":
+            self.clock.advance(arg * 60)
+            return
+        if action == "room":
+            self.sio.trigger(
+                "new_task_room",
+                {"room": room_id, "task": TASK_ID, "users": players}
+            )
+            self.sio.trigger("joined_room", {"room": room_id, "user": self.bot.user})
+            return
+
+        player = players[arg]
+        if action == "ready":
+            self._command(room_id, player, "ready")
+        elif action == "difference":
+            self._command(room_id, player, "difference the color")
+        elif action == "text":
+            self.sio.trigger(
+                "text_message",
+                {"room": room_id, "user": player, "message": "what do you see?"}
+            )
+        elif action in {"join", "leave"}:
+            self.sio.trigger(
+                "status", {"room": room_id, "user": player, "type": action}
+            )
+        elif action == "waiting":
+            self.sio.trigger(
+                "status", {"room": WAITING_ROOM, "user": player, "type": "join"}
+            )
+        elif action == "leave_waiting":
+            self.sio.trigger(
+                "status", {"room": WAITING_ROOM, "user": player, "type": "leave"}
+            )
+        else:
+            raise ValueError(f"Unknown simulation step: {action}")
+
+    def _command(self, room_id, player, command):
+        self.sio.trigger(
+            "command", {"room": room_id, "user": player, "command": command}
+        )
+
+
+def benchmark(games, scripts=None):
+    """Play `games` games cycling through the given scripts.
+
+    Returns:
+        float: Number of games played per second.
+    """
+    scripts = scripts or list(SCRIPTS)
+    simulation = Simulation()
+    start = time.perf_counter()
+    for name in itertools.islice(itertools.cycle(scripts), games):
+        outcome = simulation.play(SCRIPTS[name])
+        if outcome != OUTCOMES[name]:
+            raise AssertionError(f"Script {name} ended with {outcome}")
+    return games / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the DiTo bot.")
+    parser.add_argument(
+        "-n", "--games", type=int, default=10000, help="number of games to play"
+    )
+    parser.add_argument(
+        "--scripts", nargs="+", choices=list(SCRIPTS), help="scripts to play"
+    )
+    args = parser.parse_args()
+
+    rate = benchmark(args.games, args.scripts)
+    print(f"{args.games} games played, {rate:.0f} games per second")
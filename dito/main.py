@@ -5,8 +5,10 @@
 import argparse
 import logging
 import os
+import signal
 
 from lib.dito_bot import DiToBot
+from lib.load import StatusServer
 
 
 if __name__ == "__main__":
@@ -32,6 +34,8 @@ if __name__ == "__main__":
     host = {"default": os.environ.get("SLURK_HOST", "http://localhost")}
     port = {"default": os.environ.get("SLURK_PORT")}
     task_id = {"default": os.environ.get("DITO_TASK_ID")}
+    max_rooms = {"default": os.environ.get("DITO_MAX_ROOMS")}
+    status_port = {"default": os.environ.get("DITO_STATUS_PORT")}
 
     # register commandline arguments
     parser.add_argument(
@@ -46,6 +50,12 @@ if __name__ == "__main__":
     )
     parser.add_argument("-p", "--port", type=int, help="port of chat server", **port)
     parser.add_argument("--task_id", type=int, help="task to join", **task_id)
+    parser.add_argument(
+        "--max_rooms", type=int, help="number of task rooms served at a time", **max_rooms
+    )
+    parser.add_argument(
+        "--status_port", type=int, help="port to publish the bot's load on", **status_port
+    )
 
     args = parser.parse_args()
 
@@ -53,6 +63,18 @@ if __name__ == "__main__":
     dito_bot = DiToBot(args.token, args.user, args.host, args.port)
     dito_bot.task_id = args.task_id
     dito_bot.waiting_room = args.waiting_room
+    if args.max_rooms is not None:
+        dito_bot.max_rooms = args.max_rooms
+
+    # publish the load of the bot, e.g. for the concierge bot
+    if args.status_port is not None:
+        StatusServer(args.status_port, dito_bot.load).start()
+
+    # finish running games before shutting down, e.g. on `docker stop`
+    signal.signal(
+        signal.SIGTERM,
+        lambda signum, frame: dito_bot.sio.start_background_task(dito_bot.drain)
+    )
 
     # connect to chat server
     dito_bot.run()
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+
+# University of Potsdam
+"""Admission control and load reporting test cases."""
+
+import json
+import os
+import sys
+import unittest
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from lib.load import StatusServer
+from lib.simulation import SCRIPTS, Simulation
+
+
+class TestAdmissionControl(unittest.TestCase):
+    def setUp(self):
+        self.sim = Simulation()
+        self.sim.bot.max_rooms = 1
+        self.first = [{"id": 1, "name": "A"}, {"id": 2, "name": "B"}]
+        self.second = [{"id": 3, "name": "C"}, {"id": 4, "name": "D"}]
+
+    def open_rooms(self):
+        self.sim.step("room", None, 100, self.first)
+        self.sim.step("room", None, 101, self.second)
+
+    def test_room_above_capacity_is_deferred(self):
+        self.open_rooms()
+
+        self.assertEqual(list(self.sim.bot.players_per_room), [100])
+        self.assertEqual(len(self.sim.bot.deferred_rooms), 1)
+        self.assertFalse(self.sim.bot.load()["accepting"])
+
+    def test_deferred_room_is_served_after_game_ends(self):
+        self.open_rooms()
+        for action, arg in SCRIPTS["success"][1:]:
+            self.sim.step(action, arg, 100, self.first)
+
+        self.assertEqual(list(self.sim.bot.players_per_room), [101])
+        self.assertEqual(len(self.sim.bot.deferred_rooms), 0)
+
+    def test_load_without_limit(self):
+        self.sim.bot.max_rooms = None
+        self.open_rooms()
+        load = self.sim.bot.load()
+
+        self.assertEqual(load["rooms"], 2)
+        self.assertTrue(load["accepting"])
+
+    def slow_server(self, secs):
+        """Let every request of the bot take `secs` seconds."""
+        for name in ["get", "post", "patch", "delete"]:
+            request = getattr(self.sim.session, name)
+
+            def slow(*args, _request=request, **kwargs):
+                self.sim.clock.sleep(secs)
+                return _request(*args, **kwargs)
+            setattr(self.sim.session, name, slow)
+
+    def test_latency_limit(self):
+        self.sim.bot.max_rooms = None
+        self.sim.bot.max_latency = 0.1
+        self.slow_server(0.5)
+        self.open_rooms()
+
+        self.assertGreater(self.sim.bot.latency.value, 0.1)
+        self.assertFalse(self.sim.bot.load()["accepting"])
+
+    def test_latency_recovers_when_idle(self):
+        self.sim.bot.max_rooms = None
+        self.sim.bot.max_latency = 0.1
+        self.slow_server(0.5)
+        self.sim.play(SCRIPTS["success"])
+        self.sim.clock.advance(3600)
+
+        load = self.sim.bot.load()
+        self.assertEqual(load["rooms"], 0)
+        self.assertLess(load["latency"], 0.1)
+        self.assertTrue(load["accepting"])
+
+    def test_pacing_is_not_latency(self):
+        self.sim.bot.max_rooms = None
+        self.sim.bot.max_latency = 0.1
+        # the greeting and the end of a game sleep between messages
+        self.sim.play(SCRIPTS["success"])
+
+        self.assertEqual(self.sim.bot.latency.value, 0)
+        self.assertTrue(self.sim.bot.load()["accepting"])
+
+
+class TestStatusServer(unittest.TestCase):
+    def setUp(self):
+        self.server = StatusServer(0, lambda: {"rooms": 3}, host="127.0.0.1")
+        self.server.start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_serves_load(self):
+        with urllib.request.urlopen(f"{self.url}/status") as response:
+            self.assertEqual(json.load(response), {"rooms": 3})
+
+    def test_unknown_path(self):
+        with self.assertRaises(urllib.error.HTTPError):
+            urllib.request.urlopen(f"{self.url}/other")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+
+# University of Potsdam
+"""Timing of the DiTo game played on a virtual clock."""
+
+import os
+import sys
+import unittest
+from datetime import datetime, timedelta, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from lib.config import TIME_ANSWER, TIME_DONE, TIME_READY
+from lib.simulation import OUTCOMES, SCRIPTS, Simulation
+
+
+class TestSimulation(unittest.TestCase):
+    def setUp(self):
+        self.sim = Simulation()
+        self.room_id = 100
+        self.players = [{"id": 1, "name": "A"}, {"id": 2, "name": "B"}]
+
+    def play_steps(self, steps):
+        for action, arg in steps:
+            self.sim.step(action, arg, self.room_id, self.players)
+
+    def statuses(self):
+        return [log["data"]["status_txt"] for log in self.sim.session.logs]
+
+    def messages_to(self, user_id):
+        return [data["message"] for event, data in self.sim.sio.emitted
+                if event == "text" and data.get("receiver_id") == user_id]
+
+    def test_scripts_end_with_expected_outcome(self):
+        for name, script in SCRIPTS.items():
+            with self.subTest(script=name):
+                self.assertEqual(self.sim.play(script), OUTCOMES[name])
+
+    def test_scripts_leave_no_state_behind(self):
+        for script in SCRIPTS.values():
+            self.sim.play(script)
+
+        self.assertEqual(self.sim.bot.players_per_room, {})
+        self.assertEqual(self.sim.bot.timers_per_room, {})
+        self.assertEqual(self.sim.clock.pending(), 0)
+
+    def test_ready_reminder(self):
+        self.play_steps([("room", None), ("wait", TIME_READY)])
+        reminders = [data for event, data in self.sim.sio.emitted
+                     if event == "text" and "Are you ready?" in data["message"]]
+
+        self.assertEqual(len(reminders), 1)
+
+    def test_noreply_fires_after_answer_time(self):
+        self.play_steps([
+            ("room", None), ("ready", 0), ("ready", 1), ("text", 0), ("text", 1)
+        ])
+        self.sim.clock.advance(TIME_ANSWER*60 - 1)
+        self.assertEqual(self.statuses(), [])
+
+        self.sim.clock.advance(1)
+        self.assertEqual(self.statuses(), ["no_reply"])
+        self.assertNotIn(self.room_id, self.sim.bot.players_per_room)
+
+    def test_answer_resets_noreply(self):
+        self.play_steps([("room", None), ("ready", 0), ("ready", 1), ("text", 0)])
+        self.sim.clock.advance(TIME_ANSWER*60 - 1)
+        self.play_steps([("text", 1)])
+        self.sim.clock.advance(TIME_ANSWER*60 - 1)
+
+        self.assertEqual(self.statuses(), [])
+
+    def test_not_done_resets_status(self):
+        self.play_steps([
+            ("room", None), ("ready", 0), ("ready", 1),
+            *[("text", 0), ("text", 1)] * 3, ("difference", 0)
+        ])
+        player = self.sim.bot.players_per_room[self.room_id][0]
+        self.assertEqual(player["status"], "done")
+
+        self.sim.clock.advance(TIME_DONE*60)
+        self.assertEqual(player["status"], "ready")
+
+    def test_rejoin_informs_partner(self):
+        self.play_steps([("room", None), ("leave", 0), ("join", 0)])
+        messages = self.messages_to(self.players[1]["id"])
+
+        self.assertIn("A has left the game. "
+                      "Please wait a bit, your partner may rejoin.", messages)
+        self.assertIn("A has joined the game. ", messages)
+
+
+class TestDrain(unittest.TestCase):
+    def setUp(self):
+        self.sim = Simulation()
+        self.sim.sio.connected = True
+        self.players = [{"id": 1, "name": "A"}, {"id": 2, "name": "B"}]
+
+    def test_idle_bot_disconnects_at_once(self):
+        self.sim.bot.drain()
+
+        self.assertFalse(self.sim.sio.connected)
+
+    def test_running_game_is_finished_first(self):
+        script = SCRIPTS["success"]
+        for action, arg in script[:3]:
+            self.sim.step(action, arg, 100, self.players)
+        self.sim.bot.drain()
+        self.assertTrue(self.sim.sio.connected)
+        self.assertFalse(self.sim.bot.load()["accepting"])
+
+        for action, arg in script[3:]:
+            self.sim.step(action, arg, 100, self.players)
+        self.assertFalse(self.sim.sio.connected)
+        self.assertEqual(self.sim.clock.pending(), 0)
+
+    def test_no_new_rooms_while_draining(self):
+        self.sim.step("room", None, 100, self.players)
+        self.sim.bot.drain()
+        self.sim.step("room", None, 101, [{"id": 3, "name": "C"}, {"id": 4, "name": "D"}])
+
+        self.assertEqual(list(self.sim.bot.players_per_room), [100])
+
+    def test_games_end_after_drain_time(self):
+        self.sim.step("room", None, 100, self.players)
+        self.sim.bot.drain(timeout=1)
+        self.sim.clock.advance(60)
+
+        statuses = [log["data"]["status_txt"] for log in self.sim.session.logs]
+        self.assertEqual(statuses, ["drain"])
+        self.assertFalse(self.sim.sio.connected)
+
+
+class TestResume(unittest.TestCase):
+    def setUp(self):
+        self.sim = Simulation()
+        self.players = [{"id": 1, "name": "A"}, {"id": 2, "name": "B"}]
+        for action, arg in [("room", None), ("ready", 0), ("ready", 1)]:
+            self.sim.step(action, arg, 100, self.players)
+        self.sim.sio.trigger("disconnect")
+
+    def log_missed_discussion(self):
+        date = (datetime.now(timezone.utc) + timedelta(seconds=1)).isoformat()
+        entries = []
+        for i in range(3):
+            for usr in self.players:
+                entries.append({"event": "text_message", "user_id": usr["id"],
+                                "data": {"message": "hi"}})
+        for usr in self.players:
+            entries.append({"event": "command", "user_id": usr["id"],
+                            "data": {"command": "difference a tree"}})
+        self.sim.session.room_logs[100] = [
+            {"id": i, "date_created": date, **entry}
+            for i, entry in enumerate(entries, 1)
+        ]
+
+    def test_missed_events_are_replayed(self):
+        self.log_missed_discussion()
+        self.sim.sio.trigger("connect")
+
+        statuses = [log["data"]["status_txt"] for log in self.sim.session.logs]
+        self.assertEqual(statuses, ["success"])
+        self.assertIsNone(self.sim.bot.disconnected_at)
+
+    def test_events_before_disconnect_are_skipped(self):
+        self.log_missed_discussion()
+        for entry in self.sim.session.room_logs[100]:
+            entry["date_created"] = "2000-01-01T00:00:00"
+        self.sim.sio.trigger("connect")
+
+        player = self.sim.bot.players_per_room[100][0]
+        self.assertEqual(player["msg_n"], 0)
+
+    def test_events_are_replayed_once(self):
+        self.log_missed_discussion()
+        del self.sim.session.room_logs[100][-2:]
+        self.sim.sio.trigger("connect")
+        self.sim.sio.trigger("disconnect")
+        self.sim.sio.trigger("connect")
+
+        player = self.sim.bot.players_per_room[100][0]
+        self.assertEqual(player["msg_n"], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,8 @@
 import argparse
 import logging
 import os
+import random
+import time
 
 import requests
 import socketio
@@ -28,11 +30,19 @@ class EchoBot:
 
     def run(self):
         # establish a connection to the server
-        self.sio.connect(
-            self.uri,
-            headers={"Authorization": f"Bearer {self.token}", "user": self.user},
-            namespaces="/",
-        )
+        delay = 1
+        while True:
+            try:
+                self.sio.connect(
+                    self.uri,
+                    headers={"Authorization": f"Bearer {self.token}", "user": self.user},
+                    namespaces="/",
+                )
+                break
+            except socketio.exceptions.ConnectionError as error:
+                LOG.error(f"Could not connect to server: {error}")
+                time.sleep(random.uniform(delay / 2, delay))
+                delay = min(2 * delay, 60)
         # wait until the connection with the server ends
         self.sio.wait()
 